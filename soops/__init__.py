@@ -1,11 +1,44 @@
 from .base import *
 from .cliargs import *
-from .ioutils import *
-from .parsing import (parse_as_list, parse_as_dict, extract_values,
-                      extract_ints, extract_floats)
 from .timing import *
 from .version import __version__
 
+# The names from modules that import pyparsing (or other heavy dependencies)
+# are loaded on first access, see PEP 562.
+_lazy_modules = {
+    'parsing' : ['parse_as_list', 'parse_as_dict', 'extract_values',
+                 'extract_ints', 'extract_floats'],
+    'ioutils' : ['ensure_path', 'fix_path', 'edit_filename', 'locate_files',
+                 'remove_files', 'remove_files_patterns',
+                 'get_options_sidecar', 'options_sidecar_version',
+                 'save_options_sidecar', 'convert_options_files',
+                 'save_options', 'load_options', 'read_csv_files',
+                 'skip_lines', 'skip_lines_to', 'dec', 'is_in_store',
+                 'put_to_store', 'get_from_store', 'delete_from_store',
+                 'downcast_numeric', 'to_categorical', 'add_categories',
+                 'from_categorical', 'repack_store'],
+}
+
+def __getattr__(name):
+    import importlib
+
+    if not name.startswith('_'):
+        for mod_name, names in _lazy_modules.items():
+            if name not in names:
+                continue
+
+            mod = importlib.import_module('.' + mod_name, __name__)
+            if hasattr(mod, name):
+                val = getattr(mod, name)
+                globals()[name] = val
+                return val
+
+    raise AttributeError('module {!r} has no attribute {!r}'
+                         .format(__name__, name))
+
+def __dir__():
+    return sorted(set(globals()).union(*_lazy_modules.values()))
+
 def test(*args):
     """
     Run all the package tests.
@@ -29,3 +62,7 @@ def test(*args):
 
     path = os.path.join(os.path.split(__file__)[0], 'tests')
     return pytest.main(args=[path] + list(args))
+
+# The lazy names are loaded by star imports.
+__all__ = sorted(set(key for key in globals() if not key.startswith('_'))
+                 .union(*_lazy_modules.values()))
@@ -2,6 +2,9 @@ import os
 import sys
 import subprocess
 import itertools
+import threading
+import weakref
+import atexit
 
 class AttrDict(dict):
     """
@@ -50,18 +53,112 @@ class Struct(AttrDict):
                 else f'{key.rjust(num)}: {repr(val)}'
                 for key, val in sorted(self.items())]
 
+_buffered_files = weakref.WeakSet()
+
+class BufferedFile:
+    """
+    A log file that is kept open with a write buffer, flushed periodically by
+    a background thread.
+    """
+
+    def __init__(self, filename, flush_interval=1.0, buffer_size=65536):
+        self.filename = filename
+        self.flush_interval = flush_interval
+        self.fd = open(filename, 'a', buffering=buffer_size)
+        self.lock = threading.Lock()
+        self.event = threading.Event()
+        self.thread = None
+        _buffered_files.add(self)
+
+    def _run(self, event):
+        while not event.wait(self.flush_interval):
+            self.flush()
+
+    def _ensure_thread(self):
+        if (self.thread is None) and (self.flush_interval is not None):
+            self.thread = threading.Thread(target=self._run,
+                                           args=(self.event,),
+                                           name='soops-output-flusher',
+                                           daemon=True)
+            self.thread.start()
+
+    def write(self, msg):
+        with self.lock:
+            if self.fd is None:
+                raise ValueError('write to closed file {}!'
+                                 .format(self.filename))
+
+            self.fd.write(msg + '\n')
+            self._ensure_thread()
+
+    def flush(self):
+        with self.lock:
+            if self.fd is not None:
+                self.fd.flush()
+
+    def close(self):
+        self.event.set()
+        with self.lock:
+            if self.fd is not None:
+                self.fd.close()
+                self.fd = None
+
+        if ((self.thread is not None)
+            and (self.thread is not threading.current_thread())):
+            self.thread.join()
+        self.thread = None
+
+    def _before_fork(self):
+        self.lock.acquire()
+        if self.fd is not None:
+            # Do not let a child process write the parent buffer again.
+            self.fd.flush()
+
+    def _after_fork_in_parent(self):
+        self.lock.release()
+
+    def _after_fork_in_child(self):
+        self.lock.release()
+        # The flusher thread does not survive fork().
+        self.event = threading.Event()
+        self.thread = None
+
+def _close_buffered_files():
+    for bfile in list(_buffered_files):
+        bfile.close()
+
+def _call_buffered_files(name):
+    def call():
+        for bfile in list(_buffered_files):
+            getattr(bfile, name)()
+    return call
+
+atexit.register(_close_buffered_files)
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(
+        before=_call_buffered_files('_before_fork'),
+        after_in_parent=_call_buffered_files('_after_fork_in_parent'),
+        after_in_child=_call_buffered_files('_after_fork_in_child'),
+    )
+
 class Output(Struct):
     """
     A class that provides output (print) functions.
+
+    Messages with `verbosity` greater than `self.verbosity` are not formatted
+    nor printed. Use :func:`Output.is_shown()` to skip preparing expensive
+    message arguments.
     """
 
     def __init__(self, prefix, filename=None, quiet=False, combined=False,
-                 append=False, **kwargs):
+                 append=False, buffered=False, verbosity=1, **kwargs):
         Struct.__init__(self, filename=filename, output_dir=None, **kwargs)
         self.prefix = prefix
+        self.verbosity = verbosity
+        self.buffered_file = None
 
         self.set_output(filename=filename, quiet=quiet,
-                        combined=combined, append=append)
+                        combined=combined, append=append, buffered=buffered)
 
     def __call__(self, *argc, **argv):
         """
@@ -76,11 +173,36 @@ class Output(Struct):
             are listed below.
         verbose : bool (in **argv)
             No output if False.
+        verbosity : int (in **argv)
+            No output if greater than `self.verbosity`. The default is 1.
         """
         verbose = argv.get('verbose', True)
-        if verbose:
+        if verbose and (argv.get('verbosity', 1) <= self.verbosity):
             self.output_function(*argc, **argv)
 
+    def is_shown(self, verbosity=1):
+        """
+        Return True if a message with the given `verbosity` would be output.
+        """
+        return ((verbosity <= self.verbosity)
+                and (self.output_function is not self._output_none))
+
+    def flush(self):
+        """
+        Flush the buffered output file, if any.
+        """
+        if self.buffered_file is not None:
+            self.buffered_file.flush()
+
+    def close(self):
+        """
+        Flush and close the buffered output file, if any. Subsequent messages
+        are appended to the file unbuffered.
+        """
+        if self.buffered_file is not None:
+            self.buffered_file.close()
+            self.buffered_file = None
+
     def get_prefix(self):
         if len(self.prefix):
             return self.prefix + ' ' + ('  ' * self.level)
@@ -89,7 +211,7 @@ class Output(Struct):
             return self.prefix + ('  ' * self.level)
 
     def set_output(self, filename=None, quiet=False, combined=False,
-                   append=False):
+                   append=False, buffered=False, flush_interval=1.0):
         """
         Set the output mode.
 
@@ -113,10 +235,20 @@ class Output(Struct):
         append : bool
             Append to an existing file instead of overwriting it. Use with
             `filename`.
+        buffered : bool
+            Keep the file given by `filename` open and write to it through a
+            buffer instead of opening and closing it for each message.
+        flush_interval : float
+            The interval in seconds for flushing the buffered file. If None,
+            the file is flushed only by :func:`Output.flush()`,
+            :func:`Output.close()` or at exit.
         """
+        self.close()
+
         if not isinstance(filename, str):
             # filename is a file descriptor.
             append = True
+            buffered = False
 
         self.level = 0
 
@@ -136,6 +268,10 @@ class Output(Struct):
                 self.level += 1
 
         def print_to_file(filename, msg):
+            if self.buffered_file is not None:
+                self.buffered_file.write(self.get_prefix() + msg)
+                return
+
             if isinstance(filename, str):
                 fd = open(filename, 'a')
 
@@ -188,6 +324,7 @@ class Output(Struct):
             else:
                 raise ValueError('cannot reset a file object!')
 
+        self._output_none = output_none
         if quiet is True:
             if filename is not None:
                 if not append:
@@ -212,40 +349,89 @@ class Output(Struct):
                 else:
                     self.output_function = output_file
 
+        if buffered and (filename is not None):
+            self.buffered_file = BufferedFile(filename,
+                                              flush_interval=flush_interval)
+
     def get_output_function(self):
         return self.output_function
 
 output = Output('soops:')
 
+def _iter_indices(sizes):
+    """
+    Iterate over index tuples of a product of sequences with the given sizes,
+    the last index varying fastest.
+    """
+    if not all(sizes):
+        return
+
+    indices = [0] * len(sizes)
+    while True:
+        yield tuple(indices)
+
+        for ik in range(len(sizes) - 1, -1, -1):
+            indices[ik] += 1
+            if indices[ik] < sizes[ik]:
+                break
+
+            indices[ik] = 0
+
+        else:
+            return
+
 def product(*seqs, contracts=None):
     """
     Like `itertools.product()`, but loops in contracts vary in lockstep.
+
+    Sequences other than lists and tuples need to support `len()` and
+    indexing only - their items are accessed on demand and never copied.
     """
     if contracts is None:
-        yield from itertools.product(*seqs)
+        if all(isinstance(seq, (list, tuple)) for seq in seqs):
+            yield from itertools.product(*seqs)
+
+        else:
+            for indices in _iter_indices([len(seq) for seq in seqs]):
+                yield tuple(seq[ii] for seq, ii in zip(seqs, indices))
+
         return
 
     ifollowing = [[ii for ii in contract[1:]] for contract in contracts]
 
     aux = set(sum(ifollowing, []))
-    pindices, pseqs = zip(*itertools.filterfalse(
-        lambda x: x[0] in aux,
-        [(ip, enumerate(seq)) for ip, seq in enumerate(seqs)]
-    ))
+    pindices = [ip for ip in range(len(seqs)) if ip not in aux]
+    sizes = [len(seqs[ip]) for ip in pindices]
 
-    for pout in itertools.product(*pseqs):
+    for pout in _iter_indices(sizes):
         out = [0] * len(seqs)
         for ip, ii in enumerate(pindices):
-            out[ii] = pout[ip][1]
+            out[ii] = seqs[ii][pout[ip]]
 
         for ic, contract in enumerate(contracts):
-            ii = pout[pindices.index(contract[0])][0]
+            ii = pout[pindices.index(contract[0])]
             for ik in ifollowing[ic]:
                 val = seqs[ik][ii]
                 out[ik] = val
 
         yield out
 
+def get_product_size(*seqs, contracts=None):
+    """
+    Return the number of items yielded by `product()` without iterating.
+    """
+    aux = set()
+    if contracts is not None:
+        for contract in contracts:
+            aux.update(contract[1:])
+
+    size = 1
+    for ip, seq in enumerate(seqs):
+        if ip not in aux:
+            size *= len(seq)
+
+    return size
+
 def get_default(arg, default, msg_if_none=None):
     out = arg if arg is not None else default
 
@@ -140,6 +140,7 @@ def get_plugin_info():
 
     return info
 
+@sc.plugin(cache=True, files=['win_rates.png'])
 def plot_win_rates(df, data=None, colormap_name='viridis'):
     import soops.plot_selected as sps
 
@@ -147,7 +148,8 @@ def plot_win_rates(df, data=None, colormap_name='viridis'):
     df['seed'] = df['seed'].where(df['seed'].notnull(), -1)
 
     uniques = sc.get_uniques(df, [key for key in data.multi_par_keys
-                                  if key not in ['output_dir']])
+                                  if key not in ['output_dir']],
+                             cache=data.uniques_cache)
     output('parameterization:')
     for key, val in uniques.items():
         output(key, val)
@@ -8,12 +8,11 @@ initial dashes and replacing other dashes by underscores. For example
 """
 from argparse import ArgumentParser, RawDescriptionHelpFormatter
 import sys
+import os
 import os.path as op
 
-import pandas as pd
-
 from soops.base import output
-from soops.ioutils import locate_files
+from soops.ioutils import locate_files, to_categorical, read_csv_files
 
 helps = {
     'query'
@@ -24,6 +23,18 @@ helps = {
     : 'output mode [default: %(default)s]',
     'key'
     : 'column key. If given, forces "single" output mode [default: output_dir]',
+    'columns'
+    : """comma-separated column keys to output; in "single" mode, the values
+         are separated by tabs""",
+    'stream'
+    : """output the query results as they are found, in a file system order,
+         instead of sorted by output_dir after all parameter sets are
+         loaded. Ignored with --index""",
+    'index'
+    : """use a consolidated parameter index stored in each root directory,
+         refreshed incrementally for new or changed parameter sets""",
+    'no_refresh'
+    : 'use the parameter index without refreshing it; implies --index',
     'shell'
     : 'run ipython shell after all computations',
     'directories'
@@ -45,6 +56,18 @@ def parse_args(args=None):
                         default='truncated', help=helps['mode'])
     parser.add_argument('-k', '--key', action='store', dest='key',
                         default=None, help=helps['key'])
+    parser.add_argument('-c', '--columns', metavar='key1,key2,...',
+                        action='store', dest='columns',
+                        default=None, help=helps['columns'])
+    parser.add_argument('--stream',
+                        action='store_true', dest='stream',
+                        default=False, help=helps['stream'])
+    parser.add_argument('--index',
+                        action='store_true', dest='index',
+                        default=False, help=helps['index'])
+    parser.add_argument('--no-refresh',
+                        action='store_false', dest='refresh',
+                        default=True, help=helps['no_refresh'])
     parser.add_argument('--shell',
                         action='store_true', dest='shell',
                         default=False, help=helps['shell'])
@@ -57,46 +80,518 @@ def parse_args(args=None):
     elif options.mode == 'single':
         options.key = 'output_dir'
 
+    if not options.refresh:
+        options.index = True
+
+    if options.columns is not None:
+        options.columns = [key.strip() for key in options.columns.split(',')]
+
+    if options.stream and (options.query is None):
+        parser.error('--stream requires --query!')
+
     return options
 
-def find_studies(options):
+def get_column_name(key):
+    """
+    Transform an option-like parameter name to a valid Python attribute name.
+    """
+    return key.lstrip('-').replace('-', '_')
+
+def _get_query_tree(query):
+    """
+    Parse a pandas query expression into a Python AST. Like pandas, '&' and
+    '|' are treated as 'and' and 'or'. Return None for expressions with
+    backtick-quoted names or with a syntax error.
+    """
+    import ast
+    import io
+    import tokenize
+
+    if '`' in query:
+        return None
+
+    try:
+        toks = []
+        for tok in tokenize.generate_tokens(io.StringIO(query).readline):
+            if (tok.type == tokenize.OP) and (tok.string in ('&', '|')):
+                tok = tok._replace(type=tokenize.NAME,
+                                   string={'&' : 'and', '|' : 'or'}[tok.string])
+            toks.append((tok.type, tok.string))
+
+        return ast.parse(tokenize.untokenize(toks).strip(), mode='eval').body
+
+    except (SyntaxError, tokenize.TokenError):
+        return None
+
+def is_query_index(name):
+    """
+    Check whether `name` refers to the DataFrame index in a pandas query.
+    """
+    return (name == 'index') or name.startswith('ilevel_')
+
+def get_query_predicates(query):
+    """
+    Extract simple column predicates from a pandas query expression.
+
+    The predicates are the comparisons of a column with a literal value
+    (``==``, ``!=``, ``<``, ``<=``, ``>``, ``>=``, ``in``, ``not in``) that
+    are in the top-level conjunction of the query, so that a row failing a
+    predicate cannot satisfy the query. The comparisons of the index are
+    omitted.
+
+    Parameters
+    ----------
+    query : str
+        The pandas query expression.
+
+    Returns
+    -------
+    names : set or None
+        All names used in the query, or None if the query cannot be parsed.
+    predicates : list
+        The list of `(name, op, value)` tuples.
+    """
+    import ast
+
+    tree = _get_query_tree(query)
+    if tree is None:
+        return None, []
+
+    names = {node.id for node in ast.walk(tree) if isinstance(node, ast.Name)}
+
+    ops = {ast.Eq : '==', ast.NotEq : '!=', ast.Lt : '<', ast.LtE : '<=',
+           ast.Gt : '>', ast.GtE : '>=', ast.In : 'in', ast.NotIn : 'not in'}
+    flipped = {'==' : '==', '!=' : '!=', '<' : '>', '<=' : '>=', '>' : '<',
+               '>=' : '<='}
+
+    def get_literal(node):
+        try:
+            return True, ast.literal_eval(node)
+
+        except (ValueError, TypeError, SyntaxError, MemoryError,
+                RecursionError):
+            return False, None
+
+    conjuncts = (tree.values if (isinstance(tree, ast.BoolOp)
+                                 and isinstance(tree.op, ast.And))
+                 else [tree])
+    predicates = []
+    for node in conjuncts:
+        if not isinstance(node, ast.Compare):
+            continue
+
+        operands = [node.left] + node.comparators
+        for left, aop, right in zip(operands[:-1], node.ops, operands[1:]):
+            op = ops.get(type(aop))
+            if op is None:
+                continue
+
+            if isinstance(left, ast.Name):
+                ok, val = get_literal(right)
+                name = left.id
+
+            elif isinstance(right, ast.Name) and (op in flipped):
+                ok, val = get_literal(left)
+                name, op = right.id, flipped[op]
+
+            else:
+                continue
+
+            if (not ok) or is_query_index(name):
+                continue
+
+            if isinstance(val, (list, tuple, set)):
+                # pandas query: a == [1, 2] means a in [1, 2].
+                op = {'==' : 'in', '!=' : 'not in'}.get(op, op)
+                if op not in ('in', 'not in'):
+                    continue
+
+            elif op in ('in', 'not in'):
+                continue
+
+            predicates.append((name, op, val))
+
+    return names, predicates
+
+def make_row_filter(predicates):
+    """
+    Make a row filter for :func:`soops.ioutils.read_csv_files()` from the
+    query predicates.
+
+    A row is rejected only if a predicate is certainly False for it: the
+    comparisons failing due to incompatible types keep the row. A column not
+    present in a file has NaN values.
+    """
+    import operator
+
+    funs = {'==' : operator.eq, '!=' : operator.ne, '<' : operator.lt,
+            '<=' : operator.le, '>' : operator.gt, '>=' : operator.ge,
+            'in' : lambda x, y: x in y,
+            'not in' : lambda x, y: x not in y}
+    nan = float('nan')
+
+    def test(fun, val, ref):
+        try:
+            return bool(fun(val, ref))
+
+        except Exception:
+            return True
+
+    def row_filter(columns, nrow):
+        mask = [True] * nrow
+        names = {get_column_name(key) : key for key in columns}
+        for name, op, ref in predicates:
+            fun = funs[op]
+            key = names.get(name)
+            values = columns[key][1] if key is not None else [nan] * nrow
+            mask = [ok and test(fun, val, ref)
+                    for ok, val in zip(mask, values)]
+
+        return mask
+
+    return row_filter
+
+index_basename = '.soops-find-index.h5'
+
+def scan_parameter_files(root_dir, dirs=None, basename='soops-parameters.csv'):
+    """
+    Find all files with the given basename in and below `root_dir`.
+
+    Directory listings are stored in the returned `dirs` and reused for
+    directories whose modification time has not changed since `dirs` passed
+    in were obtained, so that only a stat() call per directory and per found
+    file is needed for an unchanged tree.
+
+    Parameters
+    ----------
+    root_dir : str
+        The root directory.
+    dirs : dict, optional
+        The directory information returned by a previous call.
+    basename : str
+        The file name to find.
+
+    Returns
+    -------
+    dirs : dict
+        The directory information: for each directory path relative to
+        `root_dir` a tuple `(mtime_ns, subdirs, has_file)`.
+    files : dict
+        The found files: for each file path relative to `root_dir` a tuple
+        `(mtime_ns, size)`.
+    """
+    old_dirs = {} if dirs is None else dirs
+    dirs = {}
+    files = {}
+    stack = ['']
+    while len(stack):
+        rel = stack.pop()
+        path = op.join(root_dir, rel)
+        try:
+            mtime = os.stat(path).st_mtime_ns
+
+        except OSError:
+            continue
+
+        cached = old_dirs.get(rel)
+        if (cached is not None) and (cached[0] == mtime):
+            subdirs, has_file = cached[1:]
+
+        else:
+            subdirs = []
+            has_file = False
+            try:
+                with os.scandir(path) as it:
+                    for entry in it:
+                        # Like os.walk(), do not follow symbolic links.
+                        if entry.is_dir(follow_symlinks=False):
+                            subdirs.append(entry.name)
+
+                        elif entry.name == basename:
+                            has_file = True
+
+            except OSError:
+                continue
+
+            subdirs = tuple(sorted(subdirs))
+
+        dirs[rel] = (mtime, subdirs, has_file)
+        if has_file:
+            fname = op.join(rel, basename)
+            try:
+                st = os.stat(op.join(root_dir, fname))
+
+            except OSError:
+                pass
+
+            else:
+                files[fname] = (st.st_mtime_ns, st.st_size)
+
+        stack.extend(op.join(rel, subdir) for subdir in reversed(subdirs))
+
+    return dirs, files
+
+def _read_index(filename):
+    import pandas as pd
+
+    with pd.HDFStore(filename, mode='r') as store:
+        ddf = store.get('dirs')
+        fdf = store.get('files')
+        sdf = store.get('sets')
+
+    dirs = {rel : (mtime, tuple(subdirs.split('/')) if subdirs else (),
+                   has_file)
+            for rel, mtime, subdirs, has_file
+            in zip(ddf.index, ddf['mtime_ns'], ddf['subdirs'],
+                   ddf['has_file'])}
+    files = {fname : (mtime, size) for fname, mtime, size
+             in zip(fdf.index, fdf['mtime_ns'], fdf['size'])}
+    return dirs, files, sdf
+
+def _write_index(filename, dirs, files, sdf):
+    import warnings
+    import pandas as pd
+
+    ddf = pd.DataFrame(
+        {'mtime_ns' : [val[0] for val in dirs.values()],
+         'subdirs' : ['/'.join(val[1]) for val in dirs.values()],
+         'has_file' : [val[2] for val in dirs.values()]},
+        index=pd.Index(list(dirs.keys()), dtype=object), dtype=object,
+    ).astype({'mtime_ns' : 'int64', 'has_file' : bool})
+    fdf = pd.DataFrame(
+        {'mtime_ns' : [val[0] for val in files.values()],
+         'size' : [val[1] for val in files.values()]},
+        index=pd.Index(list(files.keys()), dtype=object), dtype='int64',
+    )
+
+    tmp_filename = filename + '.tmp'
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', pd.errors.PerformanceWarning)
+        with pd.HDFStore(tmp_filename, mode='w') as store:
+            store.put('dirs', ddf)
+            store.put('files', fdf)
+            store.put('sets', sdf)
+
+    os.replace(tmp_filename, filename)
+
+def load_parameter_index(root_dir, refresh=True):
+    """
+    Load all parameter sets stored in `soops-parameters.csv` files in and
+    below `root_dir` using a consolidated index stored in `root_dir`.
+
+    The index is refreshed incrementally: only new or changed parameter files
+    are read, and removed ones are dropped. Directory modification times are
+    used to avoid listing unchanged directories.
+
+    The index is stored in the HDF5 file `root_dir/.soops-find-index.h5`.
+
+    Parameters
+    ----------
+    root_dir : str
+        The root directory.
+    refresh : bool
+        If False, an existing index is used as is.
+
+    Returns
+    -------
+    apdf : DataFrame
+        The parameter sets.
+    """
+    import pandas as pd
+
+    filename = op.join(root_dir, index_basename)
+    dirs, files, sdf = {}, {}, None
+    if op.exists(filename):
+        try:
+            dirs, files, sdf = _read_index(filename)
+
+        except Exception as exc:
+            output('cannot read index {}: {}'.format(filename, exc))
+            dirs, files, sdf = {}, {}, None
+
+        else:
+            if not refresh:
+                return sdf.drop(columns='_index_file')
+
+    new_dirs, new_files = scan_parameter_files(root_dir, dirs=dirs)
+    changed = [fname for fname, val in new_files.items()
+               if files.get(fname) != val]
+    removed = set(files).difference(new_files)
+
+    # Changed directory modification times alone do not require rewriting
+    # the index - writing it changes the modification time of root_dir.
+    def get_layout(dirs):
+        return {key : val[1:] for key, val in dirs.items()}
+
+    if ((sdf is None) or len(changed) or len(removed)
+        or (get_layout(new_dirs) != get_layout(dirs))):
+        dfs = []
+        if sdf is not None:
+            dfs.append(sdf[~sdf['_index_file'].isin(removed.union(changed))])
+
+        df = read_csv_files([op.join(root_dir, fname) for fname in changed],
+                            index_col='pkey', filename_col='_index_file')
+        if len(df):
+            prefix = op.join(root_dir, '')
+            df['_index_file'] = df['_index_file'].str.slice(len(prefix))
+            dfs.append(df)
+
+        sdf = (pd.concat(dfs) if len(dfs)
+               else pd.DataFrame({'_index_file' : []}, dtype=object))
+
+        try:
+            _write_index(filename, new_dirs, new_files, sdf)
+
+        except OSError as exc:
+            output('cannot write index {}: {}'.format(filename, exc))
+
+    return sdf.drop(columns='_index_file')
+
+def print_results(sdf, options, start=0):
+    """
+    Output the query results in `sdf` according to `options.mode`,
+    `options.key` and `options.columns`. The result numbering starts from
+    `start`.
+    """
+    import pandas as pd
+
+    if options.mode in ('truncated', 'full'):
+        if options.mode == 'full':
+            pd.set_option('display.max_colwidth', None)
+
+        for ii in range(len(sdf)):
+            row = sdf.iloc[ii]
+            if options.columns is not None:
+                row = row[options.columns]
+
+            output('result {} in {}:\n{}'
+                   .format(start + ii, sdf['output_dir'].iloc[ii], row))
+
+    elif options.mode == 'single':
+        prefix = output.prefix
+        output.prefix = ''
+        keys = (options.columns if options.columns is not None
+                else [options.key])
+        for ii in range(len(sdf)):
+            row = sdf.iloc[ii]
+            output('\t'.join(str(row[key]) for key in keys))
+
+        output.prefix = prefix
+
+def _prepare_parameters(dfs):
+    import pandas as pd
+
+    apdf = pd.concat(dfs)
+    apdf = apdf.rename(columns=get_column_name)
+    return apdf.sort_values('output_dir', ignore_index=True)
+
+def find_studies(options, collect=True):
+    """
+    Collect the parameter sets in `options.directories` into a DataFrame and
+    output the results of `options.query`.
+
+    If `collect` is False and `options.shell` is False, the simple
+    comparisons of columns with literal values in the top-level conjunction
+    of the query are applied already when reading the parameter files, so
+    that only the candidate rows are collected, and, if `options.columns` are
+    given, only the columns used by the query and the output are read. The
+    full query is then evaluated on the candidate rows.
+
+    Returns
+    -------
+    apdf : DataFrame
+        All the collected parameter sets if `collect` is True or there is no
+        query, otherwise the query results.
+    """
+    import itertools
+    import pandas as pd
+
     output.prefix = 'find:'
 
+    pushdown = ((options.query is not None)
+                and not (collect or options.shell))
+    names, predicates = (get_query_predicates(options.query)
+                         if options.query is not None else (None, []))
+    usecols = row_filter = None
+    if pushdown:
+        if len(predicates):
+            row_filter = make_row_filter(predicates)
+
+        if (names is not None) and (options.columns is not None):
+            usecols = (lambda key: get_column_name(key)
+                       in names | set(options.columns) | {'output_dir'})
+
+    def query_batch(df):
+        # A batch of parameter sets can lack columns used by the query.
+        missing = [name for name in (names or [])
+                   if (name not in df.columns) and not is_query_index(name)]
+        if len(missing):
+            df = df.assign(**{name : float('nan') for name in missing})
+
+        return df.query(options.query, engine=options.engine)
+
+    # The index is loaded at once, so streaming does not apply.
+    stream = options.stream and not options.index
+
     dfs = []
+    num = 0
     for root_dir in options.directories:
-        for fname in locate_files('soops-parameters.csv', root_dir=root_dir):
-            if op.exists(fname):
-                try:
-                    df = pd.read_csv(fname, index_col='pkey')
+        if options.index:
+            df = load_parameter_index(root_dir, refresh=options.refresh)
+            if (row_filter is not None) and len(df):
+                columns = {key : (None, df[key].tolist()) for key in df}
+                df = df[row_filter(columns, len(df))]
 
-                except pd.errors.EmptyDataError:
-                    continue
+            if len(df):
+                dfs.append(df)
 
-                else:
-                    dfs.append(df)
+            continue
 
-    if len(dfs):
-        apdf = pd.concat(dfs)
-        apdf = apdf.rename(columns=lambda x: x.lstrip('-').replace('-', '_'))
-        apdf = apdf.sort_values('output_dir', ignore_index=True)
+        filenames = locate_files('soops-parameters.csv', root_dir=root_dir)
+        if not (stream and (options.query is not None)):
+            df = read_csv_files(filenames, index_col='pkey', usecols=usecols,
+                                row_filter=row_filter)
+            if len(df.columns):
+                dfs.append(df)
 
-        if options.query is not None:
-            sdf = apdf.query(options.query, engine=options.engine)
+            continue
+
+        # Query the parameter files in batches and output the results
+        # immediately.
+        while 1:
+            batch = list(itertools.islice(filenames, 64))
+            if not len(batch):
+                break
 
-            if options.mode in ('truncated', 'full'):
-                if options.mode == 'full':
-                    pd.set_option('display.max_colwidth', None)
+            df = read_csv_files(batch, index_col='pkey', usecols=usecols,
+                                row_filter=row_filter)
+            if not len(df):
+                continue
 
-                for ii in range(len(sdf)):
-                    row = sdf.iloc[ii]
-                    output('result {} in {}:\n{}'
-                           .format(ii, row['output_dir'], row))
+            sdf = query_batch(_prepare_parameters([df]))
+            print_results(sdf, options, start=num)
+            sys.stdout.flush()
+            num += len(sdf)
+            dfs.append(sdf if pushdown else df)
 
-            elif options.mode == 'single':
-                output.prefix = ''
-                for ii in range(len(sdf)):
-                    row = sdf.iloc[ii]
-                    output(row[options.key])
+    if stream and pushdown:
+        apdf = (pd.concat(dfs, ignore_index=True) if len(dfs)
+                else pd.DataFrame())
+
+    elif len(dfs):
+        apdf = _prepare_parameters(dfs)
+        # Numeric columns are kept intact, so that arithmetic in queries
+        # cannot overflow.
+        from pandas.api.types import is_numeric_dtype
+        apdf = to_categorical(apdf, [key for key in apdf.columns
+                                     if not is_numeric_dtype(apdf[key])],
+                              max_ratio=0.5)
+
+        if (options.query is not None) and not stream:
+            sdf = apdf.query(options.query, engine=options.engine)
+            print_results(sdf, options)
+            if pushdown:
+                apdf = sdf
 
     else:
         apdf = pd.DataFrame()
@@ -110,7 +605,7 @@ def find_studies(options):
 
 def main():
     options = parse_args()
-    find_studies(options)
+    find_studies(options, collect=False)
     return
 
 if __name__ == '__main__':
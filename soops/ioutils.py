@@ -8,7 +8,6 @@ import subprocess
 from collections.abc import Iterable
 
 from soops.base import output, ordered_iteritems
-from soops.parsing import parse_as_dict
 
 def ensure_path(filename):
     """
@@ -120,13 +119,129 @@ def remove_files_patterns(root_dir, patterns, ignores=None,
             output('removing "%s"' % _f, verbose=verbose)
             os.remove(_f)
 
+def get_options_sidecar(filename):
+    """
+    Return the name of the JSON file with the options loaded from the text
+    file `filename`. The soops-specific suffix avoids collisions with JSON
+    files of the users.
+    """
+    return filename + '.soops.json'
+
+def _encode_option(val):
+    if isinstance(val, tuple):
+        return {'__tuple__' : [_encode_option(ii) for ii in val]}
+
+    elif isinstance(val, (set, frozenset)):
+        return {'__set__' : [_encode_option(ii) for ii in val]}
+
+    elif isinstance(val, complex):
+        return {'__complex__' : [val.real, val.imag]}
+
+    elif isinstance(val, list):
+        return [_encode_option(ii) for ii in val]
+
+    elif isinstance(val, dict):
+        if not all(isinstance(key, str) for key in val.keys()):
+            raise TypeError('non-string dict keys!')
+
+        return {'__dict__' : {key : _encode_option(item)
+                              for key, item in val.items()}}
+
+    elif (val is None) or isinstance(val, (bool, int, float, str)):
+        return val
+
+    raise TypeError('cannot encode {!r}!'.format(val))
+
+def _decode_option(val):
+    if isinstance(val, list):
+        return [_decode_option(ii) for ii in val]
+
+    elif isinstance(val, dict):
+        (tag, item), = val.items()
+        if tag == '__tuple__':
+            return tuple(_decode_option(ii) for ii in item)
+
+        elif tag == '__set__':
+            return set(_decode_option(ii) for ii in item)
+
+        elif tag == '__complex__':
+            return complex(*item)
+
+        else:
+            return {key : _decode_option(ii) for key, ii in item.items()}
+
+    return val
+
+options_sidecar_version = 1
+
+def save_options_sidecar(filename, options=None):
+    """
+    Save the options loaded from the text file `filename` by
+    :func:`load_options()` (or given `options`) into a JSON file (see
+    :func:`get_options_sidecar()`) that preserves the value types. The JSON
+    file is not written if some values cannot be encoded.
+
+    Returns
+    -------
+    ok : bool
+        True if the JSON file was written.
+    """
+    import json
+
+    if options is None:
+        options = _load_options_text(filename)
+
+    try:
+        data = {'version' : options_sidecar_version,
+                'options' : _encode_option(options)}
+
+    except TypeError:
+        return False
+
+    sidecar = get_options_sidecar(filename)
+    tmp = sidecar + '.tmp'
+    with open(tmp, 'w') as fd:
+        json.dump(data, fd)
+    os.replace(tmp, sidecar)
+
+    return True
+
+def convert_options_files(root_dir, pattern='options.txt', force=False,
+                          verbose=True):
+    """
+    Write the JSON sidecar files of all option files matching `pattern` in
+    `root_dir`, so that the existing studies are loaded faster by
+    :func:`load_options()`. Existing up-to-date sidecars are kept unless
+    `force` is True.
+
+    Returns
+    -------
+    num : int
+        The number of written sidecar files.
+    """
+    num = 0
+    for filename in locate_files(pattern, root_dir=root_dir):
+        if not force and (_get_valid_sidecar(filename) is not None):
+            continue
+
+        ok = save_options_sidecar(filename)
+        output('{} {}'.format('converted' if ok else 'cannot convert',
+                              filename), verbose=verbose)
+        num += ok
+
+    return num
+
 def save_options(filename, options_groups, save_command_line=True,
-                 quote_command_line=False):
+                 quote_command_line=False, save_sidecar=True):
     """
     Save groups of options/parameters into a file.
 
     Each option group has to be a sequence with two items: the group name and
     the options in ``{key : value}`` form.
+
+    If `save_sidecar` is True, the options as loaded by
+    :func:`load_options()` are also saved into a JSON file using
+    :func:`save_options_sidecar()`.
     """
     with open(filename, 'w') as fd:
         if save_command_line:
@@ -145,7 +260,56 @@ def save_options(filename, options_groups, save_command_line=True,
             for key, val in ordered_iteritems(options):
                 fd.write('%s: %s\n' % (key, val))
 
+    if save_sidecar:
+        save_options_sidecar(filename)
+
+def _get_valid_sidecar(filename):
+    """
+    Return the name of the JSON sidecar of `filename` if it exists and is not
+    older than `filename`.
+    """
+    sidecar = get_options_sidecar(filename)
+    try:
+        if os.path.getmtime(sidecar) >= os.path.getmtime(filename):
+            return sidecar
+
+    except OSError:
+        pass
+
+    return None
+
 def load_options(filename):
+    """
+    Load options saved by :func:`save_options()`. The JSON sidecar file is
+    used, if it exists, is not older than `filename` and has the expected
+    contents. Otherwise the values in the text file are parsed.
+    """
+    import json
+
+    sidecar = _get_valid_sidecar(filename)
+    if sidecar is not None:
+        try:
+            with open(sidecar, 'r') as fd:
+                data = json.load(fd)
+
+            if data['version'] != options_sidecar_version:
+                raise ValueError('unsupported version!')
+
+            options = _decode_option(data['options'])
+            if not isinstance(options, dict):
+                raise TypeError('options are not a dict!')
+
+        except (ValueError, KeyError, TypeError, AttributeError):
+            pass
+
+        else:
+            return options
+
+    return _load_options_text(filename)
+
+def _load_options_text(filename):
+    from soops.parsing import parse_as_dict
+
     with open(filename, 'r') as fd:
         data = [line.strip() for line in fd.readlines()]
 
@@ -172,6 +336,289 @@ def load_options(filename):
 
     return options
 
+# The default NA values of pandas.read_csv().
+_csv_na_values = frozenset([
+    '', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan',
+    '1.#IND', '1.#QNAN', '<NA>', 'N/A', 'NA', 'NULL', 'NaN', 'None', 'n/a',
+    'nan', 'null',
+])
+_csv_int_re = None
+_csv_float_re = None
+_csv_dtypes = {'int' : 'int64', 'uint' : 'uint64', 'float' : 'float64',
+               'bool' : 'bool', 'object' : 'object'}
+
+def _infer_csv_column(tokens, na_filter=True):
+    """
+    Infer the kind and the values of a CSV column given by string `tokens`
+    like `pandas.read_csv()` does. Missing fields are given as None.
+
+    Returns
+    -------
+    kind : str
+        One of 'int', 'uint', 'float', 'bool', 'str', 'object'.
+    values : list
+        The values as Python scalars, NaN for NA values.
+    """
+    import re
+    global _csv_int_re, _csv_float_re
+
+    if _csv_int_re is None:
+        _csv_int_re = re.compile(r'\s*[+-]?\d+\s*')
+        _csv_float_re = re.compile(r'\s*[+-]?(?:(?:\d+\.?\d*|\.\d+)'
+                                   r'(?:[eE][+-]?\d+)?|inf(?:inity)?)\s*',
+                                   re.IGNORECASE)
+
+    if not len(tokens):
+        # Columns of empty DataFrames have the object dtype.
+        return 'object', []
+
+    nan = float('nan')
+    isna = [(tok is None) or (na_filter and (tok in _csv_na_values))
+            for tok in tokens]
+    valid = [tok for tok, na in zip(tokens, isna) if not na]
+    has_na = len(valid) < len(tokens)
+
+    def fill(values):
+        it = iter(values)
+        return [nan if na else next(it) for na in isna]
+
+    if not len(valid):
+        return 'float', [nan] * len(tokens)
+
+    if all(_csv_int_re.fullmatch(tok) for tok in valid):
+        ints = [int(tok) for tok in valid]
+        if all(-2**63 <= val < 2**63 for val in ints):
+            kind = 'int'
+
+        elif all(0 <= val < 2**64 for val in ints):
+            kind = 'uint'
+
+        elif any((val < -2**63) or (val >= 2**64) for val in ints):
+            return 'object', fill(ints)
+
+        else:
+            return 'str', fill(valid)
+
+        if has_na:
+            if kind == 'uint':
+                # pandas keeps the tokens including NA values as strings.
+                return 'str', [nan if tok is None else tok for tok in tokens]
+
+            return 'float', fill([float(val) for val in ints])
+
+        return kind, ints
+
+    if all(_csv_int_re.fullmatch(tok) or _csv_float_re.fullmatch(tok)
+           for tok in valid):
+        return 'float', fill([float(tok) for tok in valid])
+
+    lower = [tok.lower() for tok in valid]
+    if all(tok in ('true', 'false') for tok in lower):
+        return ('object' if has_na else 'bool'), fill([tok == 'true'
+                                                       for tok in lower])
+
+    return 'str', fill(valid)
+
+def _read_csv_file(filename, index_col=None, na_filter=True, usecols=None,
+                   row_filter=None):
+    import csv
+
+    try:
+        with open(filename, newline='') as fd:
+            reader = csv.reader(fd)
+            header = next(reader, None)
+            rows = [row for row in reader if len(row)]
+
+    except FileNotFoundError:
+        return None
+
+    if not header:
+        return None
+
+    # Mangle duplicate column names like pandas.read_csv().
+    names = []
+    for name in header:
+        new_name, ii = name, 0
+        while new_name in names:
+            ii += 1
+            new_name = '{}.{}'.format(name, ii)
+        names.append(new_name)
+
+    columns = {}
+    for ic, name in enumerate(names):
+        if (usecols is not None) and (name != index_col) and not usecols(name):
+            continue
+
+        tokens = [row[ic] if ic < len(row) else None for row in rows]
+        columns[name] = _infer_csv_column(tokens, na_filter=na_filter)
+
+    index = (columns.pop(index_col) if index_col is not None
+             else ('int', list(range(len(rows)))))
+
+    nrow = nrow0 = len(rows)
+    if (row_filter is not None) and nrow:
+        mask = row_filter(columns, nrow)
+        if not all(mask):
+            # Keep the column kinds of the whole file.
+            def select(item):
+                return (item[0], [val for val, ok in zip(item[1], mask)
+                                  if ok])
+
+            index = select(index)
+            columns = {name : select(item) for name, item in columns.items()}
+            nrow = len(index[1])
+
+    return nrow, index, columns, nrow0
+
+def _find_common_csv_dtype(kinds):
+    """
+    Like `pandas.core.dtypes.cast.find_common_type()` for the CSV column
+    kinds.
+    """
+    import numpy as np
+
+    kinds = set(kinds)
+    if len(kinds) == 1:
+        kind = kinds.pop()
+        return 'str' if kind == 'str' else np.dtype(_csv_dtypes[kind])
+
+    if ({'str', 'object', 'bool'} & kinds) or not len(kinds):
+        return np.dtype(object)
+
+    return np.result_type(*[_csv_dtypes[kind] for kind in kinds])
+
+def _get_common_csv_dtype(kinds):
+    """
+    Get the dtype of a column concatenated by `pandas.concat()` from columns
+    of the given kinds (in order), with 'missing' denoting a column that is not
+    present.
+    """
+    import numpy as np
+
+    first = kinds[0]
+    if ((first != 'missing')
+        and all((kind != 'missing') and ((kind == 'str') == (first == 'str'))
+                and ((kind == first) or (kind in ('int', 'uint', 'bool')))
+                for kind in kinds)):
+        # Uniform columns are concatenated by numpy.
+        if first == 'str':
+            return 'str'
+
+        return np.result_type(*[_csv_dtypes[kind] for kind in kinds])
+
+    dtype = _find_common_csv_dtype([kind for kind in kinds
+                                    if kind != 'missing'])
+    if 'missing' in kinds:
+        # Ensure the dtype can hold NaN.
+        if dtype == 'str':
+            pass
+
+        elif dtype.kind == 'b':
+            dtype = np.dtype(object)
+
+        elif dtype.kind in 'iu':
+            dtype = np.dtype(np.float64)
+
+    return dtype
+
+def _make_csv_array(values, dtype):
+    import pandas as pd
+
+    # The explicit dtype prevents inferring 'str' for object columns.
+    return pd.Series(values, dtype=dtype)
+
+def read_csv_files(filenames, index_col=None, na_filter=True,
+                   filename_col=None, usecols=None, row_filter=None,
+                   workers=None):
+    """
+    Read many small CSV files, such as the one-row `soops-parameters.csv`
+    files, into a single DataFrame.
+
+    The files are parsed by the `csv` module in a thread pool, avoiding the
+    per-call overhead of `pandas.read_csv()`. The result is the same as that of
+    concatenating DataFrames read by `pandas.read_csv()` with default
+    arguments (except `index_col`, `na_filter`) by `pandas.concat()`. Empty or
+    missing files are skipped.
+
+    Parameters
+    ----------
+    filenames : iterable of str
+        The CSV file names.
+    index_col : str, optional
+        The name of the index column.
+    na_filter : bool
+        If False, the NA values like 'nan' or '' are not converted to NaN.
+    filename_col : str, optional
+        If given, the name of a column to store the file name of each row.
+    usecols : callable, optional
+        If given, only the columns with names for which it returns True are
+        read.
+    row_filter : callable, optional
+        If given, it is called as ``row_filter(columns, nrow)`` for each file,
+        where `columns` is a dict of `(kind, values)` tuples of the file
+        columns, and returns a sequence of `nrow` bools. Only the rows with
+        True are kept. The dtypes of the result depend on all rows of all
+        files.
+    workers : int, optional
+        The number of threads. If not given, it is chosen by
+        `concurrent.futures.ThreadPoolExecutor`.
+
+    Returns
+    -------
+    df : DataFrame
+        The concatenated data.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+    import pandas as pd
+
+    filenames = list(filenames)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        data = list(executor.map(
+            lambda fname: _read_csv_file(fname, index_col=index_col,
+                                         na_filter=na_filter,
+                                         usecols=usecols,
+                                         row_filter=row_filter),
+            filenames,
+        ))
+
+    file_names = [fname for fname, item in zip(filenames, data)
+                  if item is not None for _ in range(item[0])]
+    data = [item for item in data if item is not None]
+    names = {}
+    for nrow, index, columns, _ in data:
+        for name in columns:
+            names.setdefault(name, None)
+
+    if not len(data):
+        return pd.DataFrame()
+
+    nan = float('nan')
+    out = {}
+    for name in names:
+        kinds = []
+        values = []
+        for nrow, _, columns, _ in data:
+            if name in columns:
+                kinds.append(columns[name][0])
+                values.extend(columns[name][1])
+
+            else:
+                kinds.append('missing')
+                values.extend([nan] * nrow)
+
+        out[name] = _make_csv_array(values, _get_common_csv_dtype(kinds))
+
+    if filename_col is not None:
+        out[filename_col] = pd.Series(file_names, dtype='str')
+
+    index_values = [val for item in data for val in item[1][1]]
+    # Empty indices are ignored by pandas.concat().
+    dtype = _find_common_csv_dtype([item[1][0] for item in data if item[3]]
+                                   or ['object'])
+    df = pd.DataFrame(out)
+    df.index = pd.Index(_make_csv_array(index_values, dtype), name=index_col)
+    return df
+
 def skip_lines(fd, num):
     for ii in range(num):
         line = next(fd)
@@ -231,13 +678,126 @@ def delete_from_store(filename, key):
     with HDFStore(filename, mode='r+') as store:
         store.remove(key)
 
-def repack_store(filename):
+def downcast_numeric(values):
+    """
+    Return numeric `values` (a Series) cast to the smallest integer or
+    floating point dtype that represents all the values exactly.
+    """
+    from pandas import to_numeric
+    from pandas.api.types import is_integer_dtype, is_float_dtype
+
+    if is_integer_dtype(values.dtype):
+        return to_numeric(values, downcast='integer')
+
+    elif is_float_dtype(values.dtype) and (values.dtype.itemsize > 4):
+        values32 = values.astype('float32')
+        same = (values32.astype(values.dtype) == values) | values.isna()
+        if same.all():
+            return values32
+
+    return values
+
+def to_categorical(df, keys=None, max_ratio=None, downcast=False):
+    """
+    Return a copy of `df` with the columns in `keys` (all columns if None)
+    converted to the categorical dtype. Columns with unhashable values are
+    left intact.
+
+    If `max_ratio` is given, only the columns with the ratio of the number of
+    distinct values to the number of rows less than or equal to `max_ratio`
+    are converted. If `downcast` is True, the numeric columns are not
+    converted, but downcast using :func:`downcast_numeric()`, so that they
+    can still be compared by magnitude.
+    """
+    from pandas import CategoricalDtype
+    from pandas.api.types import is_numeric_dtype, is_bool_dtype
+
+    if keys is None:
+        keys = df.columns
+
+    df = df.copy()
+    for key in keys:
+        if (key not in df) or isinstance(df[key].dtype, CategoricalDtype):
+            continue
+
+        values = df[key]
+        if (downcast and is_numeric_dtype(values.dtype)
+            and not is_bool_dtype(values.dtype)):
+            df[key] = downcast_numeric(values)
+            continue
+
+        try:
+            if ((max_ratio is not None) and len(values)
+                and (values.nunique(dropna=False)
+                     > max_ratio * len(values))):
+                continue
+
+            df[key] = values.astype('category')
+
+        except TypeError:
+            pass
+
+    return df
+
+def add_categories(df, row):
+    """
+    Add the values of `row` (a dict-like) missing in the categories of the
+    corresponding categorical columns of `df`, in place, so that `row` can be
+    set into `df`.
+    """
+    from pandas import CategoricalDtype, isna
+    from pandas.api.types import is_scalar
+
+    for key, val in row.items():
+        if (key not in df) or not isinstance(df[key].dtype, CategoricalDtype):
+            continue
+
+        if not is_scalar(val) or isna(val):
+            continue
+
+        cat = df[key].cat
+        if val not in cat.categories:
+            df[key] = cat.add_categories([val])
+
+def from_categorical(df, keys=None):
+    """
+    Return a copy of `df` with the categorical columns in `keys` (all columns
+    if None) converted to the dtype of their categories.
+    """
+    from pandas import CategoricalDtype
+
+    if keys is None:
+        keys = df.columns
+
+    df = df.copy()
+    for key in keys:
+        if (key not in df) or not isinstance(df[key].dtype, CategoricalDtype):
+            continue
+
+        try:
+            df[key] = df[key].astype(df[key].cat.categories.dtype)
+
+        except (TypeError, ValueError):
+            df[key] = df[key].astype(object)
+
+    return df
+
+def repack_store(filename, complib=None, complevel=None):
+    """
+    Repack the HDF5 file using ptrepack, keeping the table indexes. If
+    `complib` and/or `complevel` are given, the data are recompressed.
+    """
     with tempfile.TemporaryDirectory() as tmp:
         path = os.path.join(tmp, 'repack.h5')
 
-        cmd = ('ptrepack --chunkshape=auto --propindexes {} {}'
-               .format(filename, path)
-               .split())
+        cmd = ['ptrepack', '--chunkshape=auto', '--propindexes']
+        if complib is not None:
+            cmd.append('--complib={}'.format(complib))
+
+        if complevel is not None:
+            cmd.append('--complevel={}'.format(complevel))
+
+        cmd.extend([filename, path])
 
         if subprocess.call(cmd) == 0:
             shutil.move(path, filename)
@@ -2,7 +2,9 @@ from pyparsing import (Word, Group, Suppress, Combine, Optional,
                        Forward, Empty, quotedString, oneOf, removeQuotes,
                        delimitedList, nums, alphas, alphanums,
                        Keyword, CaselessLiteral)
-from functools import partial
+from functools import partial, lru_cache
+from copy import copy, deepcopy
+import re
 
 (lparen, rparen, lbrack, rbrack,
  lbrace, rbrace, colon, equal_sign) = map(Suppress, '()[]{}:=')
@@ -120,12 +122,46 @@ def get_standard_type_defs(word=word_free):
     return defs
 
 def create_list_bnf(free_word=False):
+    """
+    Return the grammar of a list. The grammars are created only once.
+    """
+    return _create_list_bnf(bool(free_word))
+
+@lru_cache(maxsize=None)
+def _create_list_bnf(free_word):
     word = word_free if free_word else word_strict
     defs = get_standard_type_defs(word)
     arg = defs['list_item'].copy()
 
     return list_of(arg) | Empty()
 
+@lru_cache(maxsize=1024)
+def _parse_string(string, kind, allow_tuple, free_word):
+    if kind == 'list':
+        parser = create_list_bnf(free_word=free_word)
+
+    else:
+        parser = create_dict_bnf(allow_tuple=allow_tuple, free_word=free_word)
+
+    try:
+        return True, list(parser.parseString(string, parseAll=True))
+
+    except Exception as exc:
+        # Cache also the failures, e.g. of load_options() values.
+        return False, exc
+
+def _parse_cached(string, kind, allow_tuple=False, free_word=False):
+    """
+    Parse `string` using the cached grammar of the given `kind` ('list' or
+    'dict'). The parsed results of recent strings are cached, a deep copy is
+    returned, as the results are mutable.
+    """
+    ok, out = _parse_string(string, kind, bool(allow_tuple), bool(free_word))
+    if not ok:
+        raise copy(out)
+
+    return deepcopy(out)
+
 def parse_as_list(string, free_word=False):
     """
     Parse `string` and return a list.
@@ -136,12 +172,18 @@ def parse_as_list(string, free_word=False):
     if isinstance(string, list):
         return string
 
-    parser = create_list_bnf(free_word=free_word)
-    out = list(parser.parseString(string, parseAll=True))
+    out = _parse_cached(string, 'list', free_word=free_word)
 
     return out
 
 def create_dict_bnf(allow_tuple=False, free_word=False):
+    """
+    Return the grammar of a dict. The grammars are created only once.
+    """
+    return _create_dict_bnf(bool(allow_tuple), bool(free_word))
+
+@lru_cache(maxsize=None)
+def _create_dict_bnf(allow_tuple, free_word):
     word = word_free if free_word else word_strict
     defs = get_standard_type_defs(word)
     empty = Empty()
@@ -151,6 +193,143 @@ def create_dict_bnf(allow_tuple=False, free_word=False):
     else:
         return defs['dict'].inner | empty
 
+# The whitespace and digits as in pyparsing.
+_flat_token = re.compile(r"""[ \t\n\r]*(?:
+    (?P<quoted>'[^'\\\n\r]*'|"[^"\\\n\r]*")
+    |(?P<punct>[=,\[\]])
+    |(?P<bare>[^ \t\n\r=,\[\]'"(){}:]+)
+)""", re.VERBOSE)
+_flat_int = re.compile(r'[+-]?[0-9]+')
+_flat_real = re.compile(r'[+-]?[0-9]+(?:\.[0-9]*(?:[eE][+-]?[0-9]+)?'
+                        r'|\.?[0-9]*[eE][+-]?[0-9]+)')
+_flat_word_strict = re.compile(r'[A-Za-z][A-Za-z0-9_]*')
+_flat_word_free = re.compile(r'[A-Za-z0-9@_\-/.+*]+')
+
+class _NotFlat(Exception):
+    pass
+
+def _tokenize_flat(string, free_word=False):
+    """
+    Split `string` into (kind, text) tokens, where kind is 'quoted', 'punct'
+    or 'bare'. Raises _NotFlat for characters of nested or unusual input.
+    """
+    if '\t' in string:
+        # pyparsing expands tabs before parsing, also in quoted strings.
+        raise _NotFlat
+
+    tokens = []
+    pos = 0
+    end = len(string.rstrip(' \t\n\r'))
+    while pos < end:
+        match = _flat_token.match(string, pos)
+        if match is None:
+            raise _NotFlat
+
+        kind = match.lastgroup
+        if tokens and (kind != 'punct') and (tokens[-1][0] != 'punct'):
+            # Two adjacent items without a separator.
+            raise _NotFlat
+
+        pos = match.end()
+        if (free_word and (kind == 'bare')
+            and string[pos:pos + 1] in (' ', '\t', '\n', '\r')):
+            # The free word grammar matches the trailing whitespace, so that
+            # it wins over numbers etc.
+            raise _NotFlat
+
+        tokens.append((kind, match.group(kind)))
+
+    return tokens
+
+def _convert_flat(token, free_word):
+    """
+    Convert a quoted or bare token to a value as the `list_item` grammar
+    element of :func:`get_standard_type_defs()` does.
+    """
+    kind, text = token
+    if kind == 'quoted':
+        return text[1:-1]
+
+    elif kind != 'bare':
+        raise _NotFlat
+
+    low = text.lower()
+    if low == 'none':
+        return None
+
+    elif low == 'true':
+        return True
+
+    elif low == 'false':
+        return False
+
+    elif low.endswith('j'):
+        raise _NotFlat
+
+    elif _flat_int.fullmatch(text):
+        return int(text)
+
+    elif _flat_real.fullmatch(text):
+        return float(text)
+
+    word = _flat_word_free if free_word else _flat_word_strict
+    if word.fullmatch(text):
+        return text
+
+    raise _NotFlat
+
+def _parse_flat_dict(string, free_word=False):
+    """
+    Parse flat dict-like `string` of ``key=value`` items with scalar or flat
+    list values without using pyparsing. Returns None for other input, that
+    needs the full grammar of :func:`create_dict_bnf()`.
+    """
+    try:
+        tokens = _tokenize_flat(string, free_word=free_word)
+        out = {}
+        ii = 0
+        num = len(tokens)
+        while ii < num:
+            key = _convert_flat(tokens[ii], free_word)
+            if (ii + 1 >= num) or (tokens[ii + 1] != ('punct', '=')):
+                raise _NotFlat
+
+            ii += 2
+            if (ii >= num) or (tokens[ii] == ('punct', ',')):
+                val = None
+
+            elif tokens[ii] == ('punct', '['):
+                val = []
+                ii += 1
+                while tokens[ii] != ('punct', ']'):
+                    val.append(_convert_flat(tokens[ii], free_word))
+                    ii += 1
+                    if tokens[ii] == ('punct', ','):
+                        ii += 1
+
+                    elif tokens[ii] != ('punct', ']'):
+                        raise _NotFlat
+
+                ii += 1
+
+            else:
+                val = _convert_flat(tokens[ii], free_word)
+                ii += 1
+
+            out[key] = val
+            if ii < num:
+                if tokens[ii] != ('punct', ','):
+                    raise _NotFlat
+
+                ii += 1
+                if (ii < num) and (tokens[ii][0] == 'punct'):
+                    raise _NotFlat
+
+    except (_NotFlat, IndexError):
+        return None
+
+    return out
+
 def parse_as_dict(string, allow_tuple=False, free_word=False, defaults=None):
     """
     Parse `string` and return a dictionary.
@@ -179,10 +358,14 @@ def parse_as_dict(string, allow_tuple=False, free_word=False, defaults=None):
 
         return string
 
-    parser = create_dict_bnf(allow_tuple=allow_tuple, free_word=free_word)
-
     out = defaults
-    for r in parser.parseString(string, parseAll=True):
+    flat = _parse_flat_dict(string, free_word=free_word)
+    if flat is not None:
+        out.update(flat)
+        return out
+
+    for r in _parse_cached(string, 'dict', allow_tuple=allow_tuple,
+                           free_word=free_word):
         out.update(r)
 
     return out
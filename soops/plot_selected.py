@@ -7,8 +7,15 @@ import matplotlib.pyplot as plt
 from soops.base import output
 from soops.parsing import parse_as_dict
 
-def select_by_keys(df, keys):
-    selected = {key : sorted(df[key].unique()) for key in keys}
+def select_by_keys(df, keys, cache=None):
+    """
+    Return a dict with the sorted unique values of `keys` columns of `df`,
+    see :func:`soops.scoop_outputs.get_uniques()`.
+    """
+    from soops.scoop_outputs import get_uniques
+
+    uniques = get_uniques(df, keys, cache=cache)
+    selected = {key : uniques[key] for key in keys}
     return selected
 
 def normalize_selected(selected):
@@ -142,6 +149,87 @@ def get_row_style_used(row, selected, compares, styles, used, **plot_kwargs):
 
     return style_kwargs, indices, used
 
+def _find_in_selected(svals, dval, cmp):
+    for ii, sval in enumerate(svals):
+        if cmp(sval, dval):
+            return ii
+
+    return -1
+
+def get_codes_in_selected(values, svals, cmp):
+    """
+    Return the indices of the first values in `svals` matching each of
+    `values` according to `cmp`, or -1 for no match.
+
+    The comparisons are evaluated for the unique values only. The NA values
+    and values that cannot be factorized (e.g. lists) are compared one by
+    one.
+    """
+    import pandas as pd
+
+    values = pd.Series(values)
+    try:
+        codes, uniques = pd.factorize(values)
+
+    except TypeError:
+        return np.array([_find_in_selected(svals, val, cmp)
+                         for val in values], dtype=np.int64)
+
+    ucodes = np.array([_find_in_selected(svals, val, cmp) for val in uniques]
+                      + [-1], dtype=np.int64)
+    out = ucodes[codes]
+
+    ina = np.flatnonzero(codes < 0)
+    if len(ina):
+        out[ina] = [_find_in_selected(svals, val, cmp)
+                    for val in values.iloc[ina]]
+
+    return out
+
+def get_rows_styles(df, selected, compares, styles, used=None,
+                    **plot_kwargs):
+    """
+    The vectorized equivalent of calling :func:`get_row_style_used()` for
+    all rows of `df`.
+
+    The rows are mapped to integer codes of the selected values of each key
+    at once, and the style keyword arguments are computed once per unique
+    combination of the codes.
+
+    Returns
+    -------
+    icombos : array of ints
+        The index into `combo_styles` for each row, or -1 for rows not
+        selected.
+    combo_styles : list of dicts
+        The style keyword arguments for each combination of the selected
+        values present in `df`.
+    used : dict
+        The updated `used` argument.
+    """
+    _cmp = lambda a, b: a == b
+
+    keys = list(selected.keys())
+    codes = np.empty((len(keys), len(df)), dtype=np.int64)
+    for ik, key in enumerate(keys):
+        codes[ik] = get_codes_in_selected(df[key], selected[key],
+                                          compares.get(key, _cmp))
+
+    icombos = np.full(len(df), -1, dtype=np.int64)
+    ii = np.flatnonzero((codes >= 0).all(axis=0))
+    combos, icombos[ii] = np.unique(codes[:, ii], axis=1, return_inverse=True)
+
+    combo_styles = []
+    for combo in combos.T:
+        indices = dict(zip(keys, combo.tolist()))
+        style_kwargs = get_plot_style(indices, styles)
+        style_kwargs.update(plot_kwargs)
+        combo_styles.append(style_kwargs)
+
+        used = update_used(used, indices)
+
+    return icombos, combo_styles, used
+
 def get_legend_items(selected, styles, used=None, format_labels=None):
     if format_labels is None:
         format_labels = lambda key, iv, val: '{}: {}'.format(key, val)
@@ -235,27 +323,208 @@ def add_legend(ax, lines, labels, per_parameter=False, max_legend_labels=None,
     if leg is not None:
         leg.get_frame().set_alpha(frame_alpha)
 
+def downsample_lttb(x, y, num):
+    """
+    Downsample series using the Largest-Triangle-Three-Buckets algorithm.
+
+    Parameters
+    ----------
+    x, y : array
+        The series coordinates, `x` sorted. Several series of the same length
+        can be downsampled at once, if `x` and `y` are 2D arrays with a series
+        in each row (`x` can be also 1D if shared).
+    num : int
+        The number of points to keep, at least 3.
+
+    Returns
+    -------
+    ii : array of ints
+        The indices of the kept points in each series, including the first
+        and last one.
+    """
+    y = np.asarray(y, dtype=np.float64)
+    x = np.broadcast_to(np.asarray(x, dtype=np.float64), y.shape)
+    n = y.shape[-1]
+    if num >= n:
+        return np.broadcast_to(np.arange(n), y.shape).copy()
+
+    if num < 3:
+        raise ValueError('at least 3 points must be kept! ({})'.format(num))
+
+    is_1d = y.ndim == 1
+    x, y = np.atleast_2d(x), np.atleast_2d(y)
+    rows = np.arange(len(y))
+
+    # The num - 2 buckets of the inner points and their centroids.
+    bounds = (np.arange(num - 1) * ((n - 2) / (num - 2))).astype(np.int64) + 1
+    bounds[-1] = n - 1
+    sizes = np.diff(bounds)
+    cxs = np.add.reduceat(x[:, :n-1], bounds[:-1], axis=1) / sizes
+    cys = np.add.reduceat(y[:, :n-1], bounds[:-1], axis=1) / sizes
+
+    ii = np.empty((len(y), num), dtype=np.int64)
+    ii[:, 0], ii[:, -1] = 0, n - 1
+    ia = ii[:, 0]
+    for ib in range(num - 2):
+        i0, i1 = bounds[ib], bounds[ib + 1]
+        if ib < num - 3:
+            cx, cy = cxs[:, ib + 1 : ib + 2], cys[:, ib + 1 : ib + 2]
+
+        else:
+            cx, cy = x[:, -1:], y[:, -1:]
+
+        # Twice the areas of triangles (a, candidate, next bucket centroid).
+        xa, ya = x[rows, ia][:, None], y[rows, ia][:, None]
+        areas = np.abs((xa - cx) * (y[:, i0:i1] - ya)
+                       - (xa - x[:, i0:i1]) * (cy - ya))
+        ia = i0 + np.argmax(np.nan_to_num(areas, nan=-1.0), axis=1)
+        ii[:, ib + 1] = ia
+
+    return ii[0] if is_1d else ii
+
+def _get_rows_data(df, irs, column, xaxis, max_points):
+    """
+    Return the (x, y) data of `df` rows `irs`, downsampled to `max_points`.
+    """
+    data = []
+    for ir in irs:
+        y = np.atleast_1d(np.asarray(df.loc[df.index[ir], column],
+                                     dtype=np.float64))
+        if xaxis is None:
+            x = np.arange(len(y), dtype=np.float64)
+
+        else:
+            x = np.atleast_1d(np.asarray(df.loc[df.index[ir], xaxis],
+                                         dtype=np.float64))
+
+        data.append((x, y))
+
+    if max_points is None:
+        return data
+
+    # Downsample the series of the same length at once.
+    lengths = {}
+    for ii, (x, y) in enumerate(data):
+        if len(y) > max_points:
+            lengths.setdefault(len(y), []).append(ii)
+
+    for iis in lengths.values():
+        xs = np.array([data[ii][0] for ii in iis])
+        ys = np.array([data[ii][1] for ii in iis])
+        ik = downsample_lttb(xs, ys, max_points)
+        xs = np.take_along_axis(xs, ik, axis=1)
+        ys = np.take_along_axis(ys, ik, axis=1)
+        for ii, x, y in zip(iis, xs, ys):
+            data[ii] = (x, y)
+
+    return data
+
+_marker_keys = {'marker', 'markersize', 'ms', 'markerfacecolor', 'mfc',
+                'markerfacecoloralt', 'mfcalt', 'markeredgecolor', 'mec',
+                'markeredgewidth', 'mew', 'fillstyle', 'markevery'}
+_line_aliases = {'c' : 'color', 'ls' : 'linestyle', 'lw' : 'linewidth'}
+
+def plot_batch(ax, data, **style_kwargs):
+    """
+    Plot the (x, y) `data` series with the same Line2D style kwargs as a
+    single LineCollection, and the markers, if any, as a single line with
+    NaN-separated series and no line style.
+
+    If some kwargs are not supported by LineCollection (e.g. `drawstyle`),
+    the series are plotted one by one as Line2D instances. Without a `color`
+    kwarg, the color is taken from the ``axes.prop_cycle`` rcParams by the
+    number of collections in `ax`.
+
+    Returns
+    -------
+    artists : list
+        The LineCollection and/or the Line2D instances.
+    """
+    from matplotlib.collections import LineCollection
+
+    line_kwargs = {_line_aliases.get(key, key) : val
+                   for key, val in style_kwargs.items()
+                   if key not in _marker_keys}
+    marker_kwargs = {key : val for key, val in style_kwargs.items()
+                     if key in _marker_keys}
+    if not all(hasattr(LineCollection, 'set_' + key) for key in line_kwargs):
+        return [line for x, y in data
+                for line in ax.plot(x, y, **style_kwargs)]
+
+    if ('color' not in line_kwargs) and len(data):
+        colors = plt.rcParams['axes.prop_cycle'].by_key().get('color', ['k'])
+        line_kwargs['color'] = colors[len(ax.collections) % len(colors)]
+
+    artists = []
+    if line_kwargs.get('linestyle', '-') not in ('None', 'none', '', ' '):
+        lc = LineCollection([np.column_stack(xy) for xy in data],
+                            **line_kwargs)
+        ax.add_collection(lc)
+        artists.append(lc)
+
+    if marker_kwargs.get('marker', 'None') not in ('None', 'none', '', ' '):
+        nan = np.array([np.nan])
+        xs = np.concatenate([ii for x, _ in data for ii in (x, nan)][:-1])
+        ys = np.concatenate([ii for _, y in data for ii in (y, nan)][:-1])
+        line_kwargs.pop('label', None)
+        line_kwargs['linestyle'] = 'None'
+        artists.extend(ax.plot(xs, ys, **line_kwargs, **marker_kwargs))
+
+    ax.autoscale_view()
+
+    return artists
+
 def plot_selected(ax, df, column, selected, compares, styles,
                   format_labels=None, xaxis=None, legend_kwargs=None,
-                  make_legend=True, max_legend_labels=None, **plot_kwargs):
+                  make_legend=True, max_legend_labels=None, batch=False,
+                  max_points=None, **plot_kwargs):
+    """
+    Plot `column` (vs. `xaxis`) values of the `df` rows with `selected`
+    parameter values, using the parameter `styles`.
+
+    If `batch` is True, the rows with the same style are plotted by
+    :func:`plot_batch()` as a single artist, which is much faster for
+    thousands of rows. The rows without a color style then share a color, the
+    style groups are drawn in the order of their first appearance in `df`,
+    and `markevery` applies to all rows of a group together.
+
+    If `max_points` is given, the rows with more values are downsampled to
+    `max_points` points by :func:`downsample_lttb()`. In the batched mode or
+    if `max_points` is given, the values must be numeric.
+    """
     if ax is None:
         _, ax = plt.subplots()
 
     if legend_kwargs is None:
         legend_kwargs = {}
 
-    used = None
-    for ir in range(len(df)):
-        style_kwargs, indices, used = get_row_style_used(
-            df.iloc[ir], selected, compares, styles, used, **plot_kwargs
-        )
-        if style_kwargs is None: continue
-        if xaxis is None:
-            ax.plot(df.loc[df.index[ir], column], **style_kwargs)
+    icombos, combo_styles, used = get_rows_styles(
+        df, selected, compares, styles, **plot_kwargs
+    )
+    if batch:
+        groups = {}
+        for ir in np.flatnonzero(icombos >= 0):
+            groups.setdefault(icombos[ir], []).append(ir)
 
-        else:
-            ax.plot(df.loc[df.index[ir], xaxis],
-                    df.loc[df.index[ir], column], **style_kwargs)
+        for ic, irs in groups.items():
+            data = _get_rows_data(df, irs, column, xaxis, max_points)
+            plot_batch(ax, data, **combo_styles[ic])
+
+    elif max_points is not None:
+        irs = np.flatnonzero(icombos >= 0)
+        data = _get_rows_data(df, irs, column, xaxis, max_points)
+        for ir, (x, y) in zip(irs, data):
+            ax.plot(x, y, **combo_styles[icombos[ir]])
+
+    else:
+        for ir in np.flatnonzero(icombos >= 0):
+            style_kwargs = combo_styles[icombos[ir]]
+            if xaxis is None:
+                ax.plot(df.loc[df.index[ir], column], **style_kwargs)
+
+            else:
+                ax.plot(df.loc[df.index[ir], xaxis],
+                        df.loc[df.index[ir], column], **style_kwargs)
 
     lines, labels = get_legend_items(selected, styles, used=used,
                                      format_labels=format_labels)
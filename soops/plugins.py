@@ -1,5 +1,130 @@
+import os
+
 import matplotlib.pyplot as plt
 
+from soops.base import output
+
 def show_figures(df, data=None):
     plt.show()
     return data
+
+_render_worker_state = {}
+
+def _init_render_worker():
+    import matplotlib
+    matplotlib.use('Agg', force=True)
+
+def _render_selection(plot_fun, sdf, selection, filename, savefig_kwargs,
+                      kwargs):
+    fig = plot_fun(sdf, selection, **kwargs)
+    fig.savefig(filename, **savefig_kwargs)
+    plt.close(fig)
+
+    return filename
+
+def _render_selection_worker(sdf, selection, filename):
+    """
+    Render a selection of :func:`render_selections()` in a forked worker
+    process.
+    """
+    state = _render_worker_state
+    return _render_selection(state['plot_fun'], sdf, selection, filename,
+                             state['savefig_kwargs'], state['kwargs'])
+
+def get_selection_filename(filename, ii, selection):
+    """
+    Return the figure file name of the `ii`-th `selection`: `filename`
+    formatted with `ii` and the selection values, or the result of calling
+    ``filename(ii, selection)``.
+    """
+    if callable(filename):
+        return filename(ii, selection)
+
+    return filename.format(ii=ii, **selection)
+
+def render_selections(plot_fun, df, columns, uniques, filename, workers=None,
+                      savefig_kwargs=None, **kwargs):
+    """
+    Render a figure for each combination of the unique values of `columns`
+    present in `df`, as given by :func:`soops.scoop_outputs.iter_uniques()`.
+
+    The figures are created by ``plot_fun(sdf, selection, **kwargs)``, which
+    gets the rows `sdf` of `df` with the `selection` of values and returns a
+    matplotlib figure. The figures are saved and closed. If `workers` is
+    greater than one, they are rendered in a pool of forked worker processes
+    with the non-interactive matplotlib backend, and each worker receives only
+    its `sdf` slice.
+
+    Parameters
+    ----------
+    plot_fun : callable
+        The plotting function.
+    df : DataFrame
+        The data.
+    columns : list
+        The columns defining the selections.
+    uniques : dict
+        The unique values of `columns`, see
+        :func:`soops.scoop_outputs.get_uniques()`.
+    filename : str or callable
+        The figure file names, see :func:`get_selection_filename()`, for
+        example ``'output/win_rates-{ii:03d}.png'``.
+    workers : int, optional
+        The number of worker processes. If not given, the number of CPUs is
+        used.
+    savefig_kwargs : dict, optional
+        The keyword arguments of ``Figure.savefig()``.
+    **kwargs : keyword arguments
+        Passed to `plot_fun`.
+
+    Returns
+    -------
+    filenames : list
+        The saved figure file names in the order of the selections.
+    """
+    from soops.scoop_outputs import iter_uniques
+
+    if savefig_kwargs is None:
+        savefig_kwargs = {}
+
+    items = [(sdf, selection, get_selection_filename(filename, ii, selection))
+             for ii, selection, sdf in iter_uniques(df, columns, uniques)]
+
+    if workers is None:
+        workers = os.cpu_count() or 1
+
+    try:
+        import multiprocessing
+        mp_context = multiprocessing.get_context('fork')
+
+    except ValueError:
+        mp_context = None
+
+    if (workers <= 1) or (len(items) <= 1) or (mp_context is None):
+        return [_render_selection(plot_fun, sdf, selection, fname,
+                                  savefig_kwargs, kwargs)
+                for sdf, selection, fname in items]
+
+    from concurrent.futures import ProcessPoolExecutor
+
+    output('rendering {} figures using {} workers...'
+           .format(len(items), min(workers, len(items))))
+    _render_worker_state.update(
+        plot_fun=plot_fun,
+        savefig_kwargs=savefig_kwargs,
+        kwargs=kwargs,
+    )
+    try:
+        with ProcessPoolExecutor(max_workers=min(workers, len(items)),
+                                 mp_context=mp_context,
+                                 initializer=_init_render_worker) as pool:
+            futures = [pool.submit(_render_selection_worker, *item)
+                       for item in items]
+            filenames = [future.result() for future in futures]
+
+    finally:
+        _render_worker_state.clear()
+
+    output('...done')
+
+    return filenames
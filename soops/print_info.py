@@ -7,8 +7,6 @@ import sys
 import os.path as op
 import re
 
-import pandas as pd
-
 from soops.base import output, import_file
 from soops.cliargs import normalize_opt_args
 
@@ -19,6 +17,8 @@ def collect_keys(run_cmd, opt_args, omit=()):
     return sorted(keys)
 
 def explain_dir(dirname, keys):
+    import pandas as pd
+
     fname = op.join(dirname, 'soops-parameters.csv')
     df = pd.read_csv(fname, index_col='pkey')
     lmax = max(map(len, df.keys()))
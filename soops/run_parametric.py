@@ -8,20 +8,25 @@ import os
 import os.path as op
 import subprocess
 import hashlib
+import json
+import time
 from datetime import datetime
 
-import numpy as np
-import pandas as pd
-from dask.distributed import as_completed, Client, LocalCluster
-
 from soops.parsing import parse_as_dict
-from soops.base import output, import_file, product, Struct
+from soops.base import (output, import_file, product, get_product_size,
+                        Struct)
 from soops.cliargs import normalize_opt_args
-from soops.ioutils import ensure_path, save_options, locate_files
+from soops.ioutils import (ensure_path, save_options, locate_files,
+                           read_csv_files, to_categorical, add_categories)
 from soops.print_info import collect_keys
 from soops.timing import get_timestamp
 
 def make_key_list(key, obj):
+    from soops.sequences import LazySequence, KeyList
+
+    if isinstance(obj, LazySequence):
+        return KeyList(key, obj)
+
     return ([(ii, key, item) for ii, item in enumerate(obj)]
             if isinstance(obj, list) else [(0, key, obj)])
 
@@ -80,6 +85,146 @@ def run_with_psutil(cmd, options):
 
     return out
 
+def is_failed(result):
+    """
+    Return True, if `result` of a parameterized command run indicates a
+    failure: a timeout or a non-zero return code.
+    """
+    if isinstance(result, subprocess.CompletedProcess):
+        return result.returncode != 0
+
+    elif isinstance(result, int):
+        return result != 0
+
+    return isinstance(result, Exception)
+
+status_basename = 'soops-status.json'
+
+class RunStatus:
+    """
+    The live status of a parametric study run, written atomically as a small
+    JSON file `status_basename` in the run output directory, so that
+    soops-jobs can show it without loading the study.
+
+    The sets are counted as queued, running, finished, failed or skipped (not
+    recomputed). The running sets are estimated as the oldest submitted sets
+    that are not completed, up to the number of worker threads.
+    """
+
+    def __init__(self, output_dir, study_dir, num, n_threads,
+                 min_interval=1.0):
+        self.filename = op.join(output_dir, status_basename)
+        self.n_threads = n_threads
+        self.min_interval = min_interval
+
+        self.pending = {}
+        self.data = {
+            'pid' : os.getpid(),
+            'state' : 'submitting',
+            'output_dir' : op.abspath(output_dir),
+            'study_dir' : op.abspath(study_dir),
+            'log_file' : op.abspath(op.join(output_dir, 'output_log.txt')),
+            'start_time' : time.time(),
+            'update_time' : None,
+            'num' : num,
+            'submitted' : 0,
+            'queued' : 0,
+            'running' : 0,
+            'finished' : 0,
+            'failed' : 0,
+            'skipped' : 0,
+            'throughput' : None,
+            'eta' : None,
+            'last_dir' : None,
+            'running_dirs' : [],
+        }
+        self._run_time = None
+        self._write_time = 0.0
+        self.write(force=True)
+
+    def submit(self, pkey, podir, skipped=False):
+        """
+        Record a submitted parameter set.
+        """
+        data = self.data
+        data['submitted'] += 1
+        if skipped:
+            data['skipped'] += 1
+
+        else:
+            if self._run_time is None:
+                self._run_time = time.time()
+
+            self.pending[pkey] = podir
+            data['last_dir'] = op.abspath(podir)
+
+        self.write()
+
+    def complete(self, pkey, failed=False):
+        """
+        Record a completed parameter set.
+        """
+        if self.pending.pop(pkey, None) is None:
+            return
+
+        self.data['failed' if failed else 'finished'] += 1
+        self.write()
+
+    def set_state(self, state):
+        self.data['state'] = state
+        self.write(force=True)
+
+    def write(self, force=False):
+        """
+        Write the status file, at most once per `min_interval` seconds, unless
+        `force` is True.
+        """
+        now = time.time()
+        if not force and ((now - self._write_time) < self.min_interval):
+            return
+
+        data = self.data
+        running = list(self.pending.values())[:self.n_threads]
+        data['running'] = len(running)
+        data['queued'] = len(self.pending) - len(running)
+        data['running_dirs'] = [op.abspath(ii) for ii in running]
+
+        done = data['finished'] + data['failed']
+        if done and (self._run_time is not None) and (now > self._run_time):
+            data['throughput'] = done / (now - self._run_time)
+            data['eta'] = len(self.pending) / data['throughput']
+
+        data['update_time'] = now
+
+        tmp_filename = '{}.{}.tmp'.format(self.filename, os.getpid())
+        try:
+            with open(tmp_filename, 'w') as fd:
+                json.dump(data, fd, indent=1)
+            os.replace(tmp_filename, self.filename)
+
+        except OSError as exc:
+            output('cannot write status {}: {}'.format(self.filename, exc),
+                   verbosity=2)
+
+        self._write_time = now
+
+def read_status(output_dir):
+    """
+    Read the status file of a run with the given output directory.
+
+    Returns
+    -------
+    status : dict or None
+        The status written by :class:`RunStatus`, or None, if the file does
+        not exist or cannot be read.
+    """
+    try:
+        with open(op.join(output_dir, status_basename)) as fd:
+            return json.load(fd)
+
+    except (OSError, ValueError):
+        return None
+
 def get_contracts(contract_seqs, par_seqs, key_order):
     if contract_seqs is not None:
         contracts = [[key_order.index(key) for key in contract]
@@ -171,6 +316,9 @@ helps = {
        values in 'conf' positional argument""",
     'silent' :
     'do not print messages to screen',
+    'verbosity' :
+    """the verbosity of messages: 1: parameter set summaries only,
+       2: also parameters, commands and results [default: %(default)s]""",
     'shell' :
     'run ipython shell after all computations',
     'output_dir' :
@@ -225,6 +373,9 @@ def parse_args(args=None):
     parser.add_argument('--silent',
                         action='store_false', dest='verbose',
                         default=True, help=helps['silent'])
+    parser.add_argument('--verbosity', action='store', type=int,
+                        dest='verbosity', choices=[1, 2],
+                        default=2, help=helps['verbosity'])
     parser.add_argument('--shell',
                         action='store_true', dest='shell',
                         default=False, help=helps['shell'])
@@ -259,6 +410,10 @@ def parse_args(args=None):
     return options
 
 def run_parametric(options):
+    import pandas as pd
+    from dask.distributed import as_completed, Client, LocalCluster
+    from soops.sequences import is_sequence_def, parse_sequence
+
     output.prefix = 'run:'
 
     run_mod = import_file(options.run_mod)
@@ -282,12 +437,9 @@ def run_parametric(options):
     dconf, config, skeys = get_study_conf(options.conf, study=options.study,
                                           extra_conf=options.extra_conf)
 
-    seq_keys = [key for key, val in dconf.items()
-                if isinstance(val, str) and
-                (val.startswith('@arange') or val.startswith('@linspace'))]
-    for key in seq_keys:
-        sfun = 'np.' + dconf[key][1:]
-        dconf[key] = eval(sfun, {'np' : np}, {}).tolist()
+    for key, val in dconf.items():
+        if is_sequence_def(val):
+            dconf[key] = parse_sequence(val)
 
     if options.generate_pars is not None:
         if op.isfile(options.conf) and (isinstance(options.generate_pars, str)):
@@ -305,7 +457,11 @@ def run_parametric(options):
         gkeys = [key for key, val in dconf.items() if val == '@generate']
         output('generated parameters:', gkeys)
 
-        gconf = generate_pars(Struct(dgenerate_pars), gkeys, dconf, options)
+        # The user functions get the sequence values as lists.
+        from soops.sequences import LazySequence
+        ldconf = {key : list(val) if isinstance(val, LazySequence) else val
+                  for key, val in dconf.items()}
+        gconf = generate_pars(Struct(dgenerate_pars), gkeys, ldconf, options)
         if set(gkeys) != set(gconf.keys()):
             output('conf:\n{}'.format(sorted(gkeys)))
             output('generated:\n{}'.format(sorted(gconf.keys())))
@@ -340,7 +496,8 @@ def run_parametric(options):
                  quote_command_line=True)
 
     output.set_output(filename=op.join(options.output_dir, 'output_log.txt'),
-                      combined=options.verbose)
+                      combined=options.verbose, buffered=True)
+    output.verbosity = options.verbosity
 
     par_seqs = [
         make_key_list(key, dconf.get(key, defaults.get(key, '@undefined')))
@@ -358,23 +515,16 @@ def run_parametric(options):
     output_dir_template = dconf[output_dir_key]
 
     # Load existing parameter sets.
-    dfs = []
     root_dir = output_dir_template.split('%s')[0]
-    for fname in locate_files('soops-parameters.csv', root_dir=root_dir):
-        if op.exists(fname):
-            try:
-                df = pd.read_csv(fname, index_col='pkey', na_filter=False)
-
-            except pd.errors.EmptyDataError:
-                continue
-
-            else:
-                dfs.append(df)
-
-    if len(dfs):
-        apdf = pd.concat(dfs)
+    apdf = read_csv_files(locate_files('soops-parameters.csv',
+                                       root_dir=root_dir),
+                          index_col='pkey', na_filter=False)
+    if len(apdf):
         apdf['iset'] = apdf['iset'].map(lambda x: f'{x:03d}')
         iseq = apdf[output_dir_key].apply(_get_iset).max() + 1
+        # Encode the repeated parameter values.
+        apdf = to_categorical(apdf, [key for key in apdf.columns
+                                     if key != 'finished'], max_ratio=0.5)
 
     else:
         apdf = pd.DataFrame()
@@ -382,16 +532,16 @@ def run_parametric(options):
 
     pkeys = set(apdf.index)
 
-    count = 0
-    for _all_pars in product(*par_seqs, contracts=contracts):
-        count += 1
-
+    count = get_product_size(*par_seqs, contracts=contracts)
     output('number of parameter sets:', count)
 
     cluster = LocalCluster(n_workers=options.n_workers,
                            **options.cluster_kwargs)
     client = Client(cluster)
 
+    status = RunStatus(options.output_dir, root_dir, count,
+                       sum(client.nthreads().values()))
+
     calls = []
     for _all_pars in product(*par_seqs, contracts=contracts):
         _it, keys, vals = zip(*_all_pars)
@@ -413,7 +563,7 @@ def run_parametric(options):
             new = True
 
         output('parameter set:', iset)
-        output(_all_pars)
+        output(_all_pars, verbosity=2)
 
         all_pars[output_dir_key] = podir
         ensure_path(podir + op.sep)
@@ -436,6 +586,7 @@ def run_parametric(options):
                        index_label='pkey')
 
             if pkey in pkeys:
+                add_categories(apdf, sdf.iloc[0])
                 apdf.loc[pkey] = sdf.iloc[0]
 
             else:
@@ -445,7 +596,7 @@ def run_parametric(options):
             gen_run_script(podir, cmd)
             dtime = datetime.now()
             output('submitting at', get_timestamp(dtime=dtime))
-            output(cmd)
+            output(cmd, verbosity=2)
 
             if options.dry_run:
                 call = client.submit(lambda: None)
@@ -469,6 +620,7 @@ def run_parametric(options):
             call.all_pars = all_pars
             call.dtime = dtime
             calls.append(call)
+            status.submit(pkey, podir)
 
             if new:
                 iseq += 1
@@ -484,9 +636,11 @@ def run_parametric(options):
             call.all_pars = all_pars
             call.dtime = datetime.now()
             calls.append(call)
+            status.submit(pkey, podir, skipped=True)
 
     pfilename = op.join(options.output_dir, 'all_parameters.csv')
     apdf.to_csv(pfilename, mode='w', index_label='pkey')
+    status.set_state('running')
 
     for call in as_completed(calls):
         dtime = datetime.now()
@@ -495,9 +649,12 @@ def run_parametric(options):
         output('in', call.podir)
         output('completed at', get_timestamp(dtime=dtime) , 'in',
                dtime - call.dtime)
-        output(call.all_pars)
-        output(call)
-        output(call.result())
+        if output.is_shown(verbosity=2):
+            output(call.all_pars, verbosity=2)
+            output(call, verbosity=2)
+            output(call.result(), verbosity=2)
+        status.complete(call.pkey, failed=((call.status == 'error')
+                                           or is_failed(call.result())))
         if call.update_parameters:
             finished = True
             if options.timeout is not None:
@@ -511,12 +668,15 @@ def run_parametric(options):
                        index_label='pkey')
             apdf.to_csv(pfilename, mode='w', index_label='pkey')
 
+    status.set_state('done')
     client.close()
+    output.flush()
 
     if options.shell:
         from soops.base import shell; shell()
 
     cluster.close()
+    output.close()
 
 def main():
     options = parse_args()
@@ -4,29 +4,254 @@ Scoop output files.
 """
 from argparse import ArgumentParser, RawDescriptionHelpFormatter
 import sys
+import os
 import os.path as op
 import glob
+import json
 from datetime import datetime
 import warnings
+from functools import partial
 
 import numpy as np
 import pandas as pd
 
 from soops.base import output, product, flatten_dict, import_file, Struct
 from soops.parsing import parse_as_dict, parse_as_list
-from soops.ioutils import load_options, locate_files, ensure_path
+from soops.ioutils import (load_options, locate_files, ensure_path,
+                           to_categorical, from_categorical)
+
+class LazyArray:
+    """
+    A proxy of an array that is loaded by calling `loader()` on the first
+    access to its data. When pickled, e.g. when stored in a pandas HDF5 store,
+    the loaded array is pickled instead of the proxy.
+    """
+
+    def __init__(self, loader):
+        self._loader = loader
+        self._array = None
+
+    def get(self):
+        if self._array is None:
+            self._array = self._loader()
+
+        return self._array
+
+    def __array__(self, dtype=None, copy=None):
+        arr = np.asarray(self.get())
+        return arr if dtype is None else arr.astype(dtype)
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+
+        return getattr(self.get(), name)
+
+    def __getitem__(self, ii):
+        return self.get()[ii]
+
+    def __len__(self):
+        return len(self.get())
+
+    def __iter__(self):
+        return iter(self.get())
+
+    def __reduce__(self):
+        return np.asarray(self.get()).__reduce__()
+
+    def __repr__(self):
+        if self._array is None:
+            return '{}(<not loaded>)'.format(self.__class__.__name__)
+
+        else:
+            return '{}({!r})'.format(self.__class__.__name__, self._array)
+
+def _mmap_npz_member(filename, name, mmap_mode='r'):
+    """
+    Memory-map the array `name` stored in the .npz file `filename`. Return
+    None if the member is compressed or contains Python objects.
+    """
+    import zipfile
+    import struct
+    from numpy.lib import format as npformat
+
+    with zipfile.ZipFile(filename) as zf:
+        info = zf.getinfo(name + '.npy')
+
+    if info.compress_type != zipfile.ZIP_STORED:
+        return None
+
+    with open(filename, 'rb') as fd:
+        # Skip the local file header of the member.
+        fd.seek(info.header_offset + 26)
+        nlen, elen = struct.unpack('<HH', fd.read(4))
+        fd.seek(nlen + elen, 1)
+
+        version = npformat.read_magic(fd)
+        if version == (1, 0):
+            shape, fortran_order, dtype = npformat.read_array_header_1_0(fd)
+
+        else:
+            shape, fortran_order, dtype = npformat.read_array_header_2_0(fd)
+
+        offset = fd.tell()
+
+    if dtype.hasobject:
+        return None
+
+    return np.memmap(filename, dtype=dtype, mode=mmap_mode, shape=shape,
+                     order='F' if fortran_order else 'C', offset=offset)
+
+def load_text_array(filename, engine='pandas', usecols=None, skiprows=0,
+                    max_rows=None, dtype=float, downcast=None, comments='#',
+                    delimiter=None):
+    """
+    Load an array from a text file using the given engine. The arguments
+    have the same meaning as in ``np.loadtxt()``, the result is squeezed in
+    the same way.
+
+    Parameters
+    ----------
+    engine : 'numpy', 'pandas' or 'fromfile'
+        The 'numpy' engine uses ``np.loadtxt()``, 'pandas' uses the C parser
+        of ``pd.read_csv()`` and 'fromfile' uses ``np.fromfile()``. The
+        'fromfile' engine is the fastest, but it supports only files with
+        whitespace-separated numbers without comments after the skipped rows.
+    downcast : None, 'integer', 'signed', 'unsigned' or 'float'
+        If given, downcast the array to the smallest possible dtype, see
+        ``pd.to_numeric()``.
+    """
+    if isinstance(usecols, int):
+        usecols = [usecols]
+
+    if engine == 'numpy':
+        arr = np.loadtxt(filename, dtype=dtype, comments=comments,
+                         delimiter=delimiter, skiprows=skiprows,
+                         usecols=usecols, max_rows=max_rows)
+
+    elif engine == 'pandas':
+        df = pd.read_csv(filename, sep=r'\s+' if delimiter is None
+                         else delimiter, header=None, comment=comments,
+                         skiprows=skiprows, nrows=max_rows, usecols=usecols,
+                         dtype=dtype, engine='c')
+        if usecols is not None:
+            df = df[list(usecols)]
+
+        arr = np.squeeze(df.to_numpy())
+
+    elif engine == 'fromfile':
+        if delimiter is not None:
+            raise ValueError('fromfile engine supports only whitespace'
+                             ' delimiters!')
+
+        with open(filename, 'rb') as fd:
+            for ii in range(skiprows):
+                fd.readline()
+
+            pos = fd.tell()
+            ncol = len(fd.readline().split())
+            fd.seek(pos)
+
+            count = -1 if max_rows is None else max_rows * ncol
+            arr = np.fromfile(fd, dtype=dtype, count=count, sep=' ')
+
+        if ncol:
+            arr = arr.reshape((-1, ncol))
+
+        if usecols is not None:
+            arr = arr[:, usecols]
+
+        arr = np.squeeze(arr)
+
+    else:
+        raise ValueError('unknown text array engine! ({})'.format(engine))
+
+    if downcast is not None:
+        arr = pd.to_numeric(arr.ravel(), downcast=downcast).reshape(arr.shape)
+
+    return arr
+
+def _get_array_keys(filename, key, columns):
+    if columns is not None:
+        return list(columns)
+
+    elif filename.endswith('.npz'):
+        import zipfile
+        with zipfile.ZipFile(filename) as zf:
+            return [name[:-4] for name in zf.namelist()
+                    if name.endswith('.npy')]
+
+    else:
+        return [key]
+
+def load_array(filename, key='array', columns=None, load_kwargs={},
+               engine='numpy', mmap_mode=None, index=None, lazy=False,
+               rdata=None):
+    """
+    Load an array from a text, .npy or .npz file.
+
+    Parameters
+    ----------
+    filename : str
+        The file name. Files not ending with .npy or .npz are loaded as text
+        files.
+    key : str
+        The key of the array in the output dict.
+    columns : list of str, optional
+        If given, the names of columns (the last axis) of a text or .npy
+        array, or the names of arrays to load from a .npz file.
+    load_kwargs : dict
+        The additional arguments of the loading function.
+    engine : str
+        The engine for loading text files. With 'numpy', `load_kwargs` are
+        passed to ``np.loadtxt()``, otherwise to :func:`load_text_array()`.
+    mmap_mode : None or str
+        If given, .npy files and uncompressed members of .npz files are
+        memory-mapped using this mode (see ``np.load()``), so that only the
+        data actually accessed are read.
+    index : int, slice or tuple, optional
+        If given, the index applied to each loaded array before splitting it
+        to `columns`, for example ``-1`` for the last time step.
+    lazy : bool
+        If True, return :class:`LazyArray` proxies that load the data on the
+        first access.
+
+    Returns
+    -------
+    out : dict
+        The loaded arrays.
+    """
+    if lazy:
+        cache = {}
+        def _load(ikey):
+            if not cache:
+                cache.update(load_array(filename, key=key, columns=columns,
+                                        load_kwargs=load_kwargs,
+                                        engine=engine, mmap_mode=mmap_mode,
+                                        index=index))
+            return cache[ikey]
+
+        keys = _get_array_keys(filename, key, columns)
+        out = {ikey : LazyArray(partial(_load, ikey)) for ikey in keys}
+        return out
 
-def load_array(filename, key='array', columns=None, load_kwargs={}, rdata=None):
     is_npy = filename.endswith('.npy')
     is_npz = filename.endswith('.npz')
     is_txt = not (is_npy or is_npz)
     if is_txt:
-        arr = np.loadtxt(filename, **load_kwargs)
+        if engine == 'numpy':
+            arr = np.loadtxt(filename, **load_kwargs)
+
+        else:
+            arr = load_text_array(filename, engine=engine, **load_kwargs)
 
     else:
-        arr = np.load(filename, **load_kwargs)
+        arr = np.load(filename, mmap_mode=mmap_mode, **load_kwargs)
 
     if is_txt or is_npy:
+        if index is not None:
+            arr = arr[index]
+
         if columns is None:
             out = {key : arr}
 
@@ -35,10 +260,18 @@ def load_array(filename, key='array', columns=None, load_kwargs={}, rdata=None):
 
     else:
         if columns is None:
-            out = {key : val for key, val in arr.items()}
+            columns = arr.files
 
-        else:
-            out = {key : arr[key] for key in columns}
+        out = {}
+        for ikey in columns:
+            val = None
+            if mmap_mode is not None:
+                val = _mmap_npz_member(filename, ikey, mmap_mode=mmap_mode)
+
+            if val is None:
+                val = arr[ikey]
+
+            out[ikey] = val if index is None else val[index]
 
         arr.close()
 
@@ -100,10 +333,19 @@ def filter_dict(data, key_prefix, strip_prefix=True):
                  if key.startswith(key_prefix))
     return out
 
-def apply_scoops(info, directories, debug_mode=False):
+def iter_scoops(info, directories, chunk_size=None, debug_mode=False):
+    """
+    Scoop results in `directories` according to `info` and yield
+    ``(df, mdf, par_keys)`` for each chunk of `chunk_size` results
+    directories, or once for all results directories if `chunk_size` is None.
+    The 'data_row' column of `mdf` refers to rows of `df` of the same chunk,
+    `par_keys` contains the parameter keys of all chunks so far.
+    """
     if not len(info):
-        return pd.DataFrame({}), pd.DataFrame({}), None
+        yield pd.DataFrame({}), pd.DataFrame({}), None
+        return
 
+    ichunk = 0
     data = []
     metadata = []
     par_keys = set()
@@ -195,26 +437,143 @@ def apply_scoops(info, directories, debug_mode=False):
 
             data.append(pd.Series(rdata))
 
-    df = pd.DataFrame(data)
-    mdf = pd.DataFrame(metadata)
+            if (chunk_size is not None) and (len(data) == chunk_size):
+                yield (pd.DataFrame(data), pd.DataFrame(metadata),
+                       par_keys.copy())
+                ichunk += 1
+                data = []
+                metadata = []
+
+    if len(data) or not ichunk:
+        yield pd.DataFrame(data), pd.DataFrame(metadata), par_keys
+
+def apply_scoops(info, directories, debug_mode=False):
+    return next(iter_scoops(info, directories, debug_mode=debug_mode))
+
+def filter_results(df, mdf, rfiles):
+    """
+    Return the rows of `df` with any of `rfiles` successfully scooped and the
+    corresponding rows of `mdf`. The rows are renumbered.
+    """
+    idf = [ii for ii, row_rfiles in df['rfiles'].items()
+           if rfiles.intersection(row_rfiles)]
+    df = df.loc[idf]
+    df.index = np.arange(len(df))
+
+    mdf = mdf[mdf['data_row'].isin(idf)].copy()
+    new_rows = {ii : ir for ir, ii in enumerate(idf)}
+    mdf['data_row'] = mdf['data_row'].map(new_rows)
+    mdf.index = np.arange(len(mdf))
+
+    return df, mdf
 
-    return df, mdf, par_keys
+def _get_canonical_key(val):
+    """
+    Return a hashable key of `val` such that equal values, including
+    containers and arrays, have equal keys.
+    """
+    if isinstance(val, np.ndarray):
+        if val.dtype == object:
+            return ('ndarray', val.shape,
+                    tuple(_get_canonical_key(ii) for ii in val.flat))
+
+        return ('ndarray', val.dtype.str, val.shape, val.tobytes())
+
+    elif isinstance(val, dict):
+        return ('dict', tuple(sorted(((_get_canonical_key(key),
+                                       _get_canonical_key(item))
+                                      for key, item in val.items()),
+                                     key=repr)))
+
+    elif isinstance(val, (list, tuple)):
+        return (type(val).__name__,
+                tuple(_get_canonical_key(ii) for ii in val))
+
+    elif isinstance(val, (set, frozenset)):
+        return ('set', tuple(sorted((_get_canonical_key(ii) for ii in val),
+                                    key=repr)))
+
+    elif pd.api.types.is_scalar(val) and pd.isna(val):
+        return ('na', type(val).__name__)
+
+    try:
+        hash(val)
+
+    except TypeError:
+        return ('str', type(val).__name__, str(val))
+
+    return (type(val).__name__, val)
+
+def _get_column_token(values):
+    """
+    Return a token that changes when the column `values` change: the hashes
+    of the values, or of the pickled objects for object values, so that the
+    value types are distinguished. The identities of the objects are used
+    for objects that cannot be pickled.
+    """
+    import hashlib
+    import pickle
+
+    arr = np.asarray(values)
+    if arr.dtype != object:
+        data = pd.util.hash_array(arr).tobytes()
+
+    else:
+        try:
+            data = pickle.dumps(arr.tolist(), protocol=4)
+
+        except Exception:
+            data = np.fromiter(map(id, arr), dtype=np.uint64,
+                               count=len(arr)).tobytes()
 
-def get_uniques(df, columns):
+    return (len(values), str(getattr(values, 'dtype', arr.dtype)),
+            hashlib.sha1(data).hexdigest())
+
+def get_unique_values(values):
+    """
+    Return the unique values of `values` that can be unhashable or of mixed
+    types. Each value is encoded once by a canonical key. The first
+    occurrences of the values are returned, sorted by their string
+    representations.
+    """
+    firsts = {}
+    for val in values:
+        firsts.setdefault(_get_canonical_key(val), val)
+
+    return sorted(firsts.values(), key=str)
+
+def get_uniques(df, columns, cache=None):
+    """
+    Return a dict with the sorted unique values of `columns` of `df`. The
+    unique values of columns with unhashable or non-comparable values are
+    obtained using :func:`get_unique_values()`.
+
+    If `cache` dict is given, the unique values of each column are stored in
+    it and reused while the column values are the same. Note that in-place
+    modifications of objects stored in the columns are not detected.
+    """
     uniques = {}
     for col in sorted(columns):
+        if cache is not None:
+            token = _get_column_token(df[col])
+            cached = cache.get(col)
+            if (cached is not None) and (cached[0] == token):
+                uniques[col] = list(cached[1])
+                continue
+
         try:
             vals = sorted(df[col].unique().tolist())
 
         except TypeError:
-            _, ir = np.unique([str(ii) for ii in df[col]], return_index=True)
-            vals = df.loc[df.index[ir], col].tolist() # np.unique() sorts.
+            vals = get_unique_values(df[col])
 
         uniques[col] = vals
+        if cache is not None:
+            cache[col] = (token, list(vals))
 
     return uniques
 
-def iter_uniques(df, columns, uniques):
+def _iter_uniques_product(df, columns, uniques):
     pars = [uniques[col] for col in columns]
     for ii, vals in enumerate(product(*pars)):
         selection = Struct(dict(zip(columns, vals)))
@@ -224,8 +583,81 @@ def iter_uniques(df, columns, uniques):
 
         yield ii, selection, sdf
 
+def _get_unique_codes(values, vals):
+    """
+    Return the indices of `values` in the list of unique values `vals`, -1
+    for values not in `vals` or missing. Raises TypeError for unhashable
+    values and ValueError if `vals` contains equal values.
+    """
+    ivals = [ic for ic, val in enumerate(vals)
+             if not (pd.api.types.is_scalar(val) and pd.isna(val))]
+    # Tuple values must not become a MultiIndex.
+    objs = np.empty(len(ivals), dtype=object)
+    objs[:] = [vals[ic] for ic in ivals]
+    categories = pd.Index(objs, tupleize_cols=False)
+    if not categories.is_unique:
+        raise ValueError('equal unique values!')
+
+    codes = pd.Categorical(values, categories=categories).codes
+    # Map the category codes to the indices in vals.
+    return np.append(ivals, -1)[codes]
+
+def iter_uniques(df, columns, uniques):
+    """
+    Iterate over the combinations of the unique values of `columns` given by
+    `uniques`, in the order of ``itertools.product()``, that are present in
+    `df`.
+
+    The rows are grouped by the combination indices computed from the codes
+    of the values in `uniques`, so that `df` is traversed only once. Falls
+    back to comparing `df` with each combination for unhashable values.
+
+    Yields
+    ------
+    ii : int
+        The index of the combination in the product of the unique values.
+    selection : Struct
+        The combination of values.
+    sdf : DataFrame
+        The rows of `df` with the combination of values.
+    """
+    if not len(columns):
+        if len(df):
+            yield 0, Struct(), df
+        return
+
+    pars = [uniques[col] for col in columns]
+    try:
+        codes = [_get_unique_codes(df[col], vals)
+                 for col, vals in zip(columns, pars)]
+        valid = np.ones(len(df), dtype=bool)
+        for icodes in codes:
+            valid &= icodes >= 0
+
+        irows = np.flatnonzero(valid)
+        flat = np.ravel_multi_index([icodes[irows] for icodes in codes],
+                                    [len(vals) for vals in pars])
+
+    except (TypeError, ValueError, NotImplementedError):
+        yield from _iter_uniques_product(df, columns, uniques)
+        return
+
+    order = np.argsort(flat, kind='stable')
+    flat = flat[order]
+    irows = irows[order]
+    starts = np.flatnonzero(np.diff(flat, prepend=-1))
+    stops = np.append(starts[1:], len(flat))
+    shape = [len(vals) for vals in pars]
+    for i0, i1 in zip(starts, stops):
+        ii = int(flat[i0])
+        icodes = np.unravel_index(ii, shape)
+        vals = [par[ic] for par, ic in zip(pars, icodes)]
+        selection = Struct(dict(zip(columns, vals)))
+        yield ii, selection, df.iloc[irows[i0:i1]]
+
 def init_plugin_data(df, par_keys, output_dir, store_filename):
-    par_uniques = get_uniques(df, par_keys)
+    uniques_cache = {}
+    par_uniques = get_uniques(df, par_keys, cache=uniques_cache)
     multi_par_keys = [key for key, vals in par_uniques.items()
                       if len(vals) > 1]
     multi_par_uniques = {key : par_uniques[key] for key in multi_par_keys}
@@ -234,11 +666,154 @@ def init_plugin_data(df, par_keys, output_dir, store_filename):
                   par_uniques=par_uniques,
                   multi_par_uniques=multi_par_uniques,
                   output_dir=output_dir,
-                  store_filename=store_filename)
+                  store_filename=store_filename,
+                  uniques_cache=uniques_cache)
     return data
 
+def plugin(columns=None, cache=False, files=None, requires=None,
+           provides=None):
+    """
+    Decorator declaring properties of a plugin function.
+
+    Plugins with declared `requires` and/or `provides` can be run in parallel
+    with other such plugins that do not depend on them, see
+    :func:`run_plugins()`. Other plugins are run in the main process after
+    all preceding plugins finished. A plugin run in a worker process gets a
+    copy of `df`, so its modifications of `df` are lost - the declared
+    plugins should pass their results only by the `provides` data keys.
+
+    Parameters
+    ----------
+    columns : list of str, optional
+        The columns of the DataFrame used by the plugin, including the
+        parameters. If None, all columns are assumed to be used.
+    cache : bool
+        If True, the data keys set by the plugin are cached (see
+        :func:`run_plugins()`) and the plugin is skipped when its inputs did
+        not change. Such a plugin must not modify `df` in place, as the
+        modifications are not cached - modify a copy instead.
+    files : list of str, optional
+        The files created by the plugin, relative to the output directory. The
+        cached results are used only if all the files exist.
+    requires : list of str, optional
+        The keys of the plugin data the plugin uses.
+    provides : list of str, optional
+        The keys of the plugin data the plugin sets. When the plugin is run
+        in parallel, only these keys are passed back from the worker process.
+    """
+    def decorator(fun):
+        fun.plugin_columns = columns
+        fun.plugin_cache = cache
+        fun.plugin_files = files
+        if (requires is not None) or (provides is not None):
+            fun.plugin_requires = list(requires or [])
+            fun.plugin_provides = list(provides or [])
+
+        return fun
+
+    return decorator
+
+def _get_fingerprint(*objs):
+    import hashlib
+    import pickle
+
+    digest = hashlib.sha256()
+    for obj in objs:
+        digest.update(pickle.dumps(obj, protocol=4))
+
+    return digest.hexdigest()
+
+def _get_plugin_source(fun):
+    import inspect
+
+    try:
+        return inspect.getsource(fun)
+
+    except (OSError, TypeError):
+        return fun.__code__.co_code
+
+def get_plugin_dependencies(info):
+    """
+    Return the list of indices of plugins in `info` each plugin depends on.
+
+    A plugin with declared `requires` and `provides` (see :func:`plugin()`)
+    depends on the preceding declared plugins that provide any of its
+    required keys or provide the same keys, and on the last preceding
+    undeclared plugin. An undeclared plugin depends on all preceding
+    plugins.
+    """
+    deps = []
+    barrier = None
+    for ii, fun in enumerate(info):
+        if not hasattr(fun, 'plugin_provides'):
+            deps.append(list(range(ii)))
+            barrier = ii
+            continue
+
+        keys = set(fun.plugin_requires).union(fun.plugin_provides)
+        start = 0 if barrier is None else barrier + 1
+        ideps = [] if barrier is None else [barrier]
+        ideps.extend(ij for ij in range(start, ii)
+                     if keys.intersection(info[ij].plugin_provides))
+        deps.append(ideps)
+
+    return deps
+
+_plugin_worker_state = {}
+
+def _init_plugin_worker():
+    import matplotlib
+    matplotlib.use('Agg', force=True)
+
+def _run_plugin_worker(ii, values):
+    """
+    Run the ii-th plugin of :func:`run_plugins()` in a forked worker process
+    and return its provided data.
+    """
+    import matplotlib.pyplot as plt
+
+    state = _plugin_worker_state
+    fun = state['funs'][ii]
+    data = state['data'].copy()
+    data.update(values)
+    out = fun(state['df'], data=data)
+    out = out if out is not None else data
+    plt.close('all')
+
+    return {key : out[key] for key in state['provides'][ii] if key in out}
+
+def get_plugin_cache_filename(store_filename):
+    """
+    Return the name of the HDF5 file with the cached plugin results, stored
+    next to the results file or directory, so that the cache survives
+    rewriting the results.
+    """
+    base = op.splitext(store_filename.rstrip(op.sep))[0]
+    return base + '.plugin-cache.h5'
+
 def run_plugins(info, df, output_dir, par_keys, store_filename,
-                plugin_args=None):
+                plugin_args=None, force=False, workers=1):
+    """
+    Run the plugin functions in `info` in the given order, each getting `df`
+    and the data returned by the previous plugin.
+
+    If `workers` is greater than one, the plugins with declared `requires`
+    and `provides` (see :func:`plugin()`) that do not depend on each other
+    (see :func:`get_plugin_dependencies()`) are run concurrently in a pool of
+    forked worker processes, with the non-interactive matplotlib backend.
+    Only their `provides` data keys are passed back, modifications of `df`
+    made in the workers are lost.
+
+    The results of plugins decorated by :func:`plugin()` with `cache=True`
+    are cached under 'plugin_cache/<plugin name>' keys of a separate HDF5
+    file (see :func:`get_plugin_cache_filename()`). A plugin is skipped and
+    its cached data keys are used if the fingerprint of its source,
+    arguments, the values of the used `df` columns, the initial plugin data
+    and of the plugins it depends on (cached or not) did not change, unless
+    `force` is True.
+    """
+    import pickle
+
     if not len(info):
         return
 
@@ -260,22 +835,620 @@ def run_plugins(info, df, output_dir, par_keys, store_filename,
 
         return _fun
 
+    def get_fingerprint(fun, dep_fingerprints):
+        # Also uncached plugins depend on the data, as their results can be
+        # used by the following cached plugins.
+        columns = getattr(fun, 'plugin_columns', None)
+        df_fp = (df_fingerprint if columns is None
+                 else _get_fingerprint(df[list(columns)]))
+
+        return _get_fingerprint(data_fingerprint, dep_fingerprints,
+                                _get_plugin_source(fun),
+                                plugin_args.get(fun.__name__), df_fp)
+
+    def get_cached(fun, key, fingerprint):
+        if force or not op.exists(cache_filename):
+            return None
+
+        with pd.HDFStore(cache_filename, mode='r') as store:
+            cached = store.get(key) if key in store else None
+
+        if (cached is None) or (cached['fingerprint'] != fingerprint):
+            return None
+
+        files = getattr(fun, 'plugin_files', None) or []
+        if not all(op.exists(op.join(output_dir, ii)) for ii in files):
+            return None
+
+        return pickle.loads(cached['delta'])
+
+    def put_cached(key, fingerprint, delta):
+        try:
+            pdelta = pickle.dumps(delta)
+
+        except Exception as exc:
+            output('cannot cache plugin results:', exc)
+            return
+
+        val = pd.Series({'fingerprint' : fingerprint, 'delta' : pdelta})
+        with pd.HDFStore(cache_filename, mode='a') as store:
+            store.put(key, val)
+
+    def run_cached(ii):
+        fun = info[ii]
+        if getattr(fun, 'plugin_cache', False):
+            delta = get_cached(fun, 'plugin_cache/' + fun.__name__,
+                               fingerprints[ii])
+            if delta is not None:
+                output('using cached {}()'.format(fun.__name__))
+                return delta
+
+        return None
+
+    def finish(ii, delta):
+        fun = info[ii]
+        data.update(delta)
+        if getattr(fun, 'plugin_cache', False):
+            put_cached('plugin_cache/' + fun.__name__, fingerprints[ii], delta)
+
     output('run plugins:')
     data = init_plugin_data(df, par_keys, output_dir, store_filename)
-    for fun in info:
+    cache_filename = get_plugin_cache_filename(store_filename)
+    # The inputs of init_plugin_data().
+    data_fingerprint = _get_fingerprint(sorted(par_keys), output_dir,
+                                        store_filename, df[list(par_keys)])
+    df_fingerprint = _get_fingerprint(df)
+    deps = get_plugin_dependencies(info)
+    fingerprints = []
+    for ii, fun in enumerate(info):
+        fingerprints.append(get_fingerprint(
+            fun, [fingerprints[ij] for ij in deps[ii]]
+        ))
+
+    try:
+        import multiprocessing
+        mp_context = multiprocessing.get_context('fork')
+
+    except ValueError:
+        mp_context = None
+
+    ii = 0
+    while ii < len(info):
+        group = []
+        if (workers > 1) and (mp_context is not None):
+            while ((ii + len(group) < len(info))
+                   and hasattr(info[ii + len(group)], 'plugin_provides')):
+                group.append(ii + len(group))
+
+        if len(group) > 1:
+            data = _run_plugins_parallel(group, info, deps, wrap_fun, df,
+                                         data, run_cached, finish, workers,
+                                         mp_context)
+            ii += len(group)
+            continue
+
+        fun = info[ii]
+        ii += 1
+        delta = run_cached(ii - 1)
+        if delta is not None:
+            data.update(delta)
+            continue
+
         output('running {}()...'.format(fun.__name__))
+        before = dict(data)
         wfun = wrap_fun(fun)
         _data = wfun(df, data=data)
         data = _data if _data is not None else data
+        delta = {key : val for key, val in data.items()
+                 if (key not in before) or (val is not before[key])}
+        finish(ii - 1, delta)
         output('...done')
 
     return data
 
-def write_results(results_filename, df, mdf, par_keys):
-    with pd.HDFStore(results_filename, mode='w') as store:
-        store.put('df', df)
-        store.put('mdf', mdf)
-        store.put('par_keys', pd.Series(list(par_keys)))
+def _run_plugins_parallel(group, info, deps, wrap_fun, df, data, run_cached,
+                          finish, workers, mp_context):
+    """
+    Run the plugins in `group` (indices into `info`) in a process pool,
+    submitting each plugin when all plugins it depends on are finished.
+    """
+    from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+    pending = list(group)
+    done = set(range(group[0]))
+    futures = {}
+
+    _plugin_worker_state.update(
+        funs={ii : wrap_fun(info[ii]) for ii in group},
+        provides={ii : info[ii].plugin_provides for ii in group},
+        df=df,
+        data=data.copy(),
+    )
+    try:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=mp_context,
+                                 initializer=_init_plugin_worker) as pool:
+            while len(pending) or len(futures):
+                for ii in list(pending):
+                    if not done.issuperset(deps[ii]):
+                        continue
+
+                    pending.remove(ii)
+                    delta = run_cached(ii)
+                    if delta is not None:
+                        data.update(delta)
+                        done.add(ii)
+                        continue
+
+                    fun = info[ii]
+                    output('submitting {}()'.format(fun.__name__))
+                    values = {key : data[key] for key in fun.plugin_requires
+                              if key in data}
+                    futures[pool.submit(_run_plugin_worker, ii, values)] = ii
+
+                if not len(futures):
+                    continue
+
+                finished, _ = wait(futures, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    ii = futures.pop(future)
+                    finish(ii, future.result())
+                    done.add(ii)
+                    output('finished {}()'.format(info[ii].__name__))
+
+    finally:
+        _plugin_worker_state.clear()
+
+    return data
+
+columnar_formats = {'parquet' : '.parquet', 'feather' : '.feather'}
+
+def _is_arrow_native(values):
+    """
+    Check whether object `values` convert to Apache Arrow and back without
+    changing their types: all values are strings, or all values are 1D
+    arrays of numbers.
+    """
+    values = [val for val in values if val is not None]
+    if all(isinstance(val, str) for val in values):
+        return True
+
+    return all(isinstance(val, np.ndarray) and (val.ndim == 1)
+               and (val.dtype.kind in 'biufc')
+               for val in values)
+
+def _encode_columnar(df):
+    """
+    Pickle object columns of `df` that cannot be stored natively in the
+    columnar formats. Categorical columns with categories of mixed types are
+    converted back.
+    """
+    import pickle
+
+    df = df.copy()
+    pickled = []
+    for key in df.columns:
+        if isinstance(df[key].dtype, pd.CategoricalDtype):
+            categories = df[key].cat.categories
+            if ((categories.dtype != object)
+                or all(isinstance(val, str) for val in categories)):
+                continue
+
+            df[key] = df[key].astype(object)
+
+        if (df[key].dtype == object) and not _is_arrow_native(df[key]):
+            df[key] = [pickle.dumps(val) for val in df[key]]
+            pickled.append(key)
+
+    return df, pickled
+
+def _decode_columnar(df, pickled):
+    import pickle
+
+    for key in pickled:
+        if key in df:
+            df[key] = [pickle.loads(val) for val in df[key]]
+
+    return df
+
+def get_results_format(results_filename):
+    """
+    Return the format of the results file: 'hdf5', or one of the columnar
+    formats in case of a directory written by :func:`write_results()`.
+    """
+    if op.isdir(results_filename):
+        with open(op.join(results_filename, 'info.json'), 'r') as fd:
+            return json.load(fd)['format']
+
+    return 'hdf5'
+
+def _is_table_native(values):
+    """
+    Check whether `values` can be stored in a PyTables table: values of
+    non-object dtypes, or strings possibly with missing values.
+    """
+    if values.dtype != object:
+        return True
+
+    return all(isinstance(val, str) or (val is None)
+               or (isinstance(val, float) and np.isnan(val))
+               for val in values)
+
+def _put_table(store, key, frame, data_columns=None):
+    """
+    Put `frame` into `store` under `key` in the table format. The columns
+    that cannot be stored in a table are put into the fixed format frame
+    `key` + '_objects' with the same index. The original column order is
+    saved in the table attributes.
+    """
+    native = [col for col in frame.columns if _is_table_native(frame[col])]
+    objects = [col for col in frame.columns if col not in native]
+    if data_columns is not None:
+        data_columns = [col for col in data_columns if col in native]
+
+    store.put(key, frame[native], format='table', data_columns=data_columns)
+    store.get_storer(key).attrs.soops_columns = list(frame.columns)
+    if len(objects):
+        store.put(key + '_objects', frame[objects])
+
+def _get_table(store, key, where=None, columns=None):
+    """
+    Get the frame put into `store` by :func:`_put_table()`. If `where` is
+    given, only the matching rows are read from the table, and the same rows
+    are taken from the object columns.
+    """
+    storer = store.get_storer(key)
+    all_columns = getattr(storer.attrs, 'soops_columns', None)
+    if where is None:
+        frame = store.select(key)
+
+    else:
+        coords = store.select_as_coordinates(key, where=where)
+        if len(coords):
+            frame = store.select(key, where=coords)
+
+        else:
+            # Empty coordinates would select all rows.
+            frame = store.select(key, stop=0)
+
+    okey = '/' + key.lstrip('/') + '_objects'
+    if okey in store:
+        objects = store.get(okey)
+        if where is not None:
+            objects = objects.iloc[coords.values]
+
+        frame = pd.concat([frame, objects], axis=1)
+
+    if all_columns is not None:
+        frame = frame[all_columns]
+
+    if columns is not None:
+        frame = frame[[col for col in frame.columns if col in columns]]
+
+    return frame
+
+def write_results(results_filename, df, mdf, par_keys, fmt='hdf5',
+                  compression=None, compression_level=None):
+    """
+    Write the results into a pandas HDF5 file ('hdf5' and 'hdf5-table'
+    formats) or into a directory with the Apache Parquet ('parquet' format)
+    or Feather ('feather' format) files.
+
+    In the 'hdf5-table' format, `df` and `mdf` are stored as PyTables tables,
+    with the indexed parameter columns of `df` usable in the `where`
+    argument of :func:`read_results()`. The columns that cannot be stored in
+    a table (e.g. lists or arrays) are stored separately in the fixed format.
+
+    In the columnar formats, the parameter columns are dictionary-encoded,
+    and the columns can be projected when reading the results using
+    :func:`read_results()`.
+
+    The `compression` and `compression_level` arguments are passed to the
+    writing functions of the given format. For the HDF5 formats,
+    `compression` is the `complib` argument of ``HDFStore()`` and
+    `compression_level` is the `complevel` argument.
+    """
+    if fmt in ('hdf5', 'hdf5-table'):
+        if (compression is not None) and (compression_level is None):
+            compression_level = 9
+
+        # The store compression applies also to the fixed format.
+        with pd.HDFStore(results_filename, mode='w', complib=compression,
+                         complevel=compression_level) as store:
+            if fmt == 'hdf5':
+                # The fixed format cannot store categorical columns.
+                if any(isinstance(dtype, pd.CategoricalDtype)
+                       for dtype in df.dtypes):
+                    df = from_categorical(df)
+
+                store.put('df', df)
+                store.put('mdf', mdf)
+
+            else:
+                _put_table(store, 'df', df, data_columns=sorted(par_keys))
+                _put_table(store, 'mdf', mdf, data_columns=['data_row'])
+
+            store.put('par_keys', pd.Series(list(par_keys)))
+        return
+
+    elif fmt not in columnar_formats:
+        raise ValueError('unknown results format! ({})'.format(fmt))
+
+    kwargs = {}
+    if compression is not None:
+        kwargs['compression'] = compression
+
+    if compression_level is not None:
+        kwargs['compression_level'] = compression_level
+
+    if op.isfile(results_filename):
+        os.remove(results_filename)
+
+    os.makedirs(results_filename, exist_ok=True)
+    categorical = [key for key in df.columns
+                   if isinstance(df[key].dtype, pd.CategoricalDtype)]
+    info = {'format' : fmt, 'par_keys' : sorted(par_keys),
+            'columns' : {}, 'pickled' : {}, 'categorical' : categorical}
+    for key, frame in [('df', to_categorical(df, par_keys)), ('mdf', mdf)]:
+        frame, pickled = _encode_columnar(frame)
+        info['columns'][key] = list(frame.columns)
+        info['pickled'][key] = pickled
+
+        filename = op.join(results_filename, key + columnar_formats[fmt])
+        if fmt == 'parquet':
+            frame.to_parquet(filename, **kwargs)
+
+        else:
+            frame.reset_index(drop=True).to_feather(filename, **kwargs)
+
+    with open(op.join(results_filename, 'info.json'), 'w') as fd:
+        json.dump(info, fd, indent=2)
+
+def _read_columnar_results(results_filename, columns=None):
+    with open(op.join(results_filename, 'info.json'), 'r') as fd:
+        info = json.load(fd)
+
+    fmt = info['format']
+    par_keys = set(info['par_keys'])
+    out = []
+    for key in ('df', 'mdf'):
+        filename = op.join(results_filename, key + columnar_formats[fmt])
+        keys = None
+        if (key == 'df') and (columns is not None):
+            keys = [col for col in info['columns'][key]
+                    if (col in columns) or (col in par_keys)]
+
+        if fmt == 'parquet':
+            frame = pd.read_parquet(filename, columns=keys)
+
+        else:
+            frame = pd.read_feather(filename, columns=keys)
+
+        frame = _decode_columnar(frame, info['pickled'][key])
+        if key == 'df':
+            # Keep the columns that were categorical when written.
+            categorical = set(info.get('categorical', []))
+            frame = from_categorical(frame, [col for col in frame.columns
+                                             if col not in categorical])
+
+        else:
+            frame = from_categorical(frame)
+
+        out.append(frame)
+
+    return out[0], out[1], par_keys, set()
+
+def _get_chunk_keys(store, key):
+    """
+    Return the store keys of `key` ('df' or 'mdf') data in the storage order:
+    the whole data written by :func:`write_results()` and the chunks appended
+    by :func:`append_results()`.
+    """
+    keys = ['/' + key] if ('/' + key) in store else []
+    prefix = '/{}_chunks/'.format(key)
+    keys.extend(sorted(ii for ii in store.keys()
+                       if ii.startswith(prefix)
+                       and not ii.endswith('_objects')))
+    return keys
+
+def _get_nrows(store, key):
+    storer = store.get_storer(key)
+    if storer.is_table:
+        return storer.nrows
+
+    else:
+        # axis1 of a fixed format frame is its index.
+        return storer.group.axis1.shape[0]
+
+def append_results(results_filename, df, mdf, par_keys, table=None):
+    """
+    Append `df` and `mdf` as new chunks to the results file and update the
+    parameter keys. The rows of `df` are numbered after the rows already
+    stored and the 'data_row' column of `mdf` is shifted accordingly. Other
+    data in the file are kept intact.
+
+    The chunks are stored in the table format (see the 'hdf5-table' format
+    of :func:`write_results()`) if `table` is True, or if `table` is None and
+    the data already stored are tables.
+
+    Returns
+    -------
+    df, mdf : DataFrame
+        The renumbered data.
+    """
+    if par_keys is None:
+        par_keys = set()
+
+    with pd.HDFStore(results_filename, mode='a') as store:
+        df_keys = _get_chunk_keys(store, 'df')
+        mdf_keys = _get_chunk_keys(store, 'mdf')
+        nrow = sum(_get_nrows(store, key) for key in df_keys)
+        nmrow = sum(_get_nrows(store, key) for key in mdf_keys)
+        if table is None:
+            table = (len(df_keys) > 0
+                     and store.get_storer(df_keys[0]).is_table)
+
+        df = df.copy()
+        df.index = nrow + np.arange(len(df))
+        mdf = mdf.copy()
+        mdf.index = nmrow + np.arange(len(mdf))
+        if len(mdf):
+            mdf['data_row'] += nrow
+
+        ichunk = len([key for key in df_keys if key != '/df'])
+        df_key = 'df_chunks/c{:06d}'.format(ichunk)
+        mdf_key = 'mdf_chunks/c{:06d}'.format(ichunk)
+        if not table:
+            store.put(df_key, df)
+            store.put(mdf_key, mdf)
+
+        elif len(df):
+            _put_table(store, df_key, df, data_columns=sorted(par_keys))
+            _put_table(store, mdf_key, mdf, data_columns=['data_row'])
+
+        if '/par_keys' in store:
+            par_keys = set(par_keys).union(store.get('par_keys').to_list())
+        store.put('par_keys', pd.Series(sorted(par_keys)))
+
+    return df, mdf
+
+def iter_results(results_filename, key='df'):
+    """
+    Iterate over chunks of `key` ('df' or 'mdf') data in the results file.
+    This allows processing results that do not fit in memory.
+    """
+    with pd.HDFStore(results_filename, mode='r') as store:
+        for skey in _get_chunk_keys(store, key):
+            yield store.get(skey)
+
+def read_results(results_filename, columns=None, where=None):
+    """
+    Read the results file written by :func:`write_results()` and/or
+    :func:`append_results()`. If `columns` are given, only those columns and
+    the parameter columns of `df` are returned. In the columnar formats, only
+    those columns are read from the disk.
+
+    If `where` is given, only the rows of `df` matching the condition, e.g.
+    ``'(num > 100) & (seed == 12345)'``, and the corresponding rows of `mdf`
+    are returned. In the 'hdf5-table' format, the condition is evaluated
+    on disk by PyTables and may refer to the parameter columns only,
+    otherwise it is evaluated by ``DataFrame.query()`` after reading the
+    whole data.
+
+    Returns
+    -------
+    df, mdf : DataFrame
+        The data and metadata.
+    par_keys : set
+        The parameter keys.
+    user_keys : set
+        The other keys in the store, e.g. stored by plugins.
+    """
+    if get_results_format(results_filename) != 'hdf5':
+        df, mdf, par_keys, user_keys = _read_columnar_results(
+            results_filename, columns=columns,
+        )
+        if where is not None:
+            df = df.query(where)
+            mdf = mdf[mdf['data_row'].isin(df.index)]
+
+        return df, mdf, par_keys, user_keys
+
+    def _read(store, keys, where=None):
+        frames = []
+        for key in keys:
+            if store.get_storer(key).is_table:
+                frames.append(_get_table(store, key, where=where))
+
+            else:
+                frame = store.get(key)
+                frames.append(frame if where is None else frame.query(where))
+
+        if len(frames) == 0:
+            return pd.DataFrame({})
+
+        return pd.concat(frames) if len(frames) > 1 else frames[0]
+
+    with pd.HDFStore(results_filename, mode='r') as store:
+        df_keys = _get_chunk_keys(store, 'df')
+        mdf_keys = _get_chunk_keys(store, 'mdf')
+        df = _read(store, df_keys, where=where)
+        mdf = _read(store, mdf_keys)
+        par_keys = set(store.get('par_keys').to_list())
+        std_keys = set(df_keys + mdf_keys + ['/par_keys'])
+        std_keys.update([key + '_objects' for key in df_keys + mdf_keys])
+        user_keys = set(store.keys()).difference(std_keys)
+
+    if where is not None:
+        mdf = mdf[mdf['data_row'].isin(df.index)]
+
+    if columns is not None:
+        df = df[[col for col in df.columns
+                 if (col in columns) or (col in par_keys)]]
+
+    return df, mdf, par_keys, user_keys
+
+def write_results_chunks(results_filename, scoops, output_dir=None,
+                         save_csv=True, rfiles=None, append=False,
+                         table=None):
+    """
+    Write `(df, mdf, par_keys)` chunks yielded by `scoops` to a new results
+    file using :func:`append_results()`, so that only a single chunk is held
+    in memory. If `append` is True, the chunks are appended to the existing
+    results file instead. The `table` argument is passed to
+    :func:`append_results()`.
+
+    If `output_dir` is given, the chunks are also appended to CSV files in
+    that directory (results.csv only if `save_csv` is True). The CSV columns
+    are given by the first chunk, or by the existing CSV files if `append`
+    is True. If `rfiles` is given, the chunks are filtered using
+    :func:`filter_results()`.
+
+    Returns
+    -------
+    par_keys : set
+        The parameter keys.
+    """
+    if op.exists(results_filename) and not append:
+        os.remove(results_filename)
+
+    columns = {}
+    if append and (output_dir is not None):
+        for name in ('results.csv', 'results-meta.csv'):
+            filename = op.join(output_dir, name)
+            if op.exists(filename):
+                columns[name] = pd.read_csv(filename, index_col=0,
+                                            nrows=0).columns
+
+    par_keys = set()
+    for ichunk, (df, mdf, par_keys) in enumerate(scoops):
+        if (rfiles is not None) and len(df):
+            df, mdf = filter_results(df, mdf, rfiles)
+
+        output('writing chunk {} with {} rows'.format(ichunk, len(df)))
+        df, mdf = append_results(results_filename, df, mdf, par_keys,
+                                 table=table)
+        if output_dir is None:
+            continue
+
+        csvs = [('results.csv', df)] if save_csv else []
+        csvs.append(('results-meta.csv', mdf))
+        for name, frame in csvs:
+            filename = op.join(output_dir, name)
+            if name not in columns:
+                columns[name] = frame.columns
+                frame.to_csv(filename, mode='w')
+                continue
+
+            extra = frame.columns.difference(columns[name])
+            if len(extra):
+                output('WARNING: columns {} of chunk {} not in {}!'
+                       .format(list(extra), ichunk, filename))
+
+            frame.reindex(columns=columns[name]).to_csv(
+                filename, mode='a', header=False,
+            )
+
+    return par_keys
 
 helps = {
     'sort' : 'column keys for sorting of DataFrame rows',
@@ -288,11 +1461,58 @@ helps = {
     'plugin_args' :
     """optional arguments passed to plugins given as plugin_name={key1=val1,
        key2=val2, ...}, ...""",
-    'results' : 'results file name [default: <output_dir>/results.h5]',
+    'results' :
+    """results file name [default: <output_dir>/results.h5,
+       <output_dir>/results.parquet or <output_dir>/results.feather,
+       depending on --format]""",
+    'format' :
+    """results file format. The hdf5-table format stores the results in
+       queryable tables with indexed parameter columns, see --where. The
+       columnar formats (parquet, feather) store the results in a directory,
+       require pyarrow, and allow reading only the columns given by --columns
+       [default: %(default)s]""",
+    'compression' :
+    """compression of the results file, for example blosc or zlib for hdf5,
+       snappy or zstd for parquet, lz4 or zstd for feather""",
+    'compression_level' : 'compression level of the results file',
+    'columns' :
+    """if given with --reuse, read only the given DataFrame columns (and the
+       parameter columns). Cannot be used with --write or
+       --write-after-plugins""",
+    'where' :
+    """if given with --reuse, read only the DataFrame rows matching the
+       condition, for example "(num > 100) & (seed == 12345)". With
+       --format=hdf5-table, the condition is evaluated on disk and can refer
+       to the parameter columns only. Cannot be used with --write or
+       --write-after-plugins""",
+    'append' :
+    """scoop only the given directories and append the results to the
+       existing results file (and CSV files), keeping the data stored there
+       by plugins. Requires an HDF5 format and cannot be used with --sort or
+       --categorize. Plugins and --shell then load all the results""",
+    'chunk_size' :
+    """if given, write the scooped results to the results file (and CSV files)
+       in chunks of the given number of results directories, to limit the
+       memory usage. Because plugins and --shell need all results in memory,
+       it requires --no-plugins and cannot be used with --shell, --sort or
+       --categorize. Run the plugins afterwards using --reuse, possibly with
+       --columns or --where to load only a part of the results""",
     'no_csv' : 'do not save results as CSV (use only HDF5)',
     'reuse' : 'reuse previously scooped results file',
     'write' : 'write results files even when results were loaded using '
     '--reuse option',
+    'plugin_workers' :
+    """the number of worker processes for running plugins with declared
+       requires/provides concurrently. Modifications of the DataFrame by
+       such plugins are then lost [default: %(default)s]""",
+    'force_plugins' :
+    'run plugins even when their cached results are valid',
+    'categorize' :
+    """convert the non-numeric parameter columns with repeated values to the
+       categorical dtype, to save memory and speed up grouping and queries.
+       The numeric columns are kept intact, so that arithmetic on them cannot
+       overflow. The categories are kept in the results file, except in the
+       fixed hdf5 format""",
     'write_after_plugins' :
     """write the pandas HDF5 results file again after plugins were applied""",
     'shell' : 'run ipython shell after all computations',
@@ -327,12 +1547,39 @@ def parse_args(args=None):
     parser.add_argument('-p', '--plugin-mod', metavar='module',
                         action='store', dest='plugin_mod',
                         default=None, help=helps['plugin_mod'])
+    parser.add_argument('--plugin-workers', type=int, metavar='int',
+                        action='store', dest='plugin_workers',
+                        default=1, help=helps['plugin_workers'])
+    parser.add_argument('--force-plugins',
+                        action='store_true', dest='force_plugins',
+                        default=False, help=helps['force_plugins'])
     parser.add_argument('--plugin-args', metavar='dict-like',
                         action='store', dest='plugin_args',
                         default=None, help=helps['plugin_args'])
     parser.add_argument('--results', metavar='filename',
                         action='store', dest='results',
                         default=None, help=helps['results'])
+    parser.add_argument('--format', action='store', dest='format',
+                        choices=['hdf5', 'hdf5-table', 'parquet', 'feather'],
+                        default='hdf5', help=helps['format'])
+    parser.add_argument('--compression', metavar='str',
+                        action='store', dest='compression',
+                        default=None, help=helps['compression'])
+    parser.add_argument('--compression-level', type=int, metavar='int',
+                        action='store', dest='compression_level',
+                        default=None, help=helps['compression_level'])
+    parser.add_argument('--columns', metavar='column[,column,...]',
+                        action='store', dest='columns',
+                        default=None, help=helps['columns'])
+    parser.add_argument('--where', metavar='condition',
+                        action='store', dest='where',
+                        default=None, help=helps['where'])
+    parser.add_argument('--append',
+                        action='store_true', dest='append',
+                        default=False, help=helps['append'])
+    parser.add_argument('--chunk-size', type=int, metavar='int',
+                        action='store', dest='chunk_size',
+                        default=None, help=helps['chunk_size'])
     parser.add_argument('--no-csv',
                         action='store_false', dest='save_csv',
                         default=True, help=helps['no_csv'])
@@ -342,6 +1589,9 @@ def parse_args(args=None):
     parser.add_argument('--write',
                         action='store_true', dest='write',
                         default=False, help=helps['write'])
+    parser.add_argument('--categorize',
+                        action='store_true', dest='categorize',
+                        default=False, help=helps['categorize'])
     parser.add_argument('--write-after-plugins',
                         action='store_true', dest='write_after_plugins',
                         default=False, help=helps['write_after_plugins'])
@@ -375,8 +1625,41 @@ def parse_args(args=None):
     if options.plugin_args is not None:
         options.plugin_args = parse_as_dict(options.plugin_args)
 
+    if options.columns is not None:
+        options.columns = (parse_as_list(options.columns, free_word=True)
+                           + options.sort)
+
     if options.results is None:
-        options.results = op.join(options.output_dir, 'results.h5')
+        ext = columnar_formats.get(options.format, '.h5')
+        options.results = op.join(options.output_dir, 'results' + ext)
+
+    if (((options.columns is not None) or (options.where is not None))
+        and (options.write or options.write_after_plugins)):
+        # The results file would be overwritten by the partial data.
+        raise ValueError('--columns and --where cannot be used with --write'
+                         ' or --write-after-plugins!')
+
+    is_hdf5 = options.format in ('hdf5', 'hdf5-table')
+    if options.chunk_size is not None:
+        if not is_hdf5:
+            raise ValueError('--chunk-size requires an HDF5 format!')
+
+        if (options.call_plugins or options.shell or options.sort
+            or options.categorize):
+            raise ValueError('--chunk-size requires --no-plugins and cannot'
+                             ' be used with --shell, --sort or --categorize!')
+
+    if options.append:
+        if not is_hdf5:
+            raise ValueError('--append requires an HDF5 format!')
+
+        if options.reuse:
+            raise ValueError('--append cannot be used with --reuse!')
+
+        if options.sort or options.categorize:
+            # The appended results are written as scooped.
+            raise ValueError('--append cannot be used with --sort or'
+                             ' --categorize!')
 
     directories = []
     for directory in options.directories:
@@ -389,10 +1672,12 @@ def parse_args(args=None):
 def scoop_outputs(options):
     output.prefix = ''
 
+    warnings.simplefilter(action='ignore',
+                          category=pd.errors.PerformanceWarning)
+
     scoop_mod = import_file(options.scoop_mod)
 
-    if (not options.reuse
-        or not (op.exists(options.results) and op.isfile(options.results))):
+    if not (options.reuse and op.exists(options.results)):
         new_results = True
 
         if hasattr(scoop_mod, 'get_scoop_info'):
@@ -403,30 +1688,46 @@ def scoop_outputs(options):
                    .format(options.scoop_mod))
             return
 
-        df, mdf, par_keys = apply_scoops(scoop_info, options.directories,
-                                         options.debug)
+        if (options.chunk_size is None) and not options.append:
+            df, mdf, par_keys = apply_scoops(scoop_info, options.directories,
+                                             options.debug)
+
+            if options.filter is not None:
+                df, mdf = filter_results(df, mdf, options.filter)
 
-        if options.filter is not None:
-            idf = [ii for ii, rfiles in df['rfiles'].items()
-                   if options.filter.intersection(rfiles)]
-            df = df.iloc[idf]
-            df.index = np.arange(len(df))
+        else:
+            ensure_path(options.results)
+            if options.append and op.exists(options.results):
+                table = None
 
-            imdf = [ii for ii, data_row in mdf['data_row'].items()
-                    if data_row in idf]
-            mdf = mdf.iloc[imdf]
-            mdf.index = np.arange(len(mdf))
+            else:
+                table = options.format == 'hdf5-table'
+
+            scoops = iter_scoops(scoop_info, options.directories,
+                                 chunk_size=options.chunk_size,
+                                 debug_mode=options.debug)
+            par_keys = write_results_chunks(options.results, scoops,
+                                            output_dir=options.output_dir,
+                                            save_csv=options.save_csv,
+                                            rfiles=options.filter,
+                                            append=options.append,
+                                            table=table)
+            if not (options.call_plugins or options.shell):
+                return
+
+            # Only with --append, as --chunk-size refuses plugins and --shell:
+            # they need the full DataFrame, so the stored results are loaded.
+            new_results = False
+            df, mdf, par_keys, _ = read_results(options.results,
+                                                columns=options.columns)
 
     else:
         new_results = False
-        with pd.HDFStore(options.results, mode='r') as store:
-            df = store.get('df')
-            mdf = store.get('mdf')
-            par_keys = set(store.get('par_keys').to_list())
-            std_keys = ('/df', '/mdf', '/par_keys')
-            user_keys = set(store.keys()).difference(std_keys)
-            output('user data:')
-            output(user_keys)
+        df, mdf, par_keys, user_keys = read_results(options.results,
+                                                    columns=options.columns,
+                                                    where=options.where)
+        output('user data:')
+        output(user_keys)
 
     output('data keys:')
     output(df.keys())
@@ -437,13 +1738,21 @@ def scoop_outputs(options):
         df = df.sort_values(options.sort)
         df.index = np.arange(len(df))
 
-    warnings.simplefilter(action='ignore',
-                          category=pd.errors.PerformanceWarning)
+    if options.categorize:
+        # Numeric columns are kept intact, so that arithmetic in plugins
+        # cannot overflow.
+        from pandas.api.types import is_numeric_dtype
+        df = to_categorical(df, [key for key in par_keys
+                                 if (key in df)
+                                 and not is_numeric_dtype(df[key])],
+                            max_ratio=0.5)
 
     results_filename = options.results
     ensure_path(results_filename)
+    write_kwargs = dict(fmt=options.format, compression=options.compression,
+                        compression_level=options.compression_level)
     if new_results or options.write:
-        write_results(results_filename, df, mdf, par_keys)
+        write_results(results_filename, df, mdf, par_keys, **write_kwargs)
 
         if options.save_csv:
             filename = op.join(options.output_dir, 'results.csv')
@@ -484,7 +1793,9 @@ def scoop_outputs(options):
 
             data = run_plugins(plugin_info, df, options.output_dir, par_keys,
                                results_filename,
-                               plugin_args=options.plugin_args)
+                               plugin_args=options.plugin_args,
+                               force=options.force_plugins,
+                               workers=options.plugin_workers)
             output('plugin data keys:')
             output(data.keys())
 
@@ -492,7 +1803,7 @@ def scoop_outputs(options):
             output('no get_plugin_info() in {}'.format(plugin_mod.__name__))
 
         if options.write_after_plugins:
-            write_results(results_filename, df, mdf, par_keys)
+            write_results(results_filename, df, mdf, par_keys, **write_kwargs)
 
     if options.shell:
         from soops.base import shell; shell()
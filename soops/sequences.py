@@ -0,0 +1,418 @@
+"""
+Lazy parameter sequences for the special ``'@<name>(...)'`` argument values of
+parametric studies.
+
+The sequence arguments are evaluated without `eval()`: only numbers, strings,
+lists/tuples of those, the constants ``pi``, ``e``, ``inf``, ``nan`` (also as
+``np.<name>``), numeric dtype names (e.g. ``np.int32``) and the basic
+arithmetic operators are accepted. The sequence values are computed on demand
+as Python scalars, so that their ``str()`` matches the previously used
+``numpy.<fun>(...).tolist()`` items.
+"""
+import ast
+import math
+import operator
+from collections.abc import Sequence
+
+import numpy as np
+
+class LazySequence(Sequence):
+    """
+    An immutable sequence with the length known up front and the items
+    computed on demand.
+    """
+    name = None
+
+    def __init__(self, args=(), kwargs=None):
+        self.args = tuple(args)
+        self.kwargs = {} if kwargs is None else dict(kwargs)
+
+    def __len__(self):
+        return self.size
+
+    def __getitem__(self, ii):
+        if isinstance(ii, slice):
+            return [self._get(ik) for ik in range(*ii.indices(self.size))]
+
+        ii = operator.index(ii)
+        if ii < 0:
+            ii += self.size
+
+        if not (0 <= ii < self.size):
+            raise IndexError('{} index out of range'.format(self.name))
+
+        return self._get(ii)
+
+    def __iter__(self):
+        for ii in range(self.size):
+            yield self._get(ii)
+
+    def __repr__(self):
+        args = [repr(arg) for arg in self.args]
+        args += ['{}={!r}'.format(key, val)
+                 for key, val in self.kwargs.items()]
+        return '@{}({})'.format(self.name, ', '.join(args))
+
+    def tolist(self):
+        return list(self)
+
+    def _get(self, ii):
+        raise NotImplementedError
+
+def _get_dtype(dtype):
+    if dtype is None:
+        return None
+
+    try:
+        dtype = np.dtype(dtype)
+
+    except TypeError:
+        raise ValueError('unknown sequence dtype! ({})'.format(dtype))
+
+    if dtype.kind not in 'iuf':
+        raise ValueError('unsupported sequence dtype! ({})'.format(dtype))
+
+    return dtype
+
+def _to_scalar(val):
+    return val.item() if isinstance(val, np.generic) else val
+
+class ARange(LazySequence):
+    """
+    The lazy equivalent of ``numpy.arange([start,] stop[, step,],
+    dtype=None)``.
+    """
+    name = 'arange'
+
+    def __init__(self, *args, dtype=None):
+        LazySequence.__init__(self, args, {} if dtype is None
+                              else {'dtype' : dtype})
+        if len(args) == 1:
+            start, stop, step = 0, args[0], 1
+
+        elif len(args) == 2:
+            start, stop, step = args[0], args[1], 1
+
+        elif len(args) == 3:
+            start, stop, step = args
+
+        else:
+            raise ValueError('arange() takes 1 to 3 positional arguments!')
+
+        if step == 0:
+            raise ValueError('arange() step cannot be zero!')
+
+        dtype = _get_dtype(dtype)
+        if dtype is None:
+            dtype = np.result_type(start, stop, step)
+
+        self.size = max(int(math.ceil((stop - start) / step)), 0)
+        # Mimic numpy: the first two items are converted to dtype and the
+        # rest is filled using their difference.
+        self._first = np.array([start, start + step]).astype(dtype)
+        self._delta = self._first[1] - self._first[0]
+
+    def _get(self, ii):
+        if ii < 2:
+            return self._first[ii].item()
+
+        return (self._first[0] + ii * self._delta).item()
+
+class LinSpace(LazySequence):
+    """
+    The lazy equivalent of ``numpy.linspace(start, stop, num=50,
+    endpoint=True, dtype=None)``.
+    """
+    name = 'linspace'
+
+    def __init__(self, start, stop, num=50, endpoint=True, dtype=None):
+        LazySequence.__init__(self, (start, stop),
+                              {'num' : num, 'endpoint' : endpoint,
+                               'dtype' : dtype})
+        if num < 0:
+            raise ValueError('linspace() num must be non-negative!')
+
+        self.size = operator.index(num)
+        self.dtype = _get_dtype(dtype)
+        self.endpoint = endpoint
+
+        self._div = (num - 1) if endpoint else num
+        self._start = np.float64(start)
+        self._stop = np.float64(stop)
+        self._delta = np.subtract(self._stop, self._start)
+        self._step = (self._delta / self._div) if self._div > 0 else None
+
+    def _get_float(self, ii):
+        if self.endpoint and (self.size > 1) and (ii == self.size - 1):
+            return self._stop
+
+        if self._step is None:
+            val = np.float64(ii) * self._delta
+
+        elif self._step == 0:
+            val = (np.float64(ii) / self._div) * self._delta
+
+        else:
+            val = np.float64(ii) * self._step
+
+        return val + self._start
+
+    def _get(self, ii):
+        val = self._get_float(ii)
+        if self.dtype is not None:
+            if self.dtype.kind in 'iu':
+                val = np.floor(val)
+
+            val = self.dtype.type(val)
+
+        return _to_scalar(val)
+
+class LogSpace(LinSpace):
+    """
+    The lazy equivalent of ``numpy.logspace(start, stop, num=50,
+    endpoint=True, base=10.0, dtype=None)``.
+    """
+    name = 'logspace'
+
+    def __init__(self, start, stop, num=50, endpoint=True, base=10.0,
+                 dtype=None):
+        LinSpace.__init__(self, start, stop, num=num, endpoint=endpoint)
+        self.kwargs.update({'base' : base, 'dtype' : dtype})
+        self.dtype = _get_dtype(dtype)
+        self._base = np.float64(base)
+
+    def _get(self, ii):
+        val = np.power(self._base, self._get_float(ii))
+        if self.dtype is not None:
+            val = self.dtype.type(val)
+
+        return _to_scalar(val)
+
+class GeomSpace(LogSpace):
+    """
+    The lazy equivalent of ``numpy.geomspace(start, stop, num=50,
+    endpoint=True, dtype=None)`` for real `start`, `stop` of the same sign.
+    """
+    name = 'geomspace'
+
+    def __init__(self, start, stop, num=50, endpoint=True, dtype=None):
+        if (start == 0) or (stop == 0):
+            raise ValueError('geometric sequence cannot include zero!')
+
+        if (start < 0) != (stop < 0):
+            raise ValueError('geometric sequence start and stop must have'
+                             ' the same sign!')
+
+        self._sign = np.float64(np.sign(start))
+        self._gstart = np.float64(start) / self._sign
+        self._gstop = np.float64(stop) / self._sign
+        LogSpace.__init__(self, np.log10(self._gstart), np.log10(self._gstop),
+                          num=num, endpoint=endpoint, dtype=dtype)
+        self.args = (start, stop)
+        self.kwargs.pop('base')
+
+    def _get(self, ii):
+        if ii == 0:
+            val = self._gstart
+
+        elif self.endpoint and (ii == self.size - 1):
+            val = self._gstop
+
+        else:
+            val = np.power(self._base, self._get_float(ii))
+
+        val = val * self._sign
+        if self.dtype is not None:
+            val = self.dtype.type(val)
+
+        return _to_scalar(val)
+
+class Range(LazySequence):
+    """
+    The Python ``range([start,] stop[, step])``.
+    """
+    name = 'range'
+
+    def __init__(self, *args):
+        LazySequence.__init__(self, args)
+        self._range = range(*map(operator.index, args))
+        self.size = len(self._range)
+
+    def _get(self, ii):
+        return self._range[ii]
+
+class Choice(LazySequence):
+    """
+    `num` items randomly chosen (with replacement) from `values`, or random
+    integers in [0, 2**31) if `values` is None, e.g. to be used as random
+    seeds. The i-th item depends only on `seed` and i, so that the items can be
+    computed in any order.
+    """
+    name = 'choice'
+
+    def __init__(self, seed, num, values=None):
+        LazySequence.__init__(self, (seed, num) if values is None
+                              else (seed, num, values))
+        if num < 0:
+            raise ValueError('choice() num must be non-negative!')
+
+        self.seed = operator.index(seed)
+        self.size = operator.index(num)
+        self.values = None if values is None else list(values)
+        if (self.values is not None) and not len(self.values):
+            raise ValueError('choice() values cannot be empty!')
+
+    def _get(self, ii):
+        rng = np.random.default_rng([self.seed, ii])
+        if self.values is None:
+            return int(rng.integers(2**31))
+
+        return self.values[int(rng.integers(len(self.values)))]
+
+class KeyList(LazySequence):
+    """
+    The lazy `(index, key, item)` view of a sequence, see
+    :func:`soops.run_parametric.make_key_list()`.
+    """
+    name = 'key_list'
+
+    def __init__(self, key, seq):
+        LazySequence.__init__(self, (key, seq))
+        self.key = key
+        self.seq = seq
+        self.size = len(seq)
+
+    def _get(self, ii):
+        return (ii, self.key, self.seq[ii])
+
+sequence_classes = {cls.name : cls for cls in
+                    [ARange, LinSpace, LogSpace, GeomSpace, Range, Choice]}
+
+_constants = {'pi' : math.pi, 'e' : math.e, 'inf' : math.inf,
+              'nan' : math.nan}
+_max_pow_bits = 4096
+
+def _pow(base, exp):
+    """
+    Return ``base**exp`` with a limited size, so that e.g. ``9**9**9`` does
+    not hang.
+    """
+    if isinstance(base, int) and isinstance(exp, int):
+        if (exp > 0) and (abs(base).bit_length() - 1) * exp > _max_pow_bits:
+            raise ValueError('too large power in sequence definition! ({}**{})'
+                             .format(base, exp))
+
+    try:
+        return operator.pow(base, exp)
+
+    except OverflowError:
+        raise ValueError('too large power in sequence definition! ({}**{})'
+                         .format(base, exp))
+
+_binary_ops = {
+    ast.Add : operator.add, ast.Sub : operator.sub, ast.Mult : operator.mul,
+    ast.Div : operator.truediv, ast.FloorDiv : operator.floordiv,
+    ast.Mod : operator.mod, ast.Pow : _pow,
+}
+_unary_ops = {ast.UAdd : operator.pos, ast.USub : operator.neg}
+
+_dtype_names = {'int', 'float', 'int8', 'int16', 'int32', 'int64', 'uint8',
+                'uint16', 'uint32', 'uint64', 'float16', 'float32', 'float64'}
+
+def _eval_name(name):
+    if name in _constants:
+        return _constants[name]
+
+    elif name in _dtype_names:
+        return _get_dtype(name)
+
+    raise ValueError('unknown name in sequence definition! ({})'
+                     .format(name))
+
+def _eval_node(node):
+    if isinstance(node, ast.Constant):
+        if isinstance(node.value, (bool, int, float, str, type(None))):
+            return node.value
+
+    elif isinstance(node, (ast.List, ast.Tuple)):
+        return [_eval_node(item) for item in node.elts]
+
+    elif isinstance(node, ast.Name):
+        return _eval_name(node.id)
+
+    elif (isinstance(node, ast.Attribute)
+          and isinstance(node.value, ast.Name)
+          and (node.value.id in ('np', 'numpy'))):
+        return _eval_name(node.attr)
+
+    elif (isinstance(node, ast.UnaryOp)
+          and (type(node.op) in _unary_ops)):
+        return _unary_ops[type(node.op)](_eval_number(node.operand))
+
+    elif (isinstance(node, ast.BinOp)
+          and (type(node.op) in _binary_ops)):
+        return _binary_ops[type(node.op)](_eval_number(node.left),
+                                          _eval_number(node.right))
+
+    raise ValueError('unsupported expression in sequence definition! ({})'
+                     .format(ast.dump(node)))
+
+def _eval_number(node):
+    """
+    Evaluate an operand of an arithmetic operator - only numbers are allowed,
+    so that e.g. ``'x' * 10**9`` is refused.
+    """
+    val = _eval_node(node)
+    if isinstance(val, bool) or not isinstance(val, (int, float)):
+        raise ValueError('arithmetic on non-number in sequence definition!'
+                         ' ({})'.format(ast.dump(node)))
+
+    return val
+
+def is_sequence_def(val):
+    """
+    Return True, if `val` is a string with a sequence definition of the form
+    ``'@<name>(...)'``, where ``<name>`` is one of the `sequence_classes`
+    keys.
+    """
+    if not (isinstance(val, str) and val.startswith('@')):
+        return False
+
+    name = val[1:].split('(', 1)[0].strip()
+    return (name in sequence_classes) and val.rstrip().endswith(')')
+
+def parse_sequence(val):
+    """
+    Parse a sequence definition string ``'@<name>(args)'`` and return the
+    corresponding `LazySequence` instance.
+
+    Parameters
+    ----------
+    val : str
+        The sequence definition, for example ``'@linspace(0, 2 * pi, 5)'``.
+
+    Returns
+    -------
+    seq : LazySequence
+        The lazy sequence.
+    """
+    if not is_sequence_def(val):
+        raise ValueError('invalid sequence definition! ({})'.format(val))
+
+    try:
+        node = ast.parse(val[1:].strip(), mode='eval').body
+
+    except SyntaxError as exc:
+        raise ValueError('invalid sequence definition! ({})'
+                         .format(val)) from exc
+
+    if not (isinstance(node, ast.Call) and isinstance(node.func, ast.Name)
+            and (node.func.id in sequence_classes)):
+        raise ValueError('invalid sequence definition! ({})'.format(val))
+
+    args = [_eval_node(arg) for arg in node.args]
+    kwargs = {kw.arg : _eval_node(kw.value) for kw in node.keywords}
+    if None in kwargs:
+        raise ValueError('invalid sequence definition! ({})'.format(val))
+
+    return sequence_classes[node.func.id](*args, **kwargs)
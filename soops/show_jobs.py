@@ -13,23 +13,46 @@ Examples
 - Follow the output of the last modified output log in the bash shell::
 
   tail -f $(soops-jobs -vvv | tail -1)
+
+- Refresh the jobs information every 5 seconds::
+
+  soops-jobs -v --watch=5
+
+- Show the CPU, memory, open files and I/O totals of each job process tree
+  and the 10 parameter sets using the most CPU, sampled over 2 seconds::
+
+  soops-jobs -v --resources --top=10 --interval=2
+
+The jobs information is read from the status files written by soops-run. For
+runs without a status file, it is collected from the run output directories.
 """
 from argparse import ArgumentParser, RawDescriptionHelpFormatter
-import psutil
 import sys
 import os
 import os.path as op
+import re
+import time
 from functools import partial
 
-import pandas as pd
-
 from soops.base import import_file, Struct
 from soops.run_parametric import parse_args as pa
-from soops.run_parametric import get_study_conf
+from soops.run_parametric import get_study_conf, read_status
 
 helps = {
     'verbose'
     : 'print more information',
+    'watch'
+    : """refresh the jobs information every given number of seconds until
+         interrupted [default: %(const)s]""",
+    'resources'
+    : """show the CPU, RSS, open files and I/O counters aggregated over the
+         process tree of each job""",
+    'top'
+    : """with --resources, the number of parameter sets (or processes) with
+         the highest CPU usage to show [default: %(default)s]""",
+    'interval'
+    : """with --resources, the CPU usage sampling interval in seconds
+         [default: %(default)s]""",
     'shell' :
     'run ipython shell after all computations',
 }
@@ -40,6 +63,18 @@ def parse_args(args=None):
     parser.add_argument('-v', '--verbose',
                         action='count', dest='verbose',
                         default=0, help=helps['verbose'])
+    parser.add_argument('-w', '--watch', metavar='seconds', type=float,
+                        action='store', dest='watch', nargs='?',
+                        const=2.0, default=None, help=helps['watch'])
+    parser.add_argument('-r', '--resources',
+                        action='store_true', dest='resources',
+                        default=False, help=helps['resources'])
+    parser.add_argument('--top', metavar='int', type=int,
+                        action='store', dest='top',
+                        default=5, help=helps['top'])
+    parser.add_argument('--interval', metavar='seconds', type=float,
+                        action='store', dest='interval',
+                        default=1.0, help=helps['interval'])
     parser.add_argument('--shell',
                         action='store_true', dest='shell',
                         default=False, help=helps['shell'])
@@ -47,22 +82,96 @@ def parse_args(args=None):
     return options
 
 def find_jobs():
+    import psutil
+
     jobs = [proc for proc in psutil.process_iter(['pid', 'cwd', 'cmdline'])
             if (proc.info['cmdline']
                 and ('soops-run' in ''.join(proc.info['cmdline'])))]
     return jobs
 
+def _is_current_status(job, status):
+    """
+    Check that `status` was written by the `job` process and not left by a
+    previous run in the same output directory - the process ID could have
+    been reused, so the status must not be older than the process.
+    """
+    import psutil
+
+    if (status is None) or (status.get('pid') != job.pid):
+        return False
+
+    try:
+        create_time = job.create_time()
+
+    except psutil.Error:
+        return False
+
+    # The process creation time is rounded.
+    return status.get('start_time', 0.0) >= create_time - 1.0
+
 def get_job_info(job):
+    """
+    Get the information about a soops-run job, preferably from its status
+    file.
+    """
     cmdline = job.info['cmdline']
+    inodir = partial(op.join, job.info['cwd'])
+
     try:
-        ii = cmdline.index('--output-dir')
+        job_options = pa(args=cmdline[2:])
+        status = read_status(inodir(job_options.output_dir))
+
+    except (Exception, SystemExit):
+        status = None
+
+    if not _is_current_status(job, status):
+        return _get_job_info_from_files(job)
 
-    except ValueError:
-        ii = cmdline.index('-o')
+    info = Struct(
+        job_working_dir=job.info['cwd'],
+        job_output_dir=status['study_dir'],
+        num=status['num'],
+        n_finished=status['finished'] + status['skipped'],
+        apdf=None,
+        last_dir=status['last_dir'],
+        log_file=None,
+        job_options=Struct(vars(job_options)),
+        status=status,
+    )
+    update_job_info(info)
 
+    return info
+
+def update_job_info(info):
+    """
+    Re-read the status file of a job, if it has one.
+    """
+    if info.status is None:
+        return info
+
+    status = read_status(info.status['output_dir'])
+    if status is not None:
+        info.status = status
+        info.num = status['num']
+        info.n_finished = status['finished'] + status['skipped']
+        info.last_dir = status['last_dir']
+
+    log_file = (op.join(info.last_dir, 'output_log.txt')
+                if info.last_dir is not None else '')
+    info.log_file = log_file if op.exists(log_file) else ''
+
+    return info
+
+def _get_job_info_from_files(job):
+    import pandas as pd
+
+    cmdline = job.info['cmdline']
     inodir = partial(op.join, job.info['cwd'])
 
     try:
+        ii = (cmdline.index('--output-dir') if '--output-dir' in cmdline
+              else cmdline.index('-o'))
+
         job_options = pa(args=cmdline[2:])
         run_mod = import_file(inodir(job_options.run_mod))
         (run_cmd, opt_args, output_dir_key, _is_finished) = run_mod.get_run_info()
@@ -94,6 +203,7 @@ def get_job_info(job):
             last_dir=None,
             log_file=None,
             job_options=Struct(),
+            status=None,
         )
 
     else:
@@ -106,34 +216,331 @@ def get_job_info(job):
             last_dir=last_dir,
             log_file=log_file,
             job_options=Struct(vars(job_options)),
+            status=None,
         )
 
     return info
 
-def print_jobs_info(jobs, infos, options):
+def get_process_trees(jobs):
+    """
+    Get the process trees of jobs, i.e. the dask workers and the parameter
+    set command processes.
+
+    Returns
+    -------
+    trees : dict
+        The lists of processes (a job first) keyed by the job PIDs. A process
+        belongs to its nearest job ancestor, so that the processes of nested
+        jobs, e.g. a soops-run started by a shell, are not counted twice.
+    """
+    import psutil
+
+    pids = {job.pid for job in jobs}
+    trees = {job.pid : [job] for job in jobs}
+    for job in jobs:
+        try:
+            children = job.children(recursive=True)
+
+        except psutil.Error:
+            continue
+
+        for proc in children:
+            if proc.pid in pids:
+                continue
+
+            try:
+                owner = next(parent.pid for parent in proc.parents()
+                             if parent.pid in pids)
+
+            except (psutil.Error, StopIteration):
+                continue
+
+            if owner == job.pid:
+                trees[job.pid].append(proc)
+
+    return trees
+
+_set_dir_name = re.compile(r'^[0-9]{3,}-[0-9a-f]{32}$')
+
+def _get_set_dirs(procs, study_dir=None):
+    """
+    Assign to each process the parameter set directory (named
+    ``<iset>-<pkey>`` by soops-run) found in the command line of the process
+    or of its nearest ancestor in `procs`.
+    """
+    import psutil
+
+    join = partial(op.join, study_dir) if study_dir is not None else str
+    parents = {}
+    set_dirs = {}
+    for proc in procs:
+        try:
+            parents[proc.pid] = proc.ppid()
+            words = re.split(r'[\s{}\'"=,]+'.format(re.escape(op.sep)),
+                             ' '.join(proc.cmdline()))
+
+        except psutil.Error:
+            continue
+
+        set_dirs[proc.pid] = next((join(word) for word in words
+                                   if _set_dir_name.match(word)), None)
+
+    out = {}
+    for pid in set_dirs:
+        ancestor = pid
+        while (ancestor in set_dirs) and (set_dirs[ancestor] is None):
+            ancestor = parents.get(ancestor)
+
+        out[pid] = set_dirs.get(ancestor)
+
+    return out
+
+def sample_resources(jobs, infos=None, interval=1.0):
+    """
+    Sample the resource usage of the process trees of jobs.
+
+    Parameters
+    ----------
+    jobs : list of psutil.Process
+        The jobs, as returned by :func:`find_jobs()`.
+    infos : list of Struct, optional
+        The jobs information, as returned by :func:`get_job_info()`. If given,
+        the parameter set directories are given with the study directories.
+    interval : float
+        The CPU usage sampling interval in seconds.
+
+    Returns
+    -------
+    df : DataFrame
+        The resource usage with a row per process and columns job, pid,
+        ppid, name, set_dir, cpu_percent, rss, open_files, read_bytes and
+        write_bytes. The values that cannot be determined are NaN.
+    """
+    import psutil
+    import pandas as pd
+
+    trees = get_process_trees(jobs)
+    for procs in trees.values():
+        for proc in procs:
+            try:
+                proc.cpu_percent(None)
+
+            except psutil.Error:
+                pass
+
+    time.sleep(interval)
+
+    nan = float('nan')
+    rows = []
+    for ij, job in enumerate(jobs):
+        procs = trees[job.pid]
+        study_dir = (infos[ij].job_output_dir
+                     if (infos is not None) and (infos[ij].num >= 0)
+                     else None)
+        set_dirs = _get_set_dirs(procs, study_dir)
+        for proc in procs:
+            try:
+                with proc.oneshot():
+                    row = {
+                        'job' : job.pid,
+                        'pid' : proc.pid,
+                        'ppid' : proc.ppid(),
+                        'name' : proc.name(),
+                        'set_dir' : set_dirs.get(proc.pid),
+                        'cpu_percent' : proc.cpu_percent(None),
+                        'rss' : proc.memory_info().rss,
+                    }
+
+            except psutil.Error:
+                continue
+
+            try:
+                row['open_files'] = len(proc.open_files())
+
+            except psutil.Error:
+                row['open_files'] = nan
+
+            try:
+                io = proc.io_counters()
+                row['read_bytes'] = io.read_bytes
+                row['write_bytes'] = io.write_bytes
+
+            except (psutil.Error, AttributeError):
+                row['read_bytes'] = row['write_bytes'] = nan
+
+            rows.append(row)
+
+    columns = ['job', 'pid', 'ppid', 'name', 'set_dir', 'cpu_percent', 'rss',
+               'open_files', 'read_bytes', 'write_bytes']
+    return pd.DataFrame(rows, columns=columns)
+
+resource_keys = ['cpu_percent', 'rss', 'open_files', 'read_bytes',
+                 'write_bytes']
+
+def summarize_resources(df, top=5):
+    """
+    Summarize the resource usage sampled by :func:`sample_resources()`.
+
+    Returns
+    -------
+    totals : DataFrame
+        The resource usage totals of each job.
+    tops : dict
+        The `top` parameter sets with the highest CPU usage of each job, or
+        the `top` processes, if the processes are not assigned to parameter
+        sets, keyed by the job PIDs.
+    """
+    totals = df.groupby('job')[resource_keys].sum(min_count=1)
+
+    tops = {}
+    for job, jdf in df.groupby('job'):
+        sdf = jdf.dropna(subset=['set_dir'])
+        if len(sdf):
+            sdf = sdf.groupby('set_dir')[resource_keys].sum(min_count=1)
+            sdf = sdf.assign(nproc=jdf.groupby('set_dir').size())
+
+        else:
+            sdf = jdf.set_index('pid')[['name'] + resource_keys]
+
+        tops[job] = sdf.nlargest(top, 'cpu_percent')
+
+    return totals, tops
+
+def format_bytes(num):
+    if num != num:
+        return '?'
+
+    for unit in ['B', 'KiB', 'MiB', 'GiB']:
+        if abs(num) < 1024:
+            break
+
+        num /= 1024
+
+    else:
+        unit = 'TiB'
+
+    return '{:.4g} {}'.format(num, unit)
+
+def print_resources(job, totals, tops):
+    if job.pid not in totals.index:
+        return
+
+    total = totals.loc[job.pid]
+    print('cpu: {:.1f}%, rss: {}, open files: {:.0f}, read: {}, written: {}'
+          .format(total['cpu_percent'], format_bytes(total['rss']),
+                  total['open_files'], format_bytes(total['read_bytes']),
+                  format_bytes(total['write_bytes'])))
+
+    tdf = tops[job.pid]
+    if len(tdf):
+        tdf = tdf.copy()
+        for key in ['rss', 'read_bytes', 'write_bytes']:
+            tdf[key] = tdf[key].map(format_bytes)
+
+        print(tdf.to_string())
+
+def _get_job_status(job):
+    import psutil
+
+    try:
+        return job.status()
+
+    except psutil.Error:
+        return None
+
+def print_jobs_info(jobs, infos, options, resources=None):
+    """
+    Print the jobs information, and the resource usage `resources` returned
+    by :func:`summarize_resources()`, if given. The jobs that exited in the
+    meantime, e.g. while sampling the resources, are skipped.
+    """
+    statuses = [_get_job_status(job) for job in jobs]
+    items = [(job, info, job_status)
+             for job, info, job_status in zip(jobs, infos, statuses)
+             if job_status is not None]
     if options.verbose:
-        for job, info in zip(jobs, infos):
-            print(f'job: {job.pid} ({job.status()})')
+        for job, info, job_status in items:
+            print(f'job: {job.pid} ({job_status})')
             print('working directory:', info.job_working_dir)
             print('output in:', info.job_output_dir)
             print(f'finished: {info.n_finished}/{info.num}')
 
+            status = info.status
+            if status is not None:
+                print('state: {state}, queued: {queued}, running: {running},'
+                      ' failed: {failed}'.format(**status))
+                if status['throughput'] is not None:
+                    print('throughput: {:.3g} sets/min, ETA: {}'
+                          .format(60 * status['throughput'],
+                                  format_seconds(status['eta'])))
+
             if options.verbose > 1:
+                if status is not None:
+                    print('running in:')
+                    for dirname in status['running_dirs']:
+                        print(' ', dirname)
+
                 print('options:')
                 print(info.job_options)
 
+            if resources is not None:
+                print_resources(job, *resources)
+
             if options.verbose > 2:
                 print('last log:')
                 print(info.log_file)
 
     else:
-        for job in jobs:
-            print(job.pid, job.status())
+        for job, _, job_status in items:
+            print(job.pid, job_status)
+            if resources is not None:
+                print_resources(job, *resources)
+
+def format_seconds(seconds):
+    seconds = int(round(seconds))
+    return '{}:{:02d}:{:02d}'.format(seconds // 3600, (seconds // 60) % 60,
+                                     seconds % 60)
+
+def get_resources(jobs, infos, options):
+    if not options.resources:
+        return None
+
+    df = sample_resources(jobs, infos, interval=options.interval)
+    return summarize_resources(df, top=options.top)
 
 def show_jobs(options):
     jobs = find_jobs()
     infos = [get_job_info(job) for job in jobs]
-    print_jobs_info(jobs, infos, options)
+    print_jobs_info(jobs, infos, options,
+                    resources=get_resources(jobs, infos, options))
+
+    if options.watch is None:
+        return jobs, infos
+
+    # Only the status files are re-read for the known jobs with a status
+    # file, the other jobs are fully re-read.
+    cache = dict(zip((job.pid for job in jobs), infos))
+    try:
+        while 1:
+            time.sleep(options.watch)
+            jobs = find_jobs()
+            infos = [update_job_info(cache[job.pid])
+                     if ((job.pid in cache)
+                         and (cache[job.pid].status is not None))
+                     else get_job_info(job) for job in jobs]
+            cache = dict(zip((job.pid for job in jobs), infos))
+
+            if sys.stdout.isatty():
+                print('\033[H\033[J', end='')
+
+            resources = get_resources(jobs, infos, options)
+            print(time.strftime('%Y-%m-%d %H:%M:%S'))
+            print_jobs_info(jobs, infos, options, resources=resources)
+            sys.stdout.flush()
+
+    except KeyboardInterrupt:
+        pass
+
     return jobs, infos
 
 def main():
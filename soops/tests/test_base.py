@@ -12,3 +12,110 @@ def test_unflatten_dict():
 
     out = unflatten_dict(flat_dict, prefix='x-')
     assert out == nested_dict
+
+def test_product():
+    import itertools
+    from soops.base import product, get_product_size
+    from soops.sequences import parse_sequence
+
+    seqs = [[1, 2], ['a', 'b', 'c'], [3.0, 4.0]]
+    lseqs = [parse_sequence('@range(1, 3)'), ['a', 'b', 'c'],
+             parse_sequence('@linspace(3, 4, 2)')]
+    assert list(product(*lseqs)) == list(itertools.product(*seqs))
+    assert get_product_size(*lseqs) == 12
+
+    out = list(product(*lseqs, contracts=[[0, 2]]))
+    assert out == [[1, 'a', 3.0], [1, 'b', 3.0], [1, 'c', 3.0],
+                   [2, 'a', 4.0], [2, 'b', 4.0], [2, 'c', 4.0]]
+    assert get_product_size(*lseqs, contracts=[[0, 2]]) == len(out)
+
+def test_parse_sequence():
+    import numpy as np
+    from soops.sequences import parse_sequence
+
+    for val in ['@arange(5)', '@arange(0.1, 2, 0.3)',
+                '@arange(1, 2, 0.3, dtype=int)', '@linspace(0, 2 * pi, 7)',
+                '@linspace(0, 1, 5, endpoint=False)',
+                '@linspace(100, 1000, 3, dtype=np.int32)']:
+        seq = parse_sequence(val)
+        ref = eval('np.' + val[1:].replace('2 * pi', '2 * np.pi')).tolist()
+        assert str(list(seq)) == str(ref)
+        assert len(seq) == len(ref)
+        assert seq[-1] == ref[-1]
+
+    assert np.allclose(list(parse_sequence('@logspace(0, 3, 4, base=2)')),
+                       np.logspace(0, 3, 4, base=2))
+    assert np.allclose(list(parse_sequence('@geomspace(-1, -1000, 4)')),
+                       np.geomspace(-1, -1000, 4))
+    assert list(parse_sequence('@range(2, 10, 3)')) == [2, 5, 8]
+
+    val = '@choice(12345, 10**9, ["a", "b"])'
+    seq = parse_sequence(val)
+    assert len(seq) == 10**9
+    assert seq[10**8] == parse_sequence(val)[10**8]
+    assert set(seq[:20]) == {'a', 'b'}
+
+    assert list(parse_sequence('@range(2**62, 2**62 + 1)')) == [2**62]
+    for val in ['@arange(__import__("os").getpid())', '@linspace(x, 1)',
+                '@arange(1', '@range(9**9**9)', '@range(2**4097)',
+                '@linspace(0, 10.0**400)', '@choice(1, 2, ["a"] * 10**9)',
+                '@choice(1, 2, "a" * 10**9)', '@linspace(0, f, 3)',
+                '@linspace(0, 1, 3, dtype=i)', '@arange(3, dtype="xyz")']:
+        try:
+            parse_sequence(val)
+
+        except ValueError:
+            pass
+
+        else:
+            raise AssertionError(val)
+
+def test_star_import():
+    import soops
+    import soops.ioutils
+
+    names = {}
+    exec('from soops import *', names)
+    assert {'output', 'Struct', 'load_options', 'to_categorical',
+            'parse_as_dict', 'extract_floats', 'test'}.issubset(names)
+
+    public = {key for key, val in vars(soops.ioutils).items()
+              if not key.startswith('_')
+              and (getattr(val, '__module__', None) == 'soops.ioutils')}
+    assert public.issubset(soops.__all__)
+
+def test_output_buffered(tmpdir):
+    import os
+    from soops.base import Output
+
+    filename = os.path.join(tmpdir, 'log.txt')
+    output = Output('test:', filename=filename, quiet=True, buffered=True)
+    output.set_output(filename=filename, quiet=True, buffered=True,
+                      flush_interval=None)
+    output('a', 1)
+    output('hidden', verbosity=2)
+    assert not output.is_shown(verbosity=2)
+    with open(filename) as fd:
+        assert fd.read() == ''
+
+    output.flush()
+    with open(filename) as fd:
+        assert fd.read() == 'test: a 1\n'
+
+    output.verbosity = 2
+    output('shown', verbosity=2)
+    pid = os.fork()
+    if pid == 0:
+        output('child')
+        output.close()
+        os._exit(0)
+
+    os.waitpid(pid, 0)
+    output.close()
+    output('unbuffered')
+    with open(filename) as fd:
+        assert fd.read().splitlines() == ['test: a 1', 'test: shown',
+                                          'test: child', 'test: unbuffered']
+
+    output = Output('', quiet=True, buffered=True)
+    assert not output.is_shown()
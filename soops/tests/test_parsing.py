@@ -0,0 +1,116 @@
+import os
+import time
+
+import pytest
+
+# The absolute timing limits are checked only on request, as they depend on
+# the machine load.
+check_timings = bool(os.environ.get('SOOPS_CHECK_TIMINGS'))
+
+def test_grammar_cache():
+    import soops.parsing as sp
+
+    assert sp.create_dict_bnf() is sp.create_dict_bnf()
+    assert sp.create_dict_bnf(allow_tuple=True) is not sp.create_dict_bnf()
+    assert sp.create_list_bnf(free_word=True) is sp.create_list_bnf(True)
+
+def test_parse_cache():
+    import pyparsing as pp
+    import soops.parsing as sp
+
+    string = 'a=1,b=[1,2,{c:3.5}],name=x,t=(1,2)'
+    out = sp.parse_as_dict(string)
+    assert out == {'a' : 1, 'b' : [1, 2, {'c' : 3.5}], 'name' : 'x',
+                   't' : (1, 2)}
+    out['b'].append(3)
+    assert sp.parse_as_dict(string)['b'] == [1, 2, {'c' : 3.5}]
+
+    out = sp.parse_as_list('a,b,[1,2]')
+    out[2].append(3)
+    assert sp.parse_as_list('a,b,[1,2]') == ['a', 'b', [1, 2]]
+
+    for ii in range(2):
+        with pytest.raises(pp.ParseException):
+            sp.parse_as_dict('a b')
+
+def test_parse_benchmark():
+    import soops.parsing as sp
+
+    strings = ['a={},b=[1,2,{{c:{}.5}}],name=x{},t=(1,2)'.format(ii, ii, ii)
+               for ii in range(50)]
+    tt = time.perf_counter()
+    for string in strings:
+        sp.parse_as_dict(string)
+    t_parse = time.perf_counter() - tt
+
+    tt = time.perf_counter()
+    for ii in range(20):
+        for string in strings:
+            sp.parse_as_dict(string)
+    t_cached = time.perf_counter() - tt
+
+    print(t_parse, t_cached)
+    # The cached parsing is orders of magnitude faster.
+    assert t_cached < t_parse
+    if check_timings:
+        assert t_parse < 5.0
+
+flat_corpus = [
+    '', '  ', 'a=1', 'a=1,', 'a = 1 , b = 2', 'a=-1,b=+2,c=05',
+    'a=1.5,b=5.,c=1e5,d=1.e-3,e=1E5,f=.5', 'a=True,b=false,c=NONE,d=none',
+    'a=nan,b=inf', "a='x y',b=\"z=1, w\"", "a='x:{}'", 'a=,b=1', 'a=',
+    'a=[1,2.5,x],b=[]', 'a=[1,]', 'a=[,]', 'a=[1 2]', 'a=[1,[2]]',
+    'True=5,1=2,2.5=x', 'a=1,,b=2', 'a b=1', 'a=1 2', 'a=1,=2', 'a=1,b',
+    'a=@x,b=x/y,c=x-y,d=a_1', 'a=1.5j', 'a=1.5 J', 'a={b:1}', 'a=(1,2)',
+    'a:1,b:2', 'a=x:y', "a='x'y", "a='x\\'y'", 'a=\xa0', 'a=١',
+    'linewidth=3,alpha=0.5', 'n_workers=3,threads_per_worker=1',
+    'a=1.5.3,b=1-2,c=-x', 'a = True , b=none ,', 'a=[ 1,2 ]', '1 =2',
+    'a=1,\tb=2', "a='x\ty'", 'a=\t1\t', 'a=[1,\t2]', 'a=1\n,b=2\r\n',
+    'a=1,\n b=[x,\r\ny]', "a='x\ny'", 'a=1\v', 'a=x\fy', 'a=\x0b1',
+]
+
+def _make_flat_corpus(num, seed=12345, spaces=('', '', ' ')):
+    import random
+
+    items = ['a', 'b1', 'x_y', '1', '-2', '+3', '05', '1.5', '5.', '1e5',
+             '.5', 'True', 'false', 'NONE', 'nan', '@x', 'x/y', 'x-y', '1-2',
+             "'q z'", '"w"', 'a.b', '1.e5', 'x+1', '-1.5e-3', '', '[]']
+
+    rng = random.Random(seed)
+    def item():
+        return rng.choice(spaces) + rng.choice(items) + rng.choice(spaces)
+
+    def value():
+        if rng.random() < 0.2:
+            return ('[' + ','.join(item() for ii in range(rng.randint(0, 3)))
+                    + rng.choice(['', ',']) + ']')
+
+        return item()
+
+    return [','.join(item() + '=' + value()
+                     for ii in range(rng.randint(1, 4)))
+            + rng.choice(['', ',', ' '])
+            for ii in range(num)]
+
+@pytest.mark.parametrize('free_word', [False, True])
+def test_parse_flat_dict(free_word):
+    import soops.parsing as sp
+
+    nflat = 0
+    corpus = (flat_corpus + _make_flat_corpus(500)
+              + _make_flat_corpus(200, spaces=('', ' ', '\t', '\n', '\r\n')))
+    for string in corpus:
+        out = sp._parse_flat_dict(string, free_word=free_word)
+        if out is None:
+            continue
+
+        nflat += 1
+        ref = {}
+        for item in sp._parse_cached(string, 'dict', free_word=free_word):
+            ref.update(item)
+
+        assert out == ref, string
+        assert {key : type(val) for key, val in out.items()} \
+            == {key : type(val) for key, val in ref.items()}, string
+
+    assert nflat > 50
@@ -0,0 +1,103 @@
+import os
+
+import numpy as np
+
+def test_get_rows_styles():
+    import pandas as pd
+    import soops.plot_selected as sps
+
+    rng = np.random.default_rng(12345)
+    num = 300
+    df = pd.DataFrame({
+        'a' : rng.integers(0, 5, num),
+        'b' : rng.choice(['x', 'y', 'z', None], num),
+        'c' : rng.choice([0.1, 0.2, np.nan], num),
+        'd' : [[1], [1, 2]] * (num // 2),
+        'e' : pd.Categorical(rng.choice(['u', 'v'], num)),
+    })
+    selected = {'a' : [3, 0, 1, 2], 'b' : ['y', None, 'x'],
+                'c' : [0.2, 0.1], 'd' : [[1, 2], [1]], 'e' : ['v', 'u']}
+    styles = {'a' : {'color' : ['r', 'g', 'b']}, 'b' : {'ls' : ['-', ':']},
+              'c' : {'lw' : [1, 2]}, 'd' : {'marker' : ['o']},
+              'e' : {'alpha' : [0.5, 1.0]}}
+    compares = {'c' : lambda a, b: np.isclose(a, b, atol=0.05)}
+
+    for keys in [['a', 'b', 'c', 'd', 'e'], ['a', 'e'], []]:
+        sel = {key : selected[key] for key in keys}
+        icombos, combo_styles, used = sps.get_rows_styles(
+            df, sel, compares, styles, zorder=2,
+        )
+        used0 = None
+        for ir in range(len(df)):
+            style_kwargs, indices, used0 = sps.get_row_style_used(
+                df.iloc[ir], sel, compares, styles, used0, zorder=2,
+            )
+            if style_kwargs is None:
+                assert icombos[ir] == -1
+
+            else:
+                assert combo_styles[icombos[ir]] == style_kwargs
+
+        assert used == used0
+
+def test_plot_selected_batch(tmpdir):
+    import pandas as pd
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    import soops.plot_selected as sps
+
+    num = 40
+    df = pd.DataFrame({
+        'a' : np.arange(num) % 4,
+        'b' : np.arange(num) % 2,
+        'y' : [np.sin(np.linspace(0, ii, 1000)) for ii in range(num)],
+    })
+    selected = sps.normalize_selected({'a' : [0, 1, 2], 'b' : [0, 1]})
+    styles = sps.setup_plot_styles(selected, {'a' : {'color' : 'viridis'},
+                                              'b' : {'ls' : ['-', ':']}})
+    styles['b']['marker'] = ['x', 'o']
+    for batch in [False, True]:
+        fig, ax = plt.subplots()
+        _, lines, labels = sps.plot_selected(ax, df, 'y', selected, {},
+                                             styles, make_legend=False,
+                                             batch=batch, max_points=100)
+        if not batch:
+            lines0, labels0 = ax.get_lines(), labels
+            assert len(lines0) == 30
+            assert all(len(line.get_ydata()) == 100 for line in lines0)
+
+        else:
+            assert labels == labels0
+            assert len(ax.collections) == 3
+            assert sum(len(lc.get_segments()) for lc in ax.collections) == 30
+            assert len(ax.get_lines()) == 3
+            assert sum(np.isfinite(line.get_ydata()).sum()
+                       for line in ax.get_lines()) == 30 * 100
+            fig.savefig(os.path.join(tmpdir, 'batch.png'))
+
+        plt.close(fig)
+
+    # Line2D-only kwargs are not passed to LineCollection.
+    fig, ax = plt.subplots()
+    styles['b'].pop('marker')
+    sps.plot_selected(ax, df, 'y', selected, {}, styles, make_legend=False,
+                      batch=True, max_points=100, drawstyle='steps')
+    assert len(ax.collections) == 0
+    assert len(ax.get_lines()) == 30
+    assert all(line.get_drawstyle() == 'steps' for line in ax.get_lines())
+    plt.close(fig)
+
+    rng = np.random.default_rng(12345)
+    x = np.linspace(0, 1, 101)
+    y = rng.random((4, 101))
+    y[0, 37] = 2.0
+    ii = sps.downsample_lttb(x, y, 10)
+    assert ii.shape == (4, 10)
+    assert (ii[:, 0] == 0).all() and (ii[:, -1] == 100).all()
+    assert 37 in ii[0]
+    assert np.all(np.diff(ii, axis=1) > 0)
+    for ir in range(4):
+        assert (sps.downsample_lttb(x, y[ir], 10) == ii[ir]).all()
+
+    assert (sps.downsample_lttb(x, y[0], 200) == np.arange(101)).all()
@@ -0,0 +1,391 @@
+import os
+import pickle
+
+import numpy as np
+
+def test_load_array_mmap(tmpdir):
+    import soops.scoop_outputs as sc
+
+    arr = np.arange(12.0).reshape((4, 3))
+    filename = os.path.join(tmpdir, 'arr.npy')
+    np.save(filename, arr)
+
+    out = sc.load_array(filename, columns=['a', 'b', 'c'], mmap_mode='r',
+                        index=slice(-2, None))
+    assert isinstance(out['a'], np.memmap)
+    assert np.all(out['b'] == arr[-2:, 1])
+
+    filename = os.path.join(tmpdir, 'arr.npz')
+    np.savez(filename, x=arr, y=arr[:, 0])
+    out = sc.load_array(filename, mmap_mode='r', index=-1)
+    assert sorted(out.keys()) == ['x', 'y']
+    assert np.all(out['x'] == arr[-1])
+    assert out['y'] == arr[-1, 0]
+
+    filename = os.path.join(tmpdir, 'arrc.npz')
+    np.savez_compressed(filename, x=arr)
+    out = sc.load_array(filename, mmap_mode='r')
+    assert np.all(out['x'] == arr)
+
+def test_load_array_lazy(tmpdir):
+    import soops.scoop_outputs as sc
+
+    arr = np.arange(12.0).reshape((4, 3))
+    filename = os.path.join(tmpdir, 'arr.npz')
+    np.savez(filename, x=arr, y=arr[:, 0])
+
+    out = sc.load_array(filename, lazy=True)
+    assert sorted(out.keys()) == ['x', 'y']
+    assert out['x']._array is None
+    assert out['x'].shape == arr.shape
+    assert np.all(np.asarray(out['y']) == arr[:, 0])
+
+    val = pickle.loads(pickle.dumps(out['x']))
+    assert isinstance(val, np.ndarray)
+    assert np.all(val == arr)
+
+def test_load_text_array(tmpdir):
+    import soops.scoop_outputs as sc
+
+    arr = np.arange(20.0).reshape((5, 4))
+    filename = os.path.join(tmpdir, 'arr.txt')
+    np.savetxt(filename, arr, header='a b c d')
+
+    for engine in ['numpy', 'pandas', 'fromfile']:
+        kwargs = dict(skiprows=1, usecols=[3, 1], max_rows=4)
+        out = sc.load_text_array(filename, engine=engine, **kwargs)
+        assert np.all(out == arr[:4, [3, 1]])
+
+        out = sc.load_text_array(filename, engine=engine, downcast='float',
+                                 **kwargs)
+        assert out.dtype == np.float32
+
+        out = sc.load_array(filename, columns=['x', 'y'], engine=engine,
+                            load_kwargs=kwargs)
+        assert np.all(out['x'] == arr[:4, 3])
+        assert np.all(out['y'] == arr[:4, 1])
+
+        out = sc.load_text_array(filename, engine=engine, skiprows=1,
+                                 usecols=2)
+        assert out.shape == (5,)
+
+def test_run_plugins_cache(tmpdir):
+    import pandas as pd
+    import soops.scoop_outputs as sc
+
+    df = pd.DataFrame({'a' : [1, 2, 3], 'b' : [4.0, 5.0, 6.0]})
+    filename = os.path.join(tmpdir, 'results.h5')
+    sc.write_results(filename, df, pd.DataFrame({'data_row' : [0]}), {'a'})
+
+    calls = []
+    @sc.plugin(cache=True, columns=['b'])
+    def add_sum(df, data=None, scale=1):
+        calls.append('add_sum')
+        data.total = scale * df['b'].sum()
+        return data
+
+    @sc.plugin(cache=True, columns=[])
+    def add_double(df, data=None):
+        calls.append('add_double')
+        data.double = 2 * data.total
+        return data
+
+    def run(df, **kwargs):
+        return sc.run_plugins([add_sum, add_double], df, str(tmpdir), {'a'},
+                              filename, **kwargs)
+
+    data = run(df)
+    assert calls == ['add_sum', 'add_double']
+    assert data.double == 30.0
+
+    df2 = df.assign(c=[7, 8, 9])
+    data = run(df2, plugin_args={})
+    assert calls == ['add_sum', 'add_double']
+    assert data.double == 30.0
+
+    data = run(df2, plugin_args={'add_sum' : {'scale' : 2}})
+    assert calls == ['add_sum', 'add_double'] * 2
+    assert data.double == 60.0
+
+    data = run(df2, plugin_args={'add_sum' : {'scale' : 2}}, force=True)
+    assert len(calls) == 6
+
+    # Rewriting the results keeps the cache.
+    sc.write_results(filename, df2, pd.DataFrame({'data_row' : [0]}), {'a'})
+    data = run(df2, plugin_args={'add_sum' : {'scale' : 2}})
+    assert len(calls) == 6
+    assert data.double == 60.0
+
+    # Changed values of the used columns invalidate the cache.
+    data = run(df2.assign(b=[1.0, 2.0, 3.0]),
+               plugin_args={'add_sum' : {'scale' : 2}})
+    assert len(calls) == 8
+    assert data.double == 24.0
+
+    # Cached plugins depend on the data of the preceding uncached plugins.
+    @sc.plugin(columns=['a'])
+    def add_total(df, data=None):
+        data.total = df['a'].sum()
+        return data
+
+    for df3, double in [(df, 12), (df.assign(a=[10, 20, 25]), 110)]:
+        data = sc.run_plugins([add_total, add_double], df3, str(tmpdir),
+                              {'a'}, filename)
+        assert data.double == double
+
+def test_run_plugins_parallel(tmpdir):
+    import pandas as pd
+    import soops.scoop_outputs as sc
+
+    df = pd.DataFrame({'a' : [1, 2, 3], 'b' : [4.0, 5.0, 6.0]})
+    filename = os.path.join(tmpdir, 'results.h5')
+    sc.write_results(filename, df, pd.DataFrame({'data_row' : [0]}), {'a'})
+
+    @sc.plugin(provides=['sa'])
+    def sum_a(df, data=None):
+        data.sa = df['a'].sum()
+        data.pid_a = os.getpid()
+        return data
+
+    @sc.plugin(provides=['sb'])
+    def sum_b(df, data=None):
+        data.sb = df['b'].sum()
+        return data
+
+    @sc.plugin(requires=['sa', 'sb'], provides=['total'])
+    def add(df, data=None):
+        data.total = data.sa + data.sb
+        return data
+
+    def scale(df, data=None):
+        data.scaled = 2 * data.total
+        return data
+
+    info = [sum_a, sum_b, add, scale]
+    assert sc.get_plugin_dependencies(info) == [[], [], [0, 1], [0, 1, 2]]
+
+    for workers in [1, 2]:
+        data = sc.run_plugins(info, df, str(tmpdir), {'a'}, filename,
+                              workers=workers)
+        assert data.total == 21.0
+        assert data.scaled == 42.0
+        assert ('pid_a' in data) == (workers == 1)
+
+def test_iter_uniques():
+    import pandas as pd
+    import soops.scoop_outputs as sc
+
+    rng = np.random.default_rng(12345)
+    num = 500
+    df = pd.DataFrame({
+        'a' : rng.integers(0, 4, num),
+        'b' : rng.choice(['x', 'y', None], num),
+        'c' : rng.choice([1.0, 2.5, np.nan], num),
+        'd' : [[1]] * num,
+    })
+    uniques = sc.get_uniques(df, ['a', 'b', 'c'])
+    uniques['a'].append(10)
+    uniques['d'] = [[1]]
+
+    for columns in [['a', 'b', 'c'], ['c', 'a'], ['a', 'd'], []]:
+        out = list(sc.iter_uniques(df, columns, uniques))
+        out0 = list(sc._iter_uniques_product(df, columns, uniques))
+        assert [ii for ii, _, _ in out] == [ii for ii, _, _ in out0]
+        for (_, sel, sdf), (_, sel0, sdf0) in zip(out, out0):
+            assert dict(sel) == dict(sel0)
+            assert sdf.equals(sdf0)
+
+    # Tuple and list values.
+    df = df.assign(e=[(2, 3), (1, 2)] * (num // 2),
+                   f=[[1], [1, 2], [1]] * (num // 3) + [[1]] * (num % 3))
+    uniques = sc.get_uniques(df, ['a', 'e', 'f'])
+    assert uniques['e'] == [(1, 2), (2, 3)]
+    out = list(sc.iter_uniques(df, ['e', 'f', 'a'], uniques))
+    assert sum(len(sdf) for _, _, sdf in out) == num
+    for _, sel, sdf in out:
+        for key in ['e', 'f', 'a']:
+            assert all(val == sel[key] for val in sdf[key])
+
+def test_get_uniques():
+    import pandas as pd
+    import soops.scoop_outputs as sc
+
+    df = pd.DataFrame({
+        'a' : [[1, 2], [1, 2], [3], {'x' : 1}],
+        'b' : [np.arange(3), np.arange(3), np.arange(2.0), None],
+        'c' : [1, 'a', 1, 'a'],
+        'd' : [1.0, 2.0, np.nan, 1.0],
+    })
+    cache = {}
+    uniques = sc.get_uniques(df, df.columns, cache=cache)
+    assert uniques['a'] == [[1, 2], [3], {'x' : 1}]
+    assert uniques['b'][0] is None
+    assert [len(ii) for ii in uniques['b'][1:]] == [3, 2]
+    assert uniques['c'] == [1, 'a']
+    assert uniques['d'][:2] == [1.0, 2.0]
+    assert sorted(cache.keys()) == ['a', 'b', 'c', 'd']
+
+    cache['c'] = (cache['c'][0], ['cached'])
+    assert sc.get_uniques(df, ['c'], cache=cache)['c'] == ['cached']
+
+    df['c'] = [2, 'b', 2, 'b']
+    assert sc.get_uniques(df, ['c'], cache=cache)['c'] == [2, 'b']
+
+    # Values with equal string representations.
+    df['c'] = ['2', 'b', '2', 'b']
+    assert sc.get_uniques(df, ['c'], cache=cache)['c'] == ['2', 'b']
+    df['a'] = [[1, 2], [1, 2], ['3'], {'x' : 1}]
+    assert sc.get_uniques(df, ['a'], cache=cache)['a'] \
+        == [['3'], [1, 2], {'x' : 1}]
+    assert (sc._get_column_token(pd.Series([1, 2]))
+            != sc._get_column_token(pd.Series([1.0, 2.0])))
+
+def test_to_categorical(tmpdir):
+    import pandas as pd
+    import soops.scoop_outputs as sc
+    from soops.ioutils import to_categorical, add_categories
+
+    df = pd.DataFrame({
+        'host' : ['a', 'b', 'a', 'a'],
+        'name' : ['w', 'x', 'y', 'z'],
+        'num' : [100, 1000, 100, 1000],
+        'seed' : [np.nan, 12345.0, np.nan, 12345.0],
+        'rate' : [0.1, 0.2, 0.3, 0.4],
+        'rfiles' : [['a']] * 4,
+    })
+    par_keys = {'host', 'name', 'num', 'seed', 'rate', 'rfiles'}
+    cdf = to_categorical(df, par_keys, max_ratio=0.5, downcast=True)
+    assert cdf['host'].dtype == 'category'
+    assert cdf['name'].dtype == df['name'].dtype
+    assert cdf['num'].dtype == np.int16
+    assert cdf['seed'].dtype == np.float32
+    assert cdf['rate'].dtype == np.float64
+    assert cdf['rfiles'].dtype == object
+    assert len(cdf.query('host == "a" & num > 500')) == 1
+
+    add_categories(cdf, {'host' : 'c', 'num' : 1})
+    cdf.loc[0, 'host'] = 'c'
+    assert list(cdf['host'].cat.categories) == ['a', 'b', 'c']
+
+    mdf = pd.DataFrame({'data_row' : [0]})
+    for fmt in ['hdf5', 'hdf5-table']:
+        filename = os.path.join(tmpdir, 'results-{}.h5'.format(fmt))
+        sc.write_results(filename, cdf, mdf, par_keys, fmt=fmt)
+        df1 = sc.read_results(filename)[0]
+        assert (df1['host'].dtype == 'category') == (fmt == 'hdf5-table')
+        assert df1['host'].tolist() == cdf['host'].tolist()
+
+def test_load_options_sidecar(tmpdir):
+    import soops.scoop_outputs as sc
+    from soops.ioutils import (save_options, load_options,
+                               get_options_sidecar, convert_options_files)
+
+    options = {'num' : 10, 'rate' : 0.5, 'name' : 'a:b', 'flag' : True,
+               'shape' : (2, 3), 'opts' : 'linewidth=3,alpha=0.5',
+               'seed' : None, 'values' : [1, 2.5, 'x']}
+    filename = os.path.join(tmpdir, 'options.txt')
+    save_options(filename, [('options', options)], save_sidecar=False)
+    out0 = load_options(filename)
+    assert not os.path.exists(get_options_sidecar(filename))
+
+    assert convert_options_files(str(tmpdir)) == 1
+    assert convert_options_files(str(tmpdir)) == 0
+    out = load_options(filename)
+    assert out == out0
+    assert {key : type(val) for key, val in out.items()} \
+        == {key : type(val) for key, val in out0.items()}
+    assert out['opts'] == {'linewidth' : 3, 'alpha' : 0.5}
+
+    # A newer text file takes precedence.
+    with open(filename, 'a') as fd:
+        fd.write('extra: 1\n')
+    os.utime(filename, (os.path.getmtime(filename) + 10,) * 2)
+    assert load_options(filename)['extra'] == 1
+
+    out = sc.load_split_options(filename)
+    assert out['extra'] == 1
+
+    # Invalid sidecar contents fall back to the text file.
+    sidecar = get_options_sidecar(filename)
+    assert sidecar.endswith('options.txt.soops.json')
+    for contents in ['[1, 2]', '{"options" : {}}', '{"version" : 2}',
+                     '{"version" : 1, "options" : [1]}',
+                     '{"version" : 1, "options" : {"a" : 1, "b" : 2}}']:
+        with open(sidecar, 'w') as fd:
+            fd.write(contents)
+        os.utime(sidecar, (os.path.getmtime(filename) + 10,) * 2)
+        assert load_options(filename)['extra'] == 1
+
+def test_read_csv_files(tmpdir):
+    import pandas as pd
+    from soops.ioutils import read_csv_files
+
+    rows = [
+        'pkey,a,b,c\nk0,1,2.5,x\n',
+        'pkey,a,b,c\nk1,True,,@undefined\n',
+        'pkey,a,c\nk2,nan,"y,z"\n',
+        'pkey,a,b,d\n',
+        'pkey,a,b,d\nk3,12345,false,NA\nk4,-1,true,\n',
+        '',
+    ]
+    filenames = []
+    for ii, row in enumerate(rows):
+        filename = os.path.join(tmpdir, 'p{}.csv'.format(ii))
+        with open(filename, 'w') as fd:
+            fd.write(row)
+        filenames.append(filename)
+
+    for na_filter in [True, False]:
+        dfs = []
+        for filename in filenames:
+            try:
+                dfs.append(pd.read_csv(filename, index_col='pkey',
+                                       na_filter=na_filter))
+
+            except pd.errors.EmptyDataError:
+                continue
+
+        for nfile in [1, 2, 3, len(filenames)]:
+            df0 = pd.concat(dfs[:nfile])
+            df = read_csv_files(filenames[:nfile], index_col='pkey',
+                                na_filter=na_filter, workers=2)
+            assert df.index.equals(df0.index)
+            assert df.index.dtype == df0.index.dtype
+            assert list(df.columns) == list(df0.columns)
+            for key in df0.columns:
+                assert df[key].dtype == df0[key].dtype
+                assert df[key].equals(df0[key])
+
+    df = read_csv_files(filenames[:2], filename_col='fname')
+    assert df['fname'].tolist() == filenames[:2]
+    assert len(read_csv_files([])) == 0
+
+def _plot_selection(sdf, selection, scale=1):
+    import matplotlib.pyplot as plt
+
+    fig, ax = plt.subplots()
+    ax.plot(scale * sdf['b'].to_numpy())
+    ax.set_title('pid: {}, num: {}'.format(os.getpid(), len(sdf)))
+    return fig
+
+def test_render_selections(tmpdir):
+    import pandas as pd
+    import soops.scoop_outputs as sc
+    from soops.plugins import render_selections
+
+    df = pd.DataFrame({'a' : [1, 2, 3, 1, 2, 1], 'c' : list('xxyyxx'),
+                       'b' : np.arange(6.0)})
+    uniques = sc.get_uniques(df, ['a', 'c'])
+    filename = os.path.join(tmpdir, 'fig-{ii}-{a}-{c}.png')
+    out = {}
+    for workers in [1, 2]:
+        out[workers] = render_selections(_plot_selection, df, ['a', 'c'],
+                                         uniques, filename, workers=workers,
+                                         savefig_kwargs={'dpi' : 50},
+                                         scale=2)
+        assert all(os.path.exists(fname) for fname in out[workers])
+
+    names = [os.path.basename(fname) for fname in out[1]]
+    assert names == ['fig-0-1-x.png', 'fig-1-1-y.png', 'fig-2-2-x.png',
+                     'fig-5-3-y.png']
+    assert out[2] == out[1]
@@ -21,6 +21,14 @@ cmd_scoop0 = r"""{soops_dir}/examples/monty_hall.py {output_dir}/study0/ -s rdir
 
 cmd_scoop1 = r"""{soops_dir}/examples/monty_hall.py {output_dir}/study1/ -s rdir -o {output_dir}/study1 --omit-plugins=show_figures --plugin-args=plot_win_rates={{colormap_name='tab10:kind=qualitative'}}"""
 
+cmd_scoop_chunked = r"""{soops_dir}/examples/monty_hall.py {output_dir}/study0/ -o {output_dir}/study0 --chunk-size=3 --results={output_dir}/study0/results-chunked.h5 --no-plugins"""
+
+cmd_scoop_parquet = r"""{soops_dir}/examples/monty_hall.py {output_dir}/study0/ -s rdir -o {output_dir}/study0 --format=parquet --compression=zstd --omit-plugins=show_figures"""
+
+cmd_scoop_table = r"""{soops_dir}/examples/monty_hall.py {output_dir}/study0/ -s rdir -o {output_dir}/study0 --format=hdf5-table --compression=blosc --results={output_dir}/study0/results-table.h5 --no-csv --no-plugins"""
+
+cmd_scoop_append = r"""{soops_dir}/examples/monty_hall.py {dirs} -o {output_dir}/study0 --results={output_dir}/study0/results-append.h5 --no-csv --no-plugins"""
+
 cmd_info = r"""{soops_dir}/examples/monty_hall.py -e {output_dir}/study0/000-5adf4124d4e3e519e6eb49f2f0992ee1"""
 
 cmd_find = r"""--query=num==1000&repeat==20&seed==12345 {output_dir}/study0"""
@@ -49,6 +57,12 @@ def test_run_parametric(soops_dir, output_dir):
     results = list(locate_files('wins.png', os.path.join(output_dir, 'study0')))
     assert len(results) == 4
 
+    status = rp.read_status(output_dir)
+    assert status['state'] == 'done'
+    assert status['num'] == status['finished'] == 4
+    assert status['queued'] == status['running'] == status['failed'] == 0
+    assert status['study_dir'] == os.path.join(output_dir, 'study0')
+
 def test_run_parametric_cfg(soops_dir, output_dir):
     import soops.run_parametric as rp
     from soops import locate_files
@@ -89,6 +103,138 @@ def test_scoop_outputs(command, soops_dir, output_dir):
 
     assert so.op.exists(so.op.join(output_dir, 'study0/win_rates.png'))
 
+def test_scoop_outputs_chunked(soops_dir, output_dir):
+    import soops.scoop_outputs as so
+
+    options = so.parse_args(args=cmd_scoop_chunked
+                            .format(soops_dir=soops_dir,
+                                    output_dir=output_dir).split())
+    so.scoop_outputs(options)
+
+    filename = so.op.join(output_dir, 'study0/results-chunked.h5')
+    chunks = list(so.iter_results(filename))
+    assert [len(chunk) for chunk in chunks] == [3, 1]
+
+    df, mdf, par_keys, user_keys = so.read_results(filename)
+    df0, mdf0, par_keys0, _ = so.read_results(
+        so.op.join(output_dir, 'study0/results.h5')
+    )
+    assert len(df) == len(df0)
+    assert len(mdf) == len(mdf0)
+    assert par_keys == par_keys0
+    assert (mdf['data_row'].values == mdf0['data_row'].values).all()
+
+    # The chunks are not loaded back for plugins, --shell, --sort, ...
+    args = (cmd_scoop_chunked.format(soops_dir=soops_dir, output_dir=output_dir)
+            .replace(' --no-plugins', '').split())
+    for extra in [[], ['--no-plugins', '--shell'],
+                  ['--no-plugins', '--sort=seed'],
+                  ['--no-plugins', '--categorize']]:
+        with pytest.raises(ValueError):
+            so.parse_args(args=args + extra)
+
+def test_scoop_outputs_parquet(soops_dir, output_dir):
+    pytest.importorskip('pyarrow')
+    import numpy as np
+    import soops.scoop_outputs as so
+
+    args = cmd_scoop_parquet.format(soops_dir=soops_dir,
+                                    output_dir=output_dir).split()
+    so.scoop_outputs(so.parse_args(args=args))
+    so.scoop_outputs(so.parse_args(args=args + ['-r', '--columns=win_rate']))
+
+    filename = so.op.join(output_dir, 'study0/results.parquet')
+    assert so.get_results_format(filename) == 'parquet'
+
+    df, mdf, par_keys, _ = so.read_results(filename)
+    df0, mdf0, par_keys0, _ = so.read_results(
+        so.op.join(output_dir, 'study0/results.h5')
+    )
+    assert par_keys == par_keys0
+    assert list(df.columns) == list(df0.columns)
+    assert list(mdf.columns) == list(mdf0.columns)
+    for key in ['rdir', 'rfiles', 'num', 'seed', 'plot_opts']:
+        assert df[key].equals(df0[key])
+    for ir in range(len(df)):
+        assert np.all(df['win_rate'][ir] == df0['win_rate'][ir])
+
+    df, mdf, par_keys, _ = so.read_results(filename, columns=['win_rate'])
+    assert set(df.columns) == par_keys.union(['win_rate'])
+
+def test_scoop_outputs_table(soops_dir, output_dir):
+    import soops.scoop_outputs as so
+
+    args = cmd_scoop_table.format(soops_dir=soops_dir,
+                                  output_dir=output_dir).split()
+    so.scoop_outputs(so.parse_args(args=args))
+
+    filename = so.op.join(output_dir, 'study0/results-table.h5')
+    df, mdf, par_keys, user_keys = so.read_results(filename)
+    df0, mdf0, par_keys0, _ = so.read_results(
+        so.op.join(output_dir, 'study0/results.h5')
+    )
+    assert user_keys == set()
+    assert par_keys == par_keys0
+    assert list(df.columns) == list(df0.columns)
+    assert df['rfiles'].equals(df0['rfiles'])
+
+    where = '(num > 500) & (seed == 12345)'
+    df, mdf, par_keys, _ = so.read_results(filename, where=where)
+    df1 = df0.query(where)
+    assert len(df) == len(df1) == 1
+    assert df['rdir'].tolist() == df1['rdir'].tolist()
+    assert set(mdf['data_row']) == set(df.index)
+
+    # A filtered read must not change the stored results.
+    so.scoop_outputs(so.parse_args(args=args + ['-r', '--where=' + where]))
+    assert len(so.read_results(filename)[0]) == len(df0)
+    for extra in [['--write'], ['--write-after-plugins']]:
+        with pytest.raises(ValueError):
+            so.parse_args(args=args + ['-r', '--where=' + where] + extra)
+
+        with pytest.raises(ValueError):
+            so.parse_args(args=args + ['-r', '--columns=win_rate'] + extra)
+
+    # Numeric parameters are not downcast.
+    so.scoop_outputs(so.parse_args(args=args + ['-r', '--write',
+                                                '--categorize']))
+    df = so.read_results(filename)[0]
+    assert df['num'].dtype == df0['num'].dtype == 'int64'
+    assert df['host'].dtype == 'category'
+
+def test_scoop_outputs_append(soops_dir, output_dir):
+    import pandas as pd
+    import soops.scoop_outputs as so
+
+    dirs = sorted(so.glob.glob(so.op.join(output_dir, 'study0/0*')))
+    filename = so.op.join(output_dir, 'study0/results-append.h5')
+    for ii, (sdirs, extra) in enumerate([(dirs[:1], []),
+                                         (dirs[1:3], ['--append']),
+                                         (dirs[3:], ['--append'])]):
+        args = cmd_scoop_append.format(soops_dir=soops_dir,
+                                       output_dir=output_dir,
+                                       dirs=' '.join(sdirs)).split()
+        so.scoop_outputs(so.parse_args(args=args + extra))
+        if ii == 0:
+            with pd.HDFStore(filename, mode='a') as store:
+                store.put('user', pd.Series([1, 2]))
+
+    df, mdf, par_keys, user_keys = so.read_results(filename)
+    df0, mdf0, par_keys0, _ = so.read_results(
+        so.op.join(output_dir, 'study0/results.h5')
+    )
+    assert user_keys == {'/user'}
+    assert par_keys == par_keys0
+    assert list(df.index) == list(range(len(df0)))
+    assert sorted(df['rdir']) == sorted(df0['rdir'])
+    assert len(mdf) == len(mdf0)
+    for ir, row in mdf.iterrows():
+        assert df.loc[row['data_row'], 'rdir'] in row['filename']
+
+    for extra in [['--sort=seed'], ['--categorize']]:
+        with pytest.raises(ValueError):
+            so.parse_args(args=args + ['--append'] + extra)
+
 def test_print_info(soops_dir, output_dir):
     import soops.print_info as pi
 
@@ -110,7 +256,67 @@ def test_find_studies(soops_dir, output_dir):
     apdf = fs.find_studies(options)
     assert len(apdf) == 4
 
-def test_show_jobs(soops_dir, output_dir):
+    # Without collecting, only the query results are returned.
+    assert len(fs.find_studies(options, collect=False)) == 0
+
+    for args in ['--index', '--index', '--no-refresh']:
+        options = fs.parse_args(args=(cmd_find + ' ' + args)
+                                .format(soops_dir=soops_dir,
+                                        output_dir=output_dir).split())
+        iapdf = fs.find_studies(options)
+        assert iapdf.equals(apdf)
+        assert os.path.exists(os.path.join(output_dir, 'study0',
+                                           fs.index_basename))
+
+    query = 'num==1000&seed==12345'
+    output_dirs = apdf.query(query)['output_dir'].tolist()
+    assert len(output_dirs) == 1
+    for args in ['', '--index', '--columns=output_dir,num -m single',
+                 '--stream', '--stream --columns=seed']:
+        options = fs.parse_args(args=('--query={} {}/study0 {}'
+                                      .format(query, output_dir, args))
+                                .split())
+        assert fs.find_studies(options).equals(apdf)
+        sapdf = fs.find_studies(options, collect=False)
+        assert sapdf['output_dir'].tolist() == output_dirs
+
+    for query, num in [('num<1000', 2), ('index<3', 3),
+                       ('num<1000&missing!=1', 2)]:
+        options = fs.parse_args(args=('--query={} --stream {}/study0'
+                                      .format(query, output_dir)).split())
+        assert len(fs.find_studies(options, collect=False)) == num
+
+    # Arithmetic with int columns must not overflow.
+    options = fs.parse_args(args=('--query=num*repeat*1000>1000000'
+                                  ' --engine=python {}/study0'
+                                  .format(output_dir)).split())
+    sapdf = fs.find_studies(options)
+    assert len(sapdf.query(options.query, engine='python')) == 2
+    assert sapdf['num'].dtype == apdf['num'].dtype == 'int64'
+
+def test_query_predicates():
+    import soops.find_studies as fs
+
+    names, predicates = fs.get_query_predicates(
+        'num == 1000 & 0.1 < rate <= 0.5 & (a > 1 | b == 2) & c == [1, 2]'
+        ' & d != "x" & e in ["y"] & f not in [1] & num != g'
+    )
+    assert names == {'num', 'rate', 'a', 'b', 'c', 'd', 'e', 'f', 'g'}
+    assert predicates == [('num', '==', 1000), ('rate', '>', 0.1),
+                          ('rate', '<=', 0.5), ('c', 'in', [1, 2]),
+                          ('d', '!=', 'x'), ('e', 'in', ['y']),
+                          ('f', 'not in', [1])]
+    assert fs.get_query_predicates('`a b` == 1') == (None, [])
+    assert fs.get_query_predicates('index < 3 & ilevel_0 == 1')[1] == []
+
+    row_filter = fs.make_row_filter(predicates[:3] + [('h', '==', 1)])
+    columns = {'num' : ('int', [1000, 1000, 10]),
+               'rate' : ('float', [0.2, 'x', 0.2])}
+    assert row_filter(columns, 3) == [False] * 3
+    row_filter = fs.make_row_filter(predicates[:3] + [('h', '!=', 1)])
+    assert row_filter(columns, 3) == [True, True, False]
+
+def test_show_jobs(soops_dir, output_dir, capsys):
     import soops.show_jobs as sj
 
     print(soops_dir)
@@ -119,3 +325,92 @@ def test_show_jobs(soops_dir, output_dir):
     jobs, infos = sj.show_jobs(options)
     assert isinstance(jobs, list)
     assert isinstance(infos, list)
+
+    assert sj.format_seconds(3725.4) == '1:02:05'
+
+    import psutil
+    job = psutil.Process()
+    status = {'pid' : job.pid, 'start_time' : job.create_time() + 5.0}
+    assert sj._is_current_status(job, status)
+    assert not sj._is_current_status(job, dict(status, pid=job.pid + 1))
+    assert not sj._is_current_status(job, dict(status, start_time=0.0))
+    assert not sj._is_current_status(job, None)
+
+    # A job that exited before printing is skipped.
+    import sys
+    import subprocess
+    proc = subprocess.Popen([sys.executable, '-c', 'pass'])
+    exited = psutil.Process(proc.pid)
+    proc.wait()
+    capsys.readouterr()
+    for verbose in [0, 1]:
+        info = sj.Struct(job_working_dir='.', job_output_dir='.', num=1,
+                         n_finished=0, status=None)
+        sj.print_jobs_info([exited, job], [info, info],
+                           sj.Struct(verbose=verbose))
+        out = capsys.readouterr().out
+        assert (str(job.pid) in out) and (str(exited.pid) not in out)
+
+def test_sample_resources():
+    import sys
+    import subprocess
+    import psutil
+    import soops.show_jobs as sj
+
+    set_dir = '001-' + 32 * 'a'
+    proc = subprocess.Popen([sys.executable, '-c',
+                             'import time; time.sleep(10)', set_dir])
+    try:
+        job = psutil.Process()
+        df = sj.sample_resources([job], interval=0.1)
+        assert df.loc[df['pid'] == proc.pid, 'set_dir'].tolist() == [set_dir]
+        assert (df['rss'] > 0).all()
+
+        totals, tops = sj.summarize_resources(df, top=1)
+        assert totals.loc[job.pid, 'rss'] == df['rss'].sum()
+        assert tops[job.pid].index.tolist() == [set_dir]
+
+    finally:
+        proc.kill()
+        proc.wait()
+
+# The import time budgets in seconds and the heavy modules that must not be
+# imported by the entry point modules. The budgets are checked only on
+# request, as they depend on the machine load.
+check_timings = bool(os.environ.get('SOOPS_CHECK_TIMINGS'))
+import_budgets = {
+    'soops' : (0.5, ['pyparsing', 'numpy', 'pandas']),
+    'soops.print_info' : (0.5, ['pyparsing', 'numpy', 'pandas']),
+    'soops.find_studies' : (0.5, ['pyparsing', 'numpy', 'pandas']),
+    'soops.show_jobs' : (1.0, ['numpy', 'pandas', 'psutil', 'dask']),
+    'soops.run_parametric' : (1.0, ['numpy', 'pandas', 'dask']),
+    'soops.scoop_outputs' : (5.0, ['matplotlib', 'dask']),
+}
+
+@pytest.mark.parametrize('mod_name', sorted(import_budgets.keys()))
+def test_import_time(mod_name, soops_dir):
+    import subprocess
+    import sys
+
+    budget, omit = import_budgets[mod_name]
+    env = dict(os.environ,
+               PYTHONPATH=os.path.dirname(soops_dir) + os.pathsep
+               + os.environ.get('PYTHONPATH', ''))
+    out = subprocess.run([sys.executable, '-X', 'importtime', '-c',
+                          'import ' + mod_name],
+                         env=env, capture_output=True, text=True, check=True)
+
+    times = {}
+    for line in out.stderr.splitlines():
+        if not line.startswith('import time:') or ('|' not in line):
+            continue
+
+        _, cumulative, name = line.split('|')
+        name = name.strip()
+        if cumulative.strip().isdigit():
+            times[name] = int(cumulative) * 1e-6
+
+    imported = {name.split('.')[0] for name in times}
+    assert not imported.intersection(omit)
+    if check_timings:
+        assert times[mod_name] < budget